@@ -0,0 +1,117 @@
+'''
+    The sprites of the game, this is the only module besides main.py
+    that needs pygame (the rules in objects.py don't)
+'''
+import pygame
+from pathlib import Path
+from typing import Dict, Tuple
+from objects import Piece
+
+SPRITE_DIR = Path(__file__).resolve().parent / 'sprites'
+# the sprites were drawn for tiles of this size
+BASE_TILE = 70
+PIECE_SCALE = 0.45
+CIRCLE_ALPHA = 100
+
+
+class Asset_Cache():
+    '''
+        Loads every sprite under sprites/ once, converts it to the display format
+        and scales it for the size of a tile
+
+        ...
+
+        Attributes
+        ----------
+        images: Dict[Tuple[str, str], pygame.Surface]
+            the scaled sprites by (folder, name), e.g. ('white', 'queen') or ('others', 'move_circle'),
+            pieces can also be looked up by their class name, e.g. ('white', 'Queen')
+
+        tile_size: int
+            the tile size the sprites are scaled for
+
+        Methods
+        -------
+        set_tile_size(self, tile_size: int) -> None
+            Loads and scales the sprites if the tile size changed
+
+        get(self, folder: str, name: str) -> pygame.Surface
+            Returns a sprite
+
+        get_piece(self, piece: Piece) -> pygame.Surface
+            Returns the sprite of a piece
+    '''
+    def __init__(self, sprite_dir: Path = SPRITE_DIR) -> None:
+        '''
+            Parameters
+            ----------
+            sprite_dir: Path
+                the folder of the sprites
+        '''
+        self.sprite_dir = sprite_dir
+        self.images: Dict[Tuple[str, str], pygame.Surface] = {}
+        self.tile_size = 0
+
+    def set_tile_size(self, tile_size: int) -> None:
+        '''
+            Loads and scales the sprites if the tile size changed
+            (needs a display, as the sprites are converted to its format)
+
+            Parameters
+            ----------
+            tile_size: int
+                the size of a tile in pixels
+        '''
+        if tile_size == self.tile_size:
+            return
+        images = {}
+        for path in sorted(self.sprite_dir.glob('*/*.png')):
+            folder = path.parent.name
+            image = pygame.image.load(str(path)).convert_alpha()
+            if folder == 'others':
+                image = pygame.transform.rotozoom(image, 0, tile_size / BASE_TILE)
+                image.set_alpha(CIRCLE_ALPHA)
+            else:
+                image = pygame.transform.rotozoom(image, 0, PIECE_SCALE * tile_size / BASE_TILE)
+                images[(folder, path.stem.capitalize())] = image
+            images[(folder, path.stem)] = image
+        self.images = images
+        self.tile_size = tile_size
+
+    def get(self, folder: str, name: str) -> pygame.Surface:
+        '''
+            Returns a sprite
+
+            Parameters
+            ----------
+            folder: str
+                the folder of the sprite (the colour of a piece or 'others')
+
+            name: str
+                the name of the sprite (e.g. 'queen', 'Queen' or 'move_circle')
+
+            Returns
+            -------
+            pygame.Surface
+                the scaled sprite
+        '''
+        return self.images[(folder, name)]
+
+    def get_piece(self, piece: Piece) -> pygame.Surface:
+        '''
+            Returns the sprite of a piece
+
+            Parameters
+            ----------
+            piece: Piece
+                the piece
+
+            Returns
+            -------
+            pygame.Surface
+                the scaled sprite
+        '''
+        return self.images[(piece.get_colour(), piece.get_class_name())]
+
+
+sprites = Asset_Cache()
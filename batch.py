@@ -0,0 +1,357 @@
+'''
+    Batch analysis of position and game files on all cores
+
+    The input is a file with one FEN per line or a PGN file (every position
+    of every game is analysed). The input is cut into chunks which a pool
+    of worker processes analyses, every worker with its own board and
+    search. The results are written in the order of the input as JSON lines
+    or CSV, with the number of moves, the static evaluation and (with
+    --depth or --nodes) the best move and its score. Only a few chunks per
+    worker are read ahead, so the memory doesn't grow with the input.
+
+    Usage:
+
+        python batch.py positions.fen --output results.jsonl
+        python batch.py games.pgn --depth 3 --output results.csv --workers 4
+'''
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, TextIO, Tuple
+from objects import Board
+import pgn
+import perft
+from search import Search, evaluate
+
+FIELDS = ('input', 'ply', 'fen', 'moves', 'eval', 'bestmove', 'score', 'depth', 'nodes', 'error')
+
+# the board and search of a worker process, set up by init_worker
+worker_board = None
+worker_search = None
+worker_limits = (0, 0)
+
+
+def init_worker(max_depth: int, max_nodes: int) -> None:
+    '''
+        Sets up the board and the search of a worker process
+
+        Parameters
+        ----------
+        max_depth: int
+            the depth of the search (0 for no search)
+
+        max_nodes: int
+            the node budget of the search (0 for no limit)
+    '''
+    global worker_board, worker_search, worker_limits
+    worker_board = Board()
+    worker_search = Search(board=worker_board)
+    worker_limits = (max_depth, max_nodes)
+
+
+def analyse_board(board: Board, search: Search, max_depth: int, max_nodes: int) -> Dict[str, object]:
+    '''
+        Analyses the position of a board
+
+        Parameters
+        ----------
+        board: Board
+            the board
+
+        search: Search
+            the search on the board
+
+        max_depth: int
+            the depth of the search (0 for no search)
+
+        max_nodes: int
+            the node budget of the search (0 for no limit)
+
+        Returns
+        -------
+        Dict[str, object]
+            the fields of the result (fen, moves, eval and the result of the search)
+    '''
+    record = {'fen': board.to_fen(), 'moves': len(board.generate_moves()), 'eval': evaluate(board)}
+    if max_depth > 0 or max_nodes > 0:
+        result = search.search(max_depth if max_depth > 0 else 64, max_nodes)
+        record['bestmove'] = perft.move_to_str(result.move) if result.move else None
+        record['score'] = result.score
+        record['depth'] = result.depth
+        record['nodes'] = result.nodes
+    return record
+
+
+def analyse_chunk(kind: str, items: List[Tuple[int, object]]) -> Tuple[int, float, List[Dict[str, object]]]:
+    '''
+        Analyses a chunk of the input in a worker process
+
+        Parameters
+        ----------
+        kind: str
+            fen or pgn
+
+        items: List[Tuple[int, object]]
+            (number in the input, FEN line or Pgn_Game)
+
+        Returns
+        -------
+        Tuple[int, float, List[Dict[str, object]]]
+            the id of the worker process, the seconds it worked and the results
+    '''
+    start = time.perf_counter()
+    searching = worker_limits[0] > 0 or worker_limits[1] > 0
+    records = []
+    for number, item in items:
+        # the table is cleared for every line or game, so the results don't depend on the chunks
+        if searching:
+            worker_search.table.clear()
+        if kind == 'fen':
+            try:
+                worker_board.load_fen(item)
+            except (ValueError, KeyError, IndexError):
+                records.append({'input': number, 'ply': 0, 'fen': item.strip(), 'error': 'invalid FEN'})
+                continue
+            records.append(analyse_item(number, 0, item.strip()))
+            continue
+        try:
+            worker_board.load_fen(item.get_fen())
+        except ValueError as exception:
+            records.append({'input': number, 'ply': 0, 'error': str(exception)})
+            continue
+        records.append(analyse_item(number, 0))
+        ply = 0
+        try:
+            # the start position is already on the board
+            for _ in pgn.replay_game(item, worker_board, load=False):
+                if 'error' in records[-1]:
+                    # the board may be left in the middle of the failed search
+                    break
+                ply += 1
+                records.append(analyse_item(number, ply))
+        except ValueError as exception:
+            records.append({'input': number, 'ply': ply + 1, 'error': str(exception)})
+    return os.getpid(), time.perf_counter() - start, records
+
+
+def analyse_item(number: int, ply: int, fen: str = None) -> Dict[str, object]:
+    '''
+        Analyses the position of the board of the worker, a position the rules
+        can't analyse is reported (with its traceback on stderr) instead of
+        stopping the batch, other exceptions are bugs and aren't caught
+
+        Parameters
+        ----------
+        number: int
+            the number of the line or game in the input
+
+        ply: int
+            the ply of the position in the game (0 for a FEN line)
+
+        fen: str
+            the position for the error record (None to leave it out)
+
+        Returns
+        -------
+        Dict[str, object]
+            the result or the error
+    '''
+    max_depth, max_nodes = worker_limits
+    try:
+        return {'input': number, 'ply': ply, **analyse_board(worker_board, worker_search, max_depth, max_nodes)}
+    except (ValueError, KeyError, IndexError) as exception:
+        traceback.print_exc(file=sys.stderr)
+        record = {'input': number, 'ply': ply, 'error': 'analysis failed: {!r}'.format(exception)}
+        if fen is not None:
+            record['fen'] = fen
+        return record
+
+
+def read_items(stream: TextIO, kind: str) -> Iterator[Tuple[int, object]]:
+    '''
+        Reads the input one line or game at a time
+
+        Parameters
+        ----------
+        stream: TextIO
+            the input
+
+        kind: str
+            fen or pgn
+
+        Returns
+        -------
+        Iterator[Tuple[int, object]]
+            (number in the input, FEN line or Pgn_Game)
+    '''
+    if kind == 'pgn':
+        yield from enumerate(pgn.read_games(stream), 1)
+    else:
+        for number, line in enumerate(stream, 1):
+            if line.strip() and not line.startswith('#'):
+                yield number, line
+
+
+class Result_Writer():
+    '''
+        Writes the results as JSON lines or CSV
+
+        ...
+
+        Methods
+        -------
+        write(self, record: Dict[str, object]) -> None
+            Writes one result
+    '''
+    def __init__(self, stream: TextIO, output_format: str) -> None:
+        '''
+            Parameters
+            ----------
+            stream: TextIO
+                the output
+
+            output_format: str
+                jsonl or csv
+        '''
+        self.stream = stream
+        self.csv = None
+        if output_format == 'csv':
+            self.csv = csv.DictWriter(stream, FIELDS)
+            self.csv.writeheader()
+
+    def write(self, record: Dict[str, object]) -> None:
+        '''
+            Writes one result
+
+            Parameters
+            ----------
+            record: Dict[str, object]
+                the result
+        '''
+        if self.csv is not None:
+            self.csv.writerow(record)
+        else:
+            self.stream.write(json.dumps(record) + '\n')
+
+
+def run_batch(stream: TextIO, kind: str, writer: Result_Writer, workers: int, chunk_size: int,
+              max_depth: int = 0, max_nodes: int = 0, progress: TextIO = sys.stderr) -> Tuple[int, float, Dict[int, List[float]]]:
+    '''
+        Analyses the input on a process pool and writes the results in the order of the input
+
+        Parameters
+        ----------
+        stream: TextIO
+            the input
+
+        kind: str
+            fen or pgn
+
+        writer: Result_Writer
+            the output
+
+        workers: int
+            the number of worker processes (0 to analyse in this process)
+
+        chunk_size: int
+            the lines or games per task
+
+        max_depth: int
+            the depth of the search (0 for no search)
+
+        max_nodes: int
+            the node budget of the search (0 for no limit)
+
+        progress: TextIO
+            where the progress is printed about once a second (None for no progress)
+
+        Returns
+        -------
+        Tuple[int, float, Dict[int, List[float]]]
+            the number of analysed positions (without the error records), the seconds and
+            (positions, busy seconds) per worker process
+    '''
+    items = read_items(stream, kind)
+    chunks = iter(lambda: list(islice(items, chunk_size)), [])
+    per_worker: Dict[int, List[float]] = {}
+    positions = 0
+    start = last_report = time.perf_counter()
+
+    def collect(result: Tuple[int, float, List[Dict[str, object]]]) -> None:
+        nonlocal positions, last_report
+        pid, busy, records = result
+        analysed = 0
+        for record in records:
+            writer.write(record)
+            if 'error' not in record:
+                analysed += 1
+        # the error records are written, but they aren't analysed positions
+        stats = per_worker.setdefault(pid, [0, 0.0])
+        stats[0] += analysed
+        stats[1] += busy
+        positions += analysed
+        now = time.perf_counter()
+        if progress is not None and now - last_report >= 1.0:
+            last_report = now
+            progress.write('{} positions, {:.0f} positions/s\n'.format(positions, positions / (now - start)))
+            progress.flush()
+
+    if workers == 0:
+        init_worker(max_depth, max_nodes)
+        for chunk in chunks:
+            collect(analyse_chunk(kind, chunk))
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, context, init_worker, (max_depth, max_nodes)) as executor:
+            # a few chunks per worker are in flight, the oldest one is written first
+            pending: deque[Future] = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(analyse_chunk, kind, chunk))
+                if len(pending) >= 4 * workers:
+                    collect(pending.popleft().result())
+            while pending:
+                collect(pending.popleft().result())
+    return positions, time.perf_counter() - start, per_worker
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Analyses the positions of a FEN or PGN file on all cores')
+    parser.add_argument('file', help='the input (one FEN per line or PGN)')
+    parser.add_argument('--format', choices=('fen', 'pgn'), help='the format of the input (from the file extension if not given)')
+    parser.add_argument('--output', default='-', help='the output file (- for stdout)')
+    parser.add_argument('--output-format', choices=('jsonl', 'csv'), help='jsonl or csv (from the file extension if not given)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='the number of worker processes (0 for none)')
+    parser.add_argument('--chunk', type=int, help='the lines or games per task (default 64 lines or 2 games)')
+    parser.add_argument('--depth', type=int, default=0, help='the depth of the search for the best move (0 for no search)')
+    parser.add_argument('--nodes', type=int, default=0, help='the node budget of the search (0 for no limit)')
+    parser.add_argument('--quiet', action='store_true', help='do not print the progress')
+    args = parser.parse_args()
+
+    kind = args.format or ('pgn' if args.file.lower().endswith('.pgn') else 'fen')
+    output_format = args.output_format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    chunk_size = args.chunk or (2 if kind == 'pgn' else 64)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', newline='' if output_format == 'csv' else None)
+    try:
+        with open(args.file, encoding='utf-8', errors='replace') as stream:
+            positions, elapsed, per_worker = run_batch(stream, kind, Result_Writer(output, output_format), args.workers,
+                                                       chunk_size, args.depth, args.nodes, None if args.quiet else sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print('{} positions in {:.1f} s ({:.0f} positions/s)'.format(positions, elapsed, positions / elapsed if elapsed else 0),
+          file=sys.stderr)
+    for pid, (count, busy) in sorted(per_worker.items()):
+        print('worker {}: {} positions, {:.1f} s busy ({:.0f} positions/s)'.format(pid, count, busy, count / busy if busy else 0),
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,601 @@
+'''
+    Batched move generation: many positions at once with NumPy
+
+    Batch_Boards holds N positions as NumPy arrays of 64-bit bitboards (one
+    row of 12 bitboards per position, like Bitboard_Position.boards) and
+    computes for all of them at once, without a Python loop over the
+    positions or pieces:
+
+        move_masks     the squares every piece of the colour to move can move
+                       to (the moves of Piece.get_moves, with en passant on
+                       the ghost square and castling)
+        legal_masks    the same without the moves that leave the own king
+                       attacked (like pgn.leaves_king_attacked)
+        attacked       the squares attacked by white and by black
+        move_counts    the number of moves (len(Board.generate_moves()),
+                       so a promotion counts once for every piece)
+
+    The rules are the ones from objects.py: there is no check, and a
+    position in which a king has been taken has no moves. The attacks are
+    calculated with shifts of whole bitboards (sliders with Kogge-Stone
+    fills), with one bitboard per square for the masks, so every operation
+    works on arrays of N * 64 bitboards.
+
+    NumPy is optional for the rest of the game, only this module needs it.
+
+    Usage:
+
+        python batched.py --fen "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
+        python batched.py --file positions.fen
+'''
+import argparse
+from typing import Iterable, List, Tuple
+import bitboard
+from objects import Board
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def require_numpy() -> None:
+    '''
+        Raises an ImportError if NumPy is not installed
+    '''
+    if np is None:
+        raise ImportError('batched.py needs NumPy (pip install numpy)')
+
+
+if np is not None:
+    U64 = np.uint64
+    # the bit of every square
+    SQUARE_BITS = np.array([1 << sq for sq in range(64)], dtype=U64)
+    FILE_A = U64(0x0101010101010101)
+    FILE_H = U64(0x8080808080808080)
+    NOT_FILE_A = ~FILE_A
+    NOT_FILE_H = ~FILE_H
+    NOT_FILES_AB = ~(FILE_A | U64(0x0202020202020202))
+    NOT_FILES_GH = ~(FILE_H | U64(0x4040404040404040))
+    ALL = ~U64(0)
+    EMPTY = U64(0)
+    # the rows pawns promote on, for white (y = 0) and black (y = 7)
+    PROMOTION_ROWS = np.array([0xFF, 0xFF << 56], dtype=U64)
+    # (squares to shift, squares that can't be reached by wrapping around the board)
+    # for the directions of bitboard.DIRECTIONS
+    SHIFTS = ((1, NOT_FILE_A), (8, ALL), (9, NOT_FILE_A), (7, NOT_FILE_H),
+              (-1, NOT_FILE_H), (-8, ALL), (-7, NOT_FILE_A), (-9, NOT_FILE_H))
+    ROOK_SHIFTS = tuple(SHIFTS[direction] for direction in bitboard.ROOK_RAYS)
+    BISHOP_SHIFTS = tuple(SHIFTS[direction] for direction in bitboard.BISHOP_RAYS)
+    # the bytes of a bitboard, for counting bits without np.bitwise_count
+    BYTE_COUNTS = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def shift(bb: 'np.ndarray', squares: int) -> 'np.ndarray':
+    '''
+        Shifts bitboards by a number of squares (towards higher squares if positive)
+    '''
+    if squares > 0:
+        return bb << U64(squares)
+    return bb >> U64(-squares)
+
+
+def step(bb: 'np.ndarray', squares: int, mask: 'np.uint64') -> 'np.ndarray':
+    '''
+        Moves all the bits of bitboards one step in a direction (see SHIFTS)
+    '''
+    return shift(bb, squares) & mask
+
+
+def knight_attacks(bb: 'np.ndarray') -> 'np.ndarray':
+    '''
+        Returns the squares attacked by knights on the squares of bitboards
+    '''
+    return (shift(bb, 17) & NOT_FILE_A | shift(bb, 15) & NOT_FILE_H
+            | shift(bb, 10) & NOT_FILES_AB | shift(bb, 6) & NOT_FILES_GH
+            | shift(bb, -15) & NOT_FILE_A | shift(bb, -17) & NOT_FILE_H
+            | shift(bb, -6) & NOT_FILES_AB | shift(bb, -10) & NOT_FILES_GH)
+
+
+def king_attacks(bb: 'np.ndarray') -> 'np.ndarray':
+    '''
+        Returns the squares attacked by kings on the squares of bitboards
+    '''
+    attacks = bb | step(bb, 1, NOT_FILE_A) | step(bb, -1, NOT_FILE_H)
+    return (attacks | shift(attacks, 8) | shift(attacks, -8)) ^ bb
+
+
+def pawn_attacks(bb: 'np.ndarray', white: 'np.ndarray') -> 'np.ndarray':
+    '''
+        Returns the squares attacked by pawns on the squares of bitboards
+
+        Parameters
+        ----------
+        bb: np.ndarray
+            the pawns
+
+        white: np.ndarray
+            if the pawns are white (they attack towards y = 0) or black, broadcast against bb
+    '''
+    return np.where(white, step(bb, -9, NOT_FILE_H) | step(bb, -7, NOT_FILE_A),
+                    step(bb, 7, NOT_FILE_H) | step(bb, 9, NOT_FILE_A))
+
+
+def slider_attacks(bb: 'np.ndarray', empty: 'np.ndarray', shifts: tuple) -> 'np.ndarray':
+    '''
+        Returns the squares attacked by sliders on the squares of bitboards
+        (the rays stop at and include the first occupied square)
+
+        Parameters
+        ----------
+        bb: np.ndarray
+            the sliders
+
+        empty: np.ndarray
+            the empty squares, broadcast against bb
+
+        shifts: tuple
+            the directions of the rays (see SHIFTS)
+    '''
+    attacks = np.zeros_like(bb)
+    for squares, mask in shifts:
+        # Kogge-Stone fill: the rays grow by 1, 2 and 4 squares through empty squares
+        generator = bb
+        propagator = empty & mask
+        generator = generator | propagator & shift(generator, squares)
+        propagator = propagator & shift(propagator, squares)
+        generator = generator | propagator & shift(generator, 2 * squares)
+        propagator = propagator & shift(propagator, 2 * squares)
+        generator = generator | propagator & shift(generator, 4 * squares)
+        attacks |= step(generator, squares, mask)
+    return attacks
+
+
+def squares_of(bb: 'np.ndarray') -> 'Tuple[np.ndarray, np.ndarray]':
+    '''
+        Returns the squares of all the set bits of bitboards
+
+        Parameters
+        ----------
+        bb: np.ndarray
+            (N,) bitboards
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            the index of the bitboard and the square of every set bit
+    '''
+    return np.nonzero(bb[:, None] & SQUARE_BITS)
+
+
+def count_bits(bb: 'np.ndarray') -> 'np.ndarray':
+    '''
+        Returns the number of set bits of every bitboard
+    '''
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bb).astype(np.int64)
+    bytes_ = np.ascontiguousarray(bb).view(np.uint8).reshape(bb.shape + (8,))
+    return BYTE_COUNTS[bytes_].sum(axis=-1, dtype=np.int64)
+
+
+class Batch_Boards():
+    '''
+        Many positions as NumPy arrays, the moves of all of them are calculated at once
+
+        ...
+
+        Attributes
+        ----------
+        pieces: np.ndarray
+            (N, 12) uint64, one bitboard per colour and piece type (index colour * 6 + piece type)
+
+        turn: np.ndarray
+            (N,) uint8, the colour to move (bitboard.WHITE or bitboard.BLACK)
+
+        castling: np.ndarray
+            (N,) uint8, the castling rights
+
+        ghost: np.ndarray
+            (N,) uint64, the bit of the ghost square (0 if there is none)
+
+        unmoved_pawns: np.ndarray
+            (N,) uint64, the pawns which may still move two squares forward
+
+        Methods
+        -------
+        from_positions(positions: Iterable[bitboard.Bitboard_Position]) -> Batch_Boards
+            Builds a batch from bitboard positions
+
+        from_boards(boards: Iterable[Board]) -> Batch_Boards
+            Builds a batch from the positions of boards
+
+        from_fens(fens: Iterable[str]) -> Batch_Boards
+            Builds a batch from FEN strings
+
+        from_packed(data: np.ndarray) -> Batch_Boards
+            Builds a batch from packed positions (packed.py)
+
+        occupancy(self) -> np.ndarray
+            Returns the squares occupied by white and by black
+
+        attacked(self) -> np.ndarray
+            Returns the squares attacked by white and by black
+
+        own_pieces(self, piece_type: int) -> np.ndarray
+            Returns the pieces of a type of the colour to move
+
+        pawn_masks(self) -> np.ndarray
+            Returns the squares every pawn of the colour to move can move to
+
+        move_masks(self) -> np.ndarray
+            Returns the squares every piece of the colour to move can move to
+
+        legal_masks(self, chunk: int = 1024) -> np.ndarray
+            Returns the move masks without the moves that leave the own king attacked
+
+        king_attacked_after(self, index: np.ndarray, from_sq: np.ndarray, to_sq: np.ndarray) -> np.ndarray
+            Checks for moves if the king of the colour to move is attacked after them
+
+        move_counts(self, legal: bool = False) -> np.ndarray
+            Returns the number of moves of every position
+    '''
+    def __init__(self, pieces: 'np.ndarray', turn: 'np.ndarray', castling: 'np.ndarray',
+                 ghost: 'np.ndarray', unmoved_pawns: 'np.ndarray') -> None:
+        '''
+            Parameters
+            ----------
+            pieces: np.ndarray
+                (N, 12) bitboards of the pieces
+
+            turn: np.ndarray
+                (N,) colours to move
+
+            castling: np.ndarray
+                (N,) castling rights
+
+            ghost: np.ndarray
+                (N,) bits of the ghost squares
+
+            unmoved_pawns: np.ndarray
+                (N,) bitboards of the unmoved pawns
+        '''
+        require_numpy()
+        self.pieces = np.asarray(pieces, dtype=U64).reshape(-1, 12)
+        self.turn = np.asarray(turn, dtype=np.uint8)
+        self.castling = np.asarray(castling, dtype=np.uint8)
+        self.ghost = np.asarray(ghost, dtype=U64)
+        self.unmoved_pawns = np.asarray(unmoved_pawns, dtype=U64)
+
+    def __len__(self) -> int:
+        return len(self.pieces)
+
+    @staticmethod
+    def from_positions(positions: Iterable[bitboard.Bitboard_Position]) -> 'Batch_Boards':
+        '''
+            Builds a batch from bitboard positions
+
+            Parameters
+            ----------
+            positions: Iterable[bitboard.Bitboard_Position]
+                the positions
+
+            Returns
+            -------
+            Batch_Boards
+                the batch
+        '''
+        require_numpy()
+        positions = list(positions)
+        return Batch_Boards([position.boards for position in positions],
+                            [position.turn for position in positions],
+                            [position.castling for position in positions],
+                            [1 << position.ghost if position.ghost >= 0 else 0 for position in positions],
+                            [position.unmoved_pawns for position in positions])
+
+    @staticmethod
+    def from_boards(boards: Iterable[Board]) -> 'Batch_Boards':
+        '''
+            Builds a batch from the positions of boards
+
+            Parameters
+            ----------
+            boards: Iterable[Board]
+                the boards
+
+            Returns
+            -------
+            Batch_Boards
+                the batch
+        '''
+        return Batch_Boards.from_positions(board.get_position() for board in boards)
+
+    @staticmethod
+    def from_fens(fens: Iterable[str]) -> 'Batch_Boards':
+        '''
+            Builds a batch from FEN strings
+
+            Parameters
+            ----------
+            fens: Iterable[str]
+                the positions
+
+            Returns
+            -------
+            Batch_Boards
+                the batch
+        '''
+        return Batch_Boards.from_positions(bitboard.Bitboard_Position.from_fen(fen) for fen in fens)
+
+    @staticmethod
+    def from_packed(data: 'np.ndarray') -> 'Batch_Boards':
+        '''
+            Builds a batch from packed positions (see packed.py) without unpacking them one by one,
+            e.g. np.frombuffer(dataset.records, np.uint8).reshape(-1, 50)[:, 8:46] for a Dataset
+
+            Parameters
+            ----------
+            data: np.ndarray
+                (N, 38) uint8, the packed positions
+
+            Returns
+            -------
+            Batch_Boards
+                the batch
+        '''
+        require_numpy()
+        data = np.asarray(data, dtype=np.uint8).reshape(-1, 38)
+        codes = np.empty((len(data), 64), dtype=np.uint8)
+        codes[:, 0::2] = data[:, :32] >> 4
+        codes[:, 1::2] = data[:, :32] & 15
+        pieces = np.stack([np.where(codes == index + 1, SQUARE_BITS, EMPTY).sum(axis=1, dtype=U64)
+                           for index in range(12)], axis=1)
+        ghost = data[:, 33].astype(np.int64)
+        unmoved = (pieces[:, bitboard.PAWN] & U64(bitboard.PAWN_START[bitboard.WHITE])
+                   | pieces[:, 6 + bitboard.PAWN] & U64(bitboard.PAWN_START[bitboard.BLACK]))
+        return Batch_Boards(pieces, data[:, 32] >> 4 & 1, data[:, 32] & 15,
+                            np.where(ghost < 64, SQUARE_BITS[np.minimum(ghost, 63)], EMPTY), unmoved)
+
+    def occupancy(self) -> 'np.ndarray':
+        '''
+            Returns the squares occupied by white and by black
+
+            Returns
+            -------
+            np.ndarray
+                (N, 2) uint64
+        '''
+        pieces = self.pieces
+        return np.stack([np.bitwise_or.reduce(pieces[:, :6], axis=1),
+                         np.bitwise_or.reduce(pieces[:, 6:], axis=1)], axis=1)
+
+    def attacked(self) -> 'np.ndarray':
+        '''
+            Returns the squares attacked by white and by black
+            (a square is attacked if a piece could take a piece on it)
+
+            Returns
+            -------
+            np.ndarray
+                (N, 2) uint64
+        '''
+        occupancy = self.occupancy()
+        empty = ~(occupancy[:, 0] | occupancy[:, 1])
+        attacked = np.empty_like(occupancy)
+        for colour in (bitboard.WHITE, bitboard.BLACK):
+            base = colour * 6
+            pieces = self.pieces[:, base:base + 6]
+            queens = pieces[:, bitboard.QUEEN]
+            attacked[:, colour] = (pawn_attacks(pieces[:, bitboard.PAWN], colour == bitboard.WHITE)
+                                   | knight_attacks(pieces[:, bitboard.KNIGHT])
+                                   | king_attacks(pieces[:, bitboard.KING])
+                                   | slider_attacks(pieces[:, bitboard.ROOK] | queens, empty, ROOK_SHIFTS)
+                                   | slider_attacks(pieces[:, bitboard.BISHOP] | queens, empty, BISHOP_SHIFTS))
+        return attacked
+
+    def own_pieces(self, piece_type: int) -> 'np.ndarray':
+        '''
+            Returns the pieces of a type of the colour to move
+
+            Parameters
+            ----------
+            piece_type: int
+                bitboard.PAWN, bitboard.KNIGHT, ...
+
+            Returns
+            -------
+            np.ndarray
+                (N,) uint64
+        '''
+        return np.where(self.turn == bitboard.WHITE, self.pieces[:, piece_type], self.pieces[:, 6 + piece_type])
+
+    def pawn_masks(self) -> 'np.ndarray':
+        '''
+            Returns the squares every pawn of the colour to move can move to
+
+            Returns
+            -------
+            np.ndarray
+                (N, 64) uint64, the targets of the pawn on every square (0 if there is none)
+        '''
+        occupancy = self.occupancy()
+        masks = np.zeros((len(self), 64), dtype=U64)
+        index, sq = squares_of(self.own_pieces(bitboard.PAWN))
+        pawns = SQUARE_BITS[sq]
+        white = self.turn[index] == bitboard.WHITE
+        enemy = np.where(white, occupancy[index, 1], occupancy[index, 0])
+        empty = ~(occupancy[index, 0] | occupancy[index, 1])
+        one = np.where(white, shift(pawns, -8), shift(pawns, 8)) & empty
+        unmoved = (pawns & self.unmoved_pawns[index]) != 0
+        two = np.where(unmoved, np.where(white, shift(one, -8), shift(one, 8)) & empty, EMPTY)
+        takes = pawn_attacks(pawns, white) & (enemy | self.ghost[index])
+        masks[index, sq] = one | two | takes
+        return masks
+
+    def move_masks(self) -> 'np.ndarray':
+        '''
+            Returns the squares every piece of the colour to move can move to
+            (the same squares as Piece.get_moves, none if a king has been taken)
+
+            Returns
+            -------
+            np.ndarray
+                (N, 64) uint64, the targets of the piece on every square (0 if there is none)
+        '''
+        occupancy = self.occupancy()
+        white = self.turn == bitboard.WHITE
+        own = np.where(white, occupancy[:, 0], occupancy[:, 1])
+        empty = ~(occupancy[:, 0] | occupancy[:, 1])
+
+        # only the squares with pieces are calculated, as one flat array per piece type
+        masks = self.pawn_masks()
+        for piece_type in (bitboard.KNIGHT, bitboard.BISHOP, bitboard.ROOK, bitboard.QUEEN, bitboard.KING):
+            index, sq = squares_of(self.own_pieces(piece_type))
+            pieces = SQUARE_BITS[sq]
+            if piece_type == bitboard.KNIGHT:
+                targets = knight_attacks(pieces)
+            elif piece_type == bitboard.KING:
+                targets = king_attacks(pieces)
+            else:
+                shifts = {bitboard.BISHOP: BISHOP_SHIFTS, bitboard.ROOK: ROOK_SHIFTS}.get(piece_type, SHIFTS)
+                targets = slider_attacks(pieces, empty[index], shifts)
+            masks[index, sq] = targets & ~own[index]
+
+        # castling: the king moves two squares if the right is left and the squares in between are free
+        kings = self.own_pieces(bitboard.KING)
+        rooks = self.own_pieces(bitboard.ROOK)
+        for colour, home in enumerate(bitboard.KING_HOME):
+            at_home = (self.turn == colour) & (kings & SQUARE_BITS[home] != 0)
+            for right, rook_sq, king_to, _, path in bitboard.CASTLING[colour]:
+                allowed = (at_home & (self.castling & right != 0) & (rooks & SQUARE_BITS[rook_sq] != 0)
+                           & (empty & U64(path) == U64(path)))
+                masks[allowed, home] |= SQUARE_BITS[king_to]
+
+        over = (self.pieces[:, bitboard.KING] == 0) | (self.pieces[:, 6 + bitboard.KING] == 0)
+        masks[over] = 0
+        return masks
+
+    def legal_masks(self, chunk: int = 1024) -> 'np.ndarray':
+        '''
+            Returns the move masks without the moves after which the king of the colour
+            to move could be taken (the rules have no check, this is like pgn.leaves_king_attacked)
+
+            Parameters
+            ----------
+            chunk: int
+                the number of positions whose moves are checked at once (limits the memory)
+
+            Returns
+            -------
+            np.ndarray
+                (N, 64) uint64, the legal targets of the piece on every square
+        '''
+        masks = self.move_masks()
+        legal = np.zeros_like(masks)
+        for start in range(0, len(self), chunk):
+            # one row per piece with moves and one entry per move: (row, to square)
+            index, from_sq = np.nonzero(masks[start:start + chunk])
+            index += start
+            bits = (masks[index, from_sq][:, None] & SQUARE_BITS) != 0
+            row, to_sq = np.nonzero(bits)
+            if not len(row):
+                continue
+            bits[row, to_sq] = ~self.king_attacked_after(index[row], from_sq[row], to_sq)
+            legal[index, from_sq] = np.packbits(bits, axis=1, bitorder='little').view('<u8')[:, 0]
+        return legal
+
+    def king_attacked_after(self, index: 'np.ndarray', from_sq: 'np.ndarray', to_sq: 'np.ndarray') -> 'np.ndarray':
+        '''
+            Checks for moves if the king of the colour to move is attacked after them
+
+            Parameters
+            ----------
+            index: np.ndarray
+                (M,) the positions of the moves
+
+            from_sq: np.ndarray
+                (M,) the squares the pieces move from
+
+            to_sq: np.ndarray
+                (M,) the squares the pieces move to
+
+            Returns
+            -------
+            np.ndarray
+                (M,) bool, if the king can be taken after the move
+        '''
+        pieces = self.pieces[index]
+        white = self.turn[index] == bitboard.WHITE
+        us = np.where(white, 0, 6)[:, None]
+        them = np.where(white, 6, 0)[:, None]
+        own = np.take_along_axis(pieces, us + np.arange(6), axis=1)
+        enemy = np.take_along_axis(pieces, them + np.arange(6), axis=1)
+        from_bit = SQUARE_BITS[from_sq]
+        to_bit = SQUARE_BITS[to_sq]
+
+        king = own[:, bitboard.KING]
+        king_moves = (king & from_bit) != 0
+        king = np.where(king_moves, to_bit, king)
+        # en passant takes the pawn next to the ghost square
+        en_passant = ((own[:, bitboard.PAWN] & from_bit) != 0) & (to_bit == self.ghost[index])
+        taken = to_bit | np.where(en_passant, np.where(white, shift(to_bit, 8), shift(to_bit, -8)), EMPTY)
+        enemy = enemy & ~taken[:, None]
+        occupied = (np.bitwise_or.reduce(own, axis=1) & ~from_bit | to_bit | np.bitwise_or.reduce(enemy, axis=1))
+        # castling moves the rook next to the king
+        castling = king_moves & (np.abs(to_sq.astype(np.int64) - from_sq) == 2)
+        kingside = to_sq > from_sq
+        rook_from = SQUARE_BITS[np.where(kingside, to_sq + 1, np.maximum(to_sq - 2, 0)) % 64]
+        rook_to = SQUARE_BITS[np.where(kingside, to_sq - 1, to_sq + 1) % 64]
+        occupied = np.where(castling, occupied & ~rook_from | rook_to, occupied)
+
+        empty = ~occupied
+        queens = enemy[:, bitboard.QUEEN]
+        attackers = ((pawn_attacks(king, white) & enemy[:, bitboard.PAWN])
+                     | (knight_attacks(king) & enemy[:, bitboard.KNIGHT])
+                     | (king_attacks(king) & enemy[:, bitboard.KING])
+                     | (slider_attacks(king, empty, ROOK_SHIFTS) & (enemy[:, bitboard.ROOK] | queens))
+                     | (slider_attacks(king, empty, BISHOP_SHIFTS) & (enemy[:, bitboard.BISHOP] | queens)))
+        return (king != 0) & (attackers != 0)
+
+    def move_counts(self, legal: bool = False) -> 'np.ndarray':
+        '''
+            Returns the number of moves of every position, a promotion
+            counts once for every piece (like len(Board.generate_moves()))
+
+            Parameters
+            ----------
+            legal: bool
+                if only the legal moves are counted
+
+            Returns
+            -------
+            np.ndarray
+                (N,) int64
+        '''
+        masks = self.legal_masks() if legal else self.move_masks()
+        counts = count_bits(masks).sum(axis=1)
+        pawns = self.own_pieces(bitboard.PAWN)[:, None] & SQUARE_BITS != 0
+        promotions = np.where(pawns, masks, EMPTY) & PROMOTION_ROWS[self.turn][:, None]
+        return counts + 3 * count_bits(promotions).sum(axis=1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Prints the number of moves of positions, calculated in one batch')
+    parser.add_argument('--fen', action='append', default=[], help='a position (can be given more than once)')
+    parser.add_argument('--file', help='a file with one FEN per line')
+    parser.add_argument('--legal', action='store_true', help='only counts the moves that don\'t leave the king attacked')
+    args = parser.parse_args()
+
+    require_numpy()
+    fens: List[str] = list(args.fen)
+    if args.file:
+        with open(args.file, encoding='utf-8') as stream:
+            fens.extend(line.strip() for line in stream if line.strip() and not line.startswith('#'))
+    if not fens:
+        fens.append(bitboard.START_FEN)
+    batch = Batch_Boards.from_fens(fens)
+    for fen, count in zip(fens, batch.move_counts(args.legal)):
+        print('{:>4} {}'.format(count, fen))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''
+    Benchmark for the scaling of the batch analysis with the number of workers
+
+    Analyses the same positions with 1, 2, 4, ... worker processes (up to
+    --max-workers) and reports the positions per second and the speedup
+    over one worker. The workers share nothing but the input and output
+    queues, so the speedup should stay close to the number of workers as
+    long as there are free cores. Without --file random positions are
+    written to a temporary file first.
+
+    Run from the repository root with:
+
+        python -m benchmarks.batch_scaling
+        python -m benchmarks.batch_scaling --file positions.fen --depth 2
+'''
+import argparse
+import io
+import os
+import tempfile
+from batch import Result_Writer, run_batch
+from benchmarks.fen_parse import write_positions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measures the positions per second of batch.py for different numbers of workers')
+    parser.add_argument('--file', help='a file with one FEN per line (random positions if not given)')
+    parser.add_argument('--positions', type=int, default=20000, help='the number of random positions')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1, help='the largest number of workers')
+    parser.add_argument('--depth', type=int, default=0, help='the depth of the search per position (0 for no search)')
+    parser.add_argument('--chunk', type=int, default=64, help='the positions per task')
+    args = parser.parse_args()
+
+    path = args.file
+    if path is None:
+        handle, path = tempfile.mkstemp(suffix='.fen')
+        os.close(handle)
+        write_positions(path, args.positions, 1)
+    try:
+        counts = []
+        workers = 1
+        while workers < args.max_workers:
+            counts.append(workers)
+            workers *= 2
+        counts.append(args.max_workers)
+        base = None
+        for workers in counts:
+            with open(path) as stream:
+                positions, elapsed, _ = run_batch(stream, 'fen', Result_Writer(io.StringIO(), 'jsonl'), workers,
+                                                  args.chunk, args.depth, progress=None)
+            rate = positions / elapsed
+            base = base or rate
+            print('{:>3} workers: {:>9.0f} positions/s  speedup {:.2f}'.format(workers, rate, rate / base))
+    finally:
+        if args.file is None:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+'''
+    Benchmark for the batched move generation
+
+    Counts the moves of the positions of random games once per board with
+    the pieces (Board.generate_moves), once per position with bitboards
+    (Bitboard_Position.generate_moves) and once for all positions at once
+    with NumPy (batched.Batch_Boards), and reports the boards per second.
+    The legal move counts (moves that don't leave the king attacked) are
+    measured for the batch as well.
+
+    Run from the repository root with:
+
+        python -m benchmarks.batched_moves
+        python -m benchmarks.batched_moves --positions 100000
+'''
+import argparse
+import time
+from bitboard import Bitboard_Position
+from benchmarks.position_memory import random_fens
+import batched
+from objects import Board
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measures the boards per second of the batched move generation')
+    parser.add_argument('--positions', type=int, default=20000, help='the number of positions')
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the random games')
+    args = parser.parse_args()
+
+    if batched.np is None:
+        print('NumPy is not installed, the batched move generation can\'t be measured')
+        return
+    fens = random_fens(args.positions, args.seed)
+
+    boards = []
+    for fen in fens:
+        board = Board(cache_size=0)
+        board.load_fen(fen)
+        boards.append(board)
+    start = time.perf_counter()
+    expected = [len(board.generate_moves()) for board in boards]
+    objects_rate = len(fens) / (time.perf_counter() - start)
+    print('objects:        {:>9.0f} boards/s'.format(objects_rate))
+
+    positions = [Bitboard_Position.from_fen(fen) for fen in fens]
+    start = time.perf_counter()
+    counts = [len(position.generate_moves()) for position in positions]
+    print('bitboard:       {:>9.0f} boards/s'.format(len(fens) / (time.perf_counter() - start)))
+    if counts != expected:
+        raise ValueError('the bitboard move counts differ from the ones of the pieces')
+
+    start = time.perf_counter()
+    batch = batched.Batch_Boards.from_positions(positions)
+    convert = time.perf_counter() - start
+    start = time.perf_counter()
+    counts = batch.move_counts()
+    elapsed = time.perf_counter() - start
+    print('batched:        {:>9.0f} boards/s  ({:.1f}x objects, {:.0f} boards/s with the conversion)'.format(
+        len(fens) / elapsed, len(fens) / elapsed / objects_rate, len(fens) / (elapsed + convert)))
+    if counts.tolist() != expected:
+        raise ValueError('the batched move counts differ from the ones of the pieces')
+
+    start = time.perf_counter()
+    batch.move_counts(legal=True)
+    print('batched legal:  {:>9.0f} boards/s'.format(len(fens) / (time.perf_counter() - start)))
+    start = time.perf_counter()
+    batch.attacked()
+    print('attacked:       {:>9.0f} boards/s'.format(len(fens) / (time.perf_counter() - start)))
+
+
+if __name__ == '__main__':
+    main()
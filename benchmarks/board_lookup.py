@@ -0,0 +1,85 @@
+'''
+    Microbenchmark for Piece_Handler.get_piece_on_board
+
+    Generates the moves of every piece in the starting position (plus a few
+    open positions with the middle pawns removed) once with the old linear
+    scan over Piece_Handler.pieces and once with the square index.
+
+    Run from the repository root with:
+
+        python -m benchmarks.board_lookup
+'''
+import argparse
+import timeit
+from typing import Tuple
+from objects import Piece_Handler, Piece
+
+
+def linear_scan(pos: Tuple[int, int]) -> Piece:
+    '''
+        The lookup Piece_Handler used before the square index was added
+
+        Parameters
+        ----------
+        pos: Tuple[int, int]
+            the position
+
+        Returns
+        -------
+        Piece
+            the piece on pos (or None)
+    '''
+    return next((piece for piece in Piece_Handler.get_pieces() if piece.get_pos() == pos), None)
+
+
+def open_position() -> None:
+    '''
+        Sets up the starting position without the d- and e-pawns,
+        which gives the sliders some room to move
+    '''
+    Piece_Handler.init_pieces()
+    for pos in ((3, 1), (4, 1), (3, 6), (4, 6)):
+        Piece_Handler.remove_piece(Piece_Handler.get_piece_on_board(pos))
+
+
+def generate_all_moves() -> int:
+    '''
+        Generates the moves of every piece on the board
+
+        Returns
+        -------
+        int
+            the number of generated moves
+    '''
+    return sum(len(piece.get_moves()) for piece in Piece_Handler.get_pieces())
+
+
+def measure(repeat: int) -> float:
+    '''
+        Returns the best time of full-board move generation in microseconds
+    '''
+    timer = timeit.Timer(generate_all_moves)
+    return min(timer.repeat(repeat, 100)) / 100 * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmarks board lookups during move generation')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timing runs')
+    args = parser.parse_args()
+
+    for name, setup in (('start position', Piece_Handler.init_pieces), ('open position', open_position)):
+        setup()
+        indexed = measure(args.repeat)
+        # the pieces look up squares through their board, so the lookup is
+        # replaced on the board instance only
+        Piece_Handler.get_piece_on_board = linear_scan
+        try:
+            scanned = measure(args.repeat)
+        finally:
+            del Piece_Handler.get_piece_on_board
+        print('{:<16} linear scan: {:8.1f} us   square index: {:8.1f} us   speedup: {:.1f}x'.format(
+            name, scanned, indexed, scanned / indexed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''
+    Benchmark for opening book lookups
+
+    Builds a book from random games (or opens --book), then measures how
+    long opening the book takes and how many lookups per second the binary
+    search over the memory-mapped file does, for hashes that are in the
+    book and for random ones that aren't.
+
+    Run from the repository root with:
+
+        python -m benchmarks.book_lookup
+        python -m benchmarks.book_lookup --book book.bin
+'''
+import argparse
+import os
+import random
+import tempfile
+import time
+from benchmarks.pgn_replay import write_games
+from book import ENTRY, KEY, Opening_Book, build_book
+import pgn
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measures the lookups per second of an opening book')
+    parser.add_argument('--book', help='a book file (built from random games if not given)')
+    parser.add_argument('--games', type=int, default=1000, help='the number of random games the book is built from')
+    parser.add_argument('--lookups', type=int, default=100000, help='the number of lookups')
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the random games and hashes')
+    args = parser.parse_args()
+
+    path = args.book
+    if path is None:
+        handle, path = tempfile.mkstemp(suffix='.bin')
+        os.close(handle)
+        games_path = path + '.pgn'
+        write_games(games_path, args.games, args.seed)
+        with open(games_path, encoding='utf-8') as stream:
+            build_book(pgn.read_games(stream), path)
+        os.remove(games_path)
+    try:
+        start = time.perf_counter()
+        book = Opening_Book(path)
+        print('open:   {:.3f} ms for {} entries ({} kB)'.format(
+            1000 * (time.perf_counter() - start), book.size, book.size * ENTRY.size // 1024))
+        if not book.size:
+            print('the book is empty')
+            return
+        rng = random.Random(args.seed)
+        keys = [KEY.unpack_from(book.data, rng.randrange(book.size) * ENTRY.size)[0] for _ in range(args.lookups)]
+        start = time.perf_counter()
+        found = sum(len(book.get_entries(key)) for key in keys)
+        elapsed = time.perf_counter() - start
+        print('hits:   {:>9.0f} lookups/s ({:.1f} moves per position)'.format(args.lookups / elapsed, found / args.lookups))
+        keys = [rng.getrandbits(64) for _ in range(args.lookups)]
+        start = time.perf_counter()
+        found = sum(len(book.get_entries(key)) for key in keys)
+        elapsed = time.perf_counter() - start
+        print('misses: {:>9.0f} lookups/s'.format(args.lookups / elapsed))
+        book.close()
+    finally:
+        if args.book is None:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
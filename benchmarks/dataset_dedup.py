@@ -0,0 +1,72 @@
+'''
+    Benchmark for position datasets
+
+    Collects the positions of random games into a dataset (twice, so every
+    position has a duplicate), then measures the records per second of the
+    deduplication once in memory and once with small runs that are merged
+    from temporary files (the path for files larger than the memory), and
+    how fast single records are read from the memory-mapped result.
+
+    Run from the repository root with:
+
+        python -m benchmarks.dataset_dedup
+        python -m benchmarks.dataset_dedup --games 2000 --run-size 10000
+'''
+import argparse
+import os
+import random
+import tempfile
+import time
+from benchmarks.pgn_replay import write_games
+import dataset
+from objects import Board
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measures the records per second of collecting and deduplicating datasets')
+    parser.add_argument('--games', type=int, default=500, help='the number of random games')
+    parser.add_argument('--run-size', type=int, default=5000, help='the records per run of the external sort')
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the random games')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        games = os.path.join(directory, 'games.pgn')
+        path = os.path.join(directory, 'positions.dat')
+        write_games(games, args.games, args.seed)
+        start = time.perf_counter()
+        writer = dataset.Dataset_Writer(path)
+        for _ in range(2):
+            with open(games, encoding='utf-8') as stream:
+                dataset.collect(stream, 'pgn', writer)
+        writer.close()
+        elapsed = time.perf_counter() - start
+        print('collect:        {:>9.0f} records/s ({} records, {} kB)'.format(
+            writer.count / elapsed, writer.count, os.path.getsize(path) // 1024))
+
+        for name, run_size in (('in memory', writer.count + 1), ('external', args.run_size)):
+            output = os.path.join(directory, 'unique.dat')
+            start = time.perf_counter()
+            read, written = dataset.dedup([path], output, run_size, directory)
+            elapsed = time.perf_counter() - start
+            runs = (read + run_size - 1) // run_size
+            print('dedup {:<9} {:>9.0f} records/s ({} unique, {} runs)'.format(name + ':', read / elapsed, written, runs))
+
+        data = dataset.Dataset(output)
+        rng = random.Random(args.seed)
+        indices = [rng.randrange(len(data)) for _ in range(10000)]
+        start = time.perf_counter()
+        for index in indices:
+            data.get_hash(index)
+        elapsed = time.perf_counter() - start
+        print('get_hash:       {:>9.0f} records/s'.format(len(indices) / elapsed))
+        board = Board()
+        start = time.perf_counter()
+        for index in indices[:2000]:
+            data.load(index, board)
+        elapsed = time.perf_counter() - start
+        print('load:           {:>9.0f} records/s'.format(2000 / elapsed))
+        data.close()
+
+
+if __name__ == '__main__':
+    main()
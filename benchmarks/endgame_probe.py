@@ -0,0 +1,74 @@
+'''
+    Benchmark for probing the endgame tables
+
+    Sets up random positions of every table and measures the microseconds
+    of Endgame_Tables.probe (the result of a position) and best_move
+    (probes every move). Without --dir the tables are generated into a
+    temporary directory first.
+
+    Run from the repository root with:
+
+        python -m benchmarks.endgame_probe
+        python -m benchmarks.endgame_probe --dir tables
+'''
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from endgame import TABLES, Endgame_Tables, generate_tables
+from objects import Board
+
+
+def random_fen(name: str, rng: random.Random) -> str:
+    '''
+        Returns a random position of a table (with white as the strong side)
+    '''
+    while True:
+        strong_king, piece, weak_king = rng.sample(range(64), 3)
+        if name != 'KPK' or 8 <= piece < 56:
+            break
+    rows = [['1'] * 8 for _ in range(8)]
+    for sq, letter in ((strong_king, 'K'), (piece, name[1]), (weak_king, 'k')):
+        rows[sq // 8][sq % 8] = letter
+    return '{} {} - - 0 1'.format('/'.join(''.join(row) for row in rows), rng.choice('wb'))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measures the latency of endgame table probes')
+    parser.add_argument('--dir', help='the directory of the tables (generated into a temporary one if not given)')
+    parser.add_argument('--positions', type=int, default=2000, help='the number of positions per table')
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the random positions')
+    args = parser.parse_args()
+
+    directory = args.dir
+    if directory is None:
+        directory = tempfile.mkdtemp()
+        generate_tables(directory, os.cpu_count() or 1)
+    try:
+        rng = random.Random(args.seed)
+        tables = Endgame_Tables(directory)
+        for name in TABLES:
+            boards = []
+            for _ in range(args.positions):
+                board = Board()
+                board.load_fen(random_fen(name, rng))
+                boards.append(board)
+            start = time.perf_counter()
+            for board in boards:
+                tables.probe(board)
+            probe = (time.perf_counter() - start) / len(boards)
+            start = time.perf_counter()
+            for board in boards:
+                tables.best_move(board)
+            best_move = (time.perf_counter() - start) / len(boards)
+            print('{}: probe {:6.1f} us  best_move {:7.1f} us'.format(name, 1e6 * probe, 1e6 * best_move))
+        tables.close()
+    finally:
+        if args.dir is None:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+'''
+    Benchmark for loading positions from FEN
+
+    Reads a file with one FEN per line and parses every line once into
+    bitboards (Bitboard_Position.from_fen, the path for bulk analysis) and
+    once into pieces (Board.load_fen), and reports the positions per second
+    (the round trip through to_fen is measured as well).
+    Without --file the positions of random games are written to a
+    temporary file first.
+
+    Run from the repository root with:
+
+        python -m benchmarks.fen_parse
+        python -m benchmarks.fen_parse --file positions.fen
+'''
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Callable
+from bitboard import Bitboard_Position
+from objects import Board
+
+
+def write_positions(path: str, count: int, seed: int) -> None:
+    '''
+        Writes the positions of random games to a file
+
+        Parameters
+        ----------
+        path: str
+            the file
+
+        count: int
+            the number of positions
+
+        seed: int
+            the seed of the random moves
+    '''
+    rng = random.Random(seed)
+    board = Board()
+    written = 0
+    with open(path, 'w') as file:
+        while written < count:
+            board.init_pieces()
+            for _ in range(rng.randrange(10, 120)):
+                moves = board.generate_moves()
+                if not moves or written >= count:
+                    break
+                from_pos, to_pos, promotion = rng.choice(moves)
+                board.make_move(board.get_piece_on_board(from_pos), to_pos, promotion)
+                file.write(board.to_fen() + '\n')
+                written += 1
+
+
+def measure(path: str, parse: Callable[[str], object]) -> float:
+    '''
+        Parses every line of a file
+
+        Parameters
+        ----------
+        path: str
+            the file
+
+        parse: Callable[[str], object]
+            the parser
+
+        Returns
+        -------
+        float
+            the positions per second
+    '''
+    count = 0
+    start = time.perf_counter()
+    with open(path) as file:
+        for line in file:
+            parse(line)
+            count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measures how many FEN positions per second can be loaded')
+    parser.add_argument('--file', help='a file with one FEN per line (random positions if not given)')
+    parser.add_argument('--positions', type=int, default=100000, help='the number of random positions')
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the random positions')
+    args = parser.parse_args()
+
+    path = args.file
+    if path is None:
+        handle, path = tempfile.mkstemp(suffix='.fen')
+        os.close(handle)
+        write_positions(path, args.positions, args.seed)
+    try:
+        board = Board()
+        print('Bitboard_Position.from_fen: {:>10.0f} positions/s'.format(measure(path, Bitboard_Position.from_fen)))
+        print('Board.load_fen:             {:>10.0f} positions/s'.format(measure(path, board.load_fen)))
+        print('from_fen + to_fen:          {:>10.0f} positions/s'.format(
+            measure(path, lambda line: Bitboard_Position.from_fen(line).to_fen())))
+    finally:
+        if args.file is None:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
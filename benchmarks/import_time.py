@@ -0,0 +1,87 @@
+'''
+    Benchmark for the import time of the rules core
+
+    Every worker process (engine, server, batch analysis) imports the rules
+    before it can do anything, so their import time is paid once per process.
+    Every module is imported in a fresh interpreter a few times and the best
+    time is reported, together with pygame for comparison. The benchmark
+    fails if a headless module pulls in pygame or takes longer than --budget.
+
+    Run from the repository root with:
+
+        python -m benchmarks.import_time
+'''
+import argparse
+import compileall
+import subprocess
+import sys
+from pathlib import Path
+from typing import Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+# the modules the worker processes import
+HEADLESS = ('bitboard', 'zobrist', 'objects', 'packed', 'perft', 'endgame', 'search', 'engine', 'pgn', 'batch', 'instrumentation')
+
+SNIPPET = '''
+import sys, time
+start = time.perf_counter()
+import {}
+print(time.perf_counter() - start, 'pygame' in sys.modules)
+'''
+
+
+def measure(module: str, repeat: int) -> Tuple[float, bool]:
+    '''
+        Imports a module in fresh interpreters
+
+        Parameters
+        ----------
+        module: str
+            the name of the module
+
+        repeat: int
+            the number of interpreters
+
+        Returns
+        -------
+        Tuple[float, bool]
+            the best import time in milliseconds, if pygame was imported
+    '''
+    best = float('inf')
+    loaded = False
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', SNIPPET.format(module)], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.split()
+        best = min(best, float(output[-2]) * 1000)
+        loaded = output[-1] == 'True'
+    return best, loaded
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measures the import time of the headless modules')
+    parser.add_argument('--repeat', type=int, default=5, help='number of interpreters per module')
+    parser.add_argument('--budget', type=float, default=50.0, help='the allowed import time of a module in milliseconds')
+    args = parser.parse_args()
+
+    # the modules are compiled once, like an installed package
+    compileall.compile_dir(str(ROOT), maxlevels=0, quiet=1)
+    failed = False
+    for module in HEADLESS:
+        elapsed, loaded = measure(module, args.repeat)
+        status = 'ok'
+        if loaded:
+            status = 'FAILED (imports pygame)'
+        elif elapsed > args.budget:
+            status = 'FAILED (over {:.0f} ms)'.format(args.budget)
+        failed = failed or status != 'ok'
+        print('{:<15} {:8.1f} ms  {}'.format(module, elapsed, status))
+    try:
+        elapsed, _ = measure('pygame', args.repeat)
+        print('{:<15} {:8.1f} ms  (for comparison)'.format('pygame', elapsed))
+    except subprocess.CalledProcessError:
+        print('pygame is not installed')
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
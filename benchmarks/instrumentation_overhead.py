@@ -0,0 +1,61 @@
+'''
+    Benchmark for the overhead of the instrumentation
+
+    Runs perft from the start position three times: before anything is
+    instrumented, with the hot paths of the move generation instrumented
+    like main.py --instrument does (Board.get_piece_on_board counted,
+    Piece.calculate_moves and Board.get_piece_moves timed), and again after
+    the original functions were restored. The first and the last run should
+    take the same time, the instrumentation only costs while it is enabled.
+
+    Run from the repository root with:
+
+        python -m benchmarks.instrumentation_overhead
+        python -m benchmarks.instrumentation_overhead --depth 4
+'''
+import argparse
+import time
+from instrumentation import Instrumentation
+from objects import Board, Piece
+import perft
+
+
+def measure(depth: int, repeat: int) -> float:
+    '''
+        Returns the best time of perft from the start position in seconds
+    '''
+    board = Board()
+    best = None
+    for _ in range(repeat):
+        board.init_pieces()
+        start = time.perf_counter()
+        perft.perft(depth, 'white', board)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measures the cost of the instrumentation while it is enabled and disabled')
+    parser.add_argument('--depth', type=int, default=3, help='the perft depth')
+    parser.add_argument('--repeat', type=int, default=3, help='the runs per measurement (the best one counts)')
+    args = parser.parse_args()
+
+    disabled = measure(args.depth, args.repeat)
+    print('disabled:  {:8.3f} s'.format(disabled))
+    instruments = Instrumentation()
+    instruments.instrument(Board, 'get_piece_on_board', timed=False)
+    instruments.instrument(Piece, 'calculate_moves')
+    instruments.instrument(Board, 'get_piece_moves')
+    enabled = measure(args.depth, args.repeat)
+    instruments.end_frame(enabled)
+    print('enabled:   {:8.3f} s  ({:+.1f} %)'.format(enabled, 100 * (enabled / disabled - 1)))
+    for name, phase in instruments.summary(recent=False)['phases'].items():
+        print('    {}: {} calls'.format(name, phase['calls']))
+    instruments.restore()
+    restored = measure(args.depth, args.repeat)
+    print('restored:  {:8.3f} s  ({:+.1f} %)'.format(restored, 100 * (restored / disabled - 1)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+'''
+    Benchmark for the move cache of the boards
+
+    Plays random games and imitates the clicks of a player in every
+    position: a few pieces are selected (the circles of their moves are
+    shown) before one of them is moved (the move is checked against its
+    moves again). This is done once with the move cache and once without
+    it (cache size 0), and the microseconds per click and the hit rate of
+    the cache are reported.
+
+    Run from the repository root with:
+
+        python -m benchmarks.move_cache
+        python -m benchmarks.move_cache --selections 5
+'''
+import argparse
+import random
+import time
+from typing import Tuple
+from objects import Board
+
+
+def play_clicks(board: Board, games: int, selections: int, seed: int) -> Tuple[int, float]:
+    '''
+        Plays random games, selecting pieces before every move like the game does
+
+        Parameters
+        ----------
+        board: Board
+            the board
+
+        games: int
+            the number of games
+
+        selections: int
+            the number of pieces selected before the move (the moved piece is selected last)
+
+        seed: int
+            the seed of the random moves
+
+        Returns
+        -------
+        Tuple[int, float]
+            the number of clicks and the seconds spent on them
+            (without choosing the random moves)
+    '''
+    rng = random.Random(seed)
+    clicks = 0
+    elapsed = 0.0
+    for _ in range(games):
+        board.init_pieces()
+        for _ in range(80):
+            moves = board.generate_moves()
+            if not moves:
+                break
+            move = rng.choice(moves)
+            own = [piece for piece in board.pieces if piece.get_colour() == board.turn]
+            start = time.perf_counter()
+            for _ in range(selections - 1):
+                board.get_piece_moves(rng.choice(own))
+            piece = board.get_piece_on_board(move[0])
+            board.get_piece_moves(piece)
+            if not piece.move_piece(move[1]):
+                raise ValueError('the move was not valid')
+            elapsed += time.perf_counter() - start
+            if move[2]:
+                board.promote_piece(piece, move[2])
+            clicks += selections + 1
+    return clicks, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measures the time per click with and without the move cache')
+    parser.add_argument('--games', type=int, default=50, help='the number of random games')
+    parser.add_argument('--selections', type=int, default=3, help='the pieces selected before every move')
+    parser.add_argument('--size', type=int, default=1024, help='the size of the move cache')
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the random games')
+    args = parser.parse_args()
+
+    for size in (0, args.size):
+        board = Board(cache_size=size)
+        clicks, elapsed = play_clicks(board, args.games, args.selections, args.seed)
+        cache = board.move_cache
+        print('cache size {:>5}: {:6.1f} us per click  {:>7} hits  {:>7} misses  hit rate {:5.1f} %'.format(
+            size, 1e6 * elapsed / clicks, cache.hits, cache.misses, 100 * cache.hit_rate()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+'''
+    Benchmark for reading and replaying PGN archives
+
+    Reads a PGN file once only parsing the games (pgn.read_games) and once
+    replaying every move on a board (pgn.replay_games, which resolves the
+    SAN moves and validates them), and reports the games per second.
+    Without --file random games are written to a temporary file first.
+
+    Run from the repository root with:
+
+        python -m benchmarks.pgn_replay
+        python -m benchmarks.pgn_replay --file games.pgn
+'''
+import argparse
+import os
+import random
+import tempfile
+import time
+from objects import Board
+import pgn
+
+
+def write_games(path: str, count: int, seed: int) -> None:
+    '''
+        Writes random games to a PGN file
+
+        Parameters
+        ----------
+        path: str
+            the file
+
+        count: int
+            the number of games
+
+        seed: int
+            the seed of the random moves
+    '''
+    rng = random.Random(seed)
+    board = Board()
+    with open(path, 'w', encoding='utf-8') as file:
+        for number in range(count):
+            board.init_pieces()
+            moves = []
+            result = '*'
+            for _ in range(rng.randrange(20, 160)):
+                legal = board.generate_moves()
+                if not legal:
+                    break
+                move = rng.choice(legal)
+                moves.append(move)
+                taken = board.get_piece_on_board(move[1])
+                if taken is not None and taken.get_class_name() == 'King':
+                    result = '1-0' if board.turn == 'white' else '0-1'
+                    break
+                board.make_move(board.get_piece_on_board(move[0]), move[1], move[2])
+            pgn.write_game(file, moves, {'Event': 'Random games', 'Round': str(number + 1)}, result)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measures how many PGN games per second can be read and replayed')
+    parser.add_argument('--file', help='a PGN file (random games if not given)')
+    parser.add_argument('--games', type=int, default=500, help='the number of random games')
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the random games')
+    args = parser.parse_args()
+
+    path = args.file
+    if path is None:
+        handle, path = tempfile.mkstemp(suffix='.pgn')
+        os.close(handle)
+        write_games(path, args.games, args.seed)
+    try:
+        start = time.perf_counter()
+        with open(path, encoding='utf-8', errors='replace') as file:
+            games = sum(1 for _ in pgn.read_games(file))
+        elapsed = time.perf_counter() - start
+        print('read_games:   {:>8.0f} games/s'.format(games / elapsed))
+
+        games = plies = invalid = 0
+        start = time.perf_counter()
+        with open(path, encoding='utf-8', errors='replace') as file:
+            for replay in pgn.replay_games(file):
+                games += 1
+                plies += replay.plies
+                invalid += replay.error is not None
+        elapsed = time.perf_counter() - start
+        print('replay_games: {:>8.0f} games/s  {:>8.0f} plies/s  ({} games, {} invalid)'.format(
+            games / elapsed, plies / elapsed, games, invalid))
+    finally:
+        if args.file is None:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+'''
+    Benchmark for the memory of stored positions
+
+    Keeps the same positions of random games in memory in different
+    representations and reports the bytes per position (measured with
+    tracemalloc, so the objects the positions reference are counted too):
+    boards with their pieces, bitboard positions, FEN strings and packed
+    positions (packed.py). The packing and unpacking speed is reported
+    as well.
+
+    Run from the repository root with:
+
+        python -m benchmarks.position_memory
+        python -m benchmarks.position_memory --positions 100000
+'''
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from typing import Callable, List
+from bitboard import Bitboard_Position
+from objects import Board
+import packed
+
+
+def random_fens(count: int, seed: int) -> List[str]:
+    '''
+        Returns the positions of random games as FEN strings
+
+        Parameters
+        ----------
+        count: int
+            the number of positions
+
+        seed: int
+            the seed of the random moves
+
+        Returns
+        -------
+        List[str]
+            the positions
+    '''
+    rng = random.Random(seed)
+    board = Board()
+    fens = []
+    while len(fens) < count:
+        board.init_pieces()
+        for _ in range(rng.randrange(10, 120)):
+            moves = board.generate_moves()
+            if not moves or len(fens) >= count:
+                break
+            from_pos, to_pos, promotion = rng.choice(moves)
+            board.make_move(board.get_piece_on_board(from_pos), to_pos, promotion)
+            fens.append(board.to_fen())
+    return fens
+
+
+def measure(fens: List[str], convert: Callable[[str], object]) -> float:
+    '''
+        Converts every position and keeps the results
+
+        Parameters
+        ----------
+        fens: List[str]
+            the positions
+
+        convert: Callable[[str], object]
+            turns a FEN into the stored representation
+
+        Returns
+        -------
+        float
+            the bytes per position
+    '''
+    gc.collect()
+    tracemalloc.start()
+    stored = [convert(fen) for fen in fens]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del stored
+    return size / len(fens)
+
+
+def load_board(fen: str) -> Board:
+    '''
+        Returns a board with the position of a FEN (without a move cache)
+    '''
+    board = Board(cache_size=0)
+    board.load_fen(fen)
+    board.history = []
+    return board
+
+
+def copy_fen(fen: str) -> str:
+    '''
+        Returns a new string with the same FEN (so its memory is counted)
+    '''
+    return fen.encode().decode()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measures the bytes per stored position of every representation')
+    parser.add_argument('--positions', type=int, default=20000, help='the number of positions')
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the random games')
+    args = parser.parse_args()
+
+    fens = random_fens(args.positions, args.seed)
+    representations = (
+        ('Board', load_board),
+        ('Bitboard_Position', Bitboard_Position.from_fen),
+        ('FEN string', copy_fen),
+        ('packed bytes', packed.from_fen),
+    )
+    for name, convert in representations:
+        print('{:<18} {:>8.0f} bytes per position'.format(name, measure(fens, convert)))
+
+    board = Board()
+    data = []
+    pack = 0.0
+    for fen in fens:
+        board.load_fen(fen)
+        start = time.perf_counter()
+        data.append(packed.pack_board(board))
+        pack += time.perf_counter() - start
+    start = time.perf_counter()
+    for item in data:
+        packed.unpack_board(item, board)
+    unpack = time.perf_counter() - start
+    print('pack_board:   {:6.1f} us per position'.format(1e6 * pack / len(fens)))
+    print('unpack_board: {:6.1f} us per position'.format(1e6 * unpack / len(fens)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+'''
+    Benchmark for the throughput of self-play tournaments
+
+    Plays the same games between a fixed-depth engine and a random mover
+    with 1, 2, 4, ... worker processes (up to --max-workers) and reports the
+    games per hour, the games per hour per core (games per busy second of
+    the workers) and the speedup over one worker. The games of a tournament
+    are independent, so the games per hour should grow with the number of
+    workers as long as there are free cores.
+
+    Run from the repository root with:
+
+        python -m benchmarks.tournament_rate
+        python -m benchmarks.tournament_rate --games 200 --first "engine,nodes=500"
+'''
+import argparse
+import os
+from tournament import parse_player, run_tournament
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measures the games per hour of tournament.py for different numbers of workers')
+    parser.add_argument('--first', default='engine,depth=1', help='the first player')
+    parser.add_argument('--second', default='random', help='the second player')
+    parser.add_argument('--games', type=int, default=40, help='the number of games per run')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1, help='the largest number of workers')
+    args = parser.parse_args()
+
+    first = parse_player(args.first)
+    second = parse_player(args.second)
+    counts = []
+    workers = 1
+    while workers < args.max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(args.max_workers)
+    base = None
+    for workers in counts:
+        stats, _, elapsed, busy = run_tournament(first, second, args.games, [], workers, progress=None)
+        rate = 3600 * stats.games() / elapsed
+        base = base or rate
+        print('{:>3} workers: {:>9.0f} games/hour  {:>9.0f} games/hour per core  speedup {:.2f}'.format(
+            workers, rate, 3600 * stats.games() / busy, rate / base))
+
+
+if __name__ == '__main__':
+    main()
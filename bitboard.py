@@ -0,0 +1,619 @@
+from typing import List, Tuple
+
+WHITE = 0
+BLACK = 1
+COLOURS = ('white', 'black')
+
+PAWN = 0
+KNIGHT = 1
+BISHOP = 2
+ROOK = 3
+QUEEN = 4
+KING = 5
+PIECE_NAMES = ('Pawn', 'Knight', 'Bishop', 'Rook', 'Queen', 'King')
+
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+FULL = (1 << 64) - 1
+
+# squares are numbered y * 8 + x like Piece_Handler.square_index,
+# so square 0 is a8 (black's corner) and square 63 is h1
+KING_HOME = (60, 4)
+CASTLING = (
+    # (right, rook square, king target, rook target, squares that need to be free)
+    ((WHITE_KINGSIDE, 63, 62, 61, (1 << 61) | (1 << 62)),
+     (WHITE_QUEENSIDE, 56, 58, 59, (1 << 57) | (1 << 58) | (1 << 59))),
+    ((BLACK_KINGSIDE, 7, 6, 5, (1 << 5) | (1 << 6)),
+     (BLACK_QUEENSIDE, 0, 2, 3, (1 << 1) | (1 << 2) | (1 << 3))),
+)
+# a move from or to one of these squares removes the given castling rights
+CASTLING_MASK = [0] * 64
+CASTLING_MASK[60] = WHITE_KINGSIDE | WHITE_QUEENSIDE
+CASTLING_MASK[63] = WHITE_KINGSIDE
+CASTLING_MASK[56] = WHITE_QUEENSIDE
+CASTLING_MASK[4] = BLACK_KINGSIDE | BLACK_QUEENSIDE
+CASTLING_MASK[7] = BLACK_KINGSIDE
+CASTLING_MASK[0] = BLACK_QUEENSIDE
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+# the FEN letter of every board index (colour * 6 + piece type), upper case for white
+FEN_LETTERS = 'PNBRQKpnbrqk'
+FEN_INDEX = {letter: index for index, letter in enumerate(FEN_LETTERS)}
+FEN_CASTLING = {'K': WHITE_KINGSIDE, 'Q': WHITE_QUEENSIDE, 'k': BLACK_KINGSIDE, 'q': BLACK_QUEENSIDE}
+# the squares the pawns start on (they may move two squares forward from there)
+PAWN_START = (0xFF << 48, 0xFF << 8)
+
+# direction vectors of the sliders, the first four increase the square number
+DIRECTIONS = ((1, 0), (0, 1), (1, 1), (-1, 1), (-1, 0), (0, -1), (1, -1), (-1, -1))
+POSITIVE_DIRECTIONS = 4
+
+
+def _mask(x: int, y: int, steps: List[Tuple[int, int]]) -> int:
+    '''
+        Builds the bitboard of all the squares reached from (x, y) by the given steps
+    '''
+    bb = 0
+    for dx, dy in steps:
+        if 0 <= x + dx < 8 and 0 <= y + dy < 8:
+            bb |= 1 << ((y + dy) * 8 + x + dx)
+    return bb
+
+
+def _ray(x: int, y: int, dx: int, dy: int) -> int:
+    '''
+        Builds the bitboard of the ray starting next to (x, y) in a given direction
+    '''
+    bb = 0
+    x += dx
+    y += dy
+    while 0 <= x < 8 and 0 <= y < 8:
+        bb |= 1 << (y * 8 + x)
+        x += dx
+        y += dy
+    return bb
+
+
+KNIGHT_ATTACKS = [_mask(sq % 8, sq // 8, [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)])
+                  for sq in range(64)]
+KING_ATTACKS = [_mask(sq % 8, sq // 8, [(i, j) for i in range(-1, 2) for j in range(-1, 2) if i or j])
+                for sq in range(64)]
+# white pawns move towards y = 0, black pawns towards y = 7
+PAWN_ATTACKS = ([_mask(sq % 8, sq // 8, [(-1, -1), (1, -1)]) for sq in range(64)],
+                [_mask(sq % 8, sq // 8, [(-1, 1), (1, 1)]) for sq in range(64)])
+PAWN_DIRECTION = (-8, 8)
+PROMOTION_ROW = (0, 7)
+RAYS = [[_ray(sq % 8, sq // 8, dx, dy) for sq in range(64)] for dx, dy in DIRECTIONS]
+
+
+def _slider_attacks(sq: int, occupied: int, directions: range) -> int:
+    '''
+        Calculates the attacks of a slider on a given square, with the rays
+        stopping at (and including) the first occupied square
+    '''
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][sq]
+        blockers = ray & occupied
+        if blockers:
+            if direction < POSITIVE_DIRECTIONS:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[direction][first]
+        attacks |= ray
+    return attacks
+
+
+ROOK_RAYS = (0, 1, 4, 5)
+BISHOP_RAYS = (2, 3, 6, 7)
+QUEEN_RAYS = range(8)
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    '''
+        Returns the squares a rook on sq attacks
+    '''
+    return _slider_attacks(sq, occupied, ROOK_RAYS)
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    '''
+        Returns the squares a bishop on sq attacks
+    '''
+    return _slider_attacks(sq, occupied, BISHOP_RAYS)
+
+
+def queen_attacks(sq: int, occupied: int) -> int:
+    '''
+        Returns the squares a queen on sq attacks
+    '''
+    return _slider_attacks(sq, occupied, QUEEN_RAYS)
+
+
+def squares_of(bb: int) -> List[int]:
+    '''
+        Returns the squares of all the set bits of a bitboard
+    '''
+    squares = []
+    while bb:
+        lsb = bb & -bb
+        squares.append(lsb.bit_length() - 1)
+        bb ^= lsb
+    return squares
+
+
+def encode_move(from_sq: int, to_sq: int, promotion: int = 0) -> int:
+    '''
+        Packs a move into an int (from | to << 6 | promotion << 12)
+    '''
+    return from_sq | to_sq << 6 | promotion << 12
+
+
+def decode_move(move: int) -> Tuple[int, int, int]:
+    '''
+        Unpacks a move into (from square, to square, promotion piece type or 0)
+    '''
+    return move & 63, (move >> 6) & 63, move >> 12
+
+
+class Bitboard_Position():
+    '''
+        A position built from 64-bit integer bitboards.
+        It follows the same rules as the pieces in objects.py
+        (the game ends when a king is taken, so there are no checks)
+
+        ...
+
+        Attributes
+        ----------
+        boards: List[int]
+            one bitboard per colour and piece type (index colour * 6 + piece type)
+
+        occupancy: List[int]
+            the squares occupied by white and by black
+
+        unmoved_pawns: int
+            the pawns which still may move two squares forward
+
+        castling: int
+            the castling rights (WHITE_KINGSIDE | WHITE_QUEENSIDE | ...)
+
+        ghost: int
+            the en passant square (-1 if there is none)
+
+        turn: int
+            the colour to move (WHITE or BLACK)
+
+        Methods
+        -------
+        copy(self) -> Bitboard_Position
+            Returns a copy of the position
+
+        add_piece(self, colour: int, piece_type: int, sq: int) -> None
+            Puts a piece on an empty square
+
+        piece_at(self, sq: int) -> Tuple[int, int]
+            Returns (colour, piece type) of the piece on a square
+
+        attacks_from(self, sq: int) -> int
+            Returns the squares the piece on a square attacks
+
+        is_attacked(self, sq: int, colour: int) -> bool
+            Checks if a square is attacked by a given colour
+
+        is_over(self) -> bool
+            Checks if a king has been taken
+
+        generate_moves(self) -> List[int]
+            Returns all the possible moves of the colour to move
+
+        make_move(self, move: int) -> Bitboard_Position
+            Returns the position after a move
+
+        from_fen(fen: str) -> Bitboard_Position
+            Parses a position in Forsyth-Edwards Notation
+
+        to_fen(self, halfmove: int = 0, fullmove: int = 1) -> str
+            Returns the position in Forsyth-Edwards Notation
+    '''
+    __slots__ = ('boards', 'occupancy', 'unmoved_pawns', 'castling', 'ghost', 'turn')
+
+    def __init__(self) -> None:
+        self.boards = [0] * 12
+        self.occupancy = [0, 0]
+        self.unmoved_pawns = 0
+        self.castling = 0
+        self.ghost = -1
+        self.turn = WHITE
+
+    def copy(self) -> 'Bitboard_Position':
+        '''
+            Returns a copy of the position
+
+            Returns
+            -------
+            Bitboard_Position
+                the copy
+        '''
+        position = Bitboard_Position.__new__(Bitboard_Position)
+        position.boards = self.boards[:]
+        position.occupancy = self.occupancy[:]
+        position.unmoved_pawns = self.unmoved_pawns
+        position.castling = self.castling
+        position.ghost = self.ghost
+        position.turn = self.turn
+        return position
+
+    def add_piece(self, colour: int, piece_type: int, sq: int) -> None:
+        '''
+            Puts a piece on an empty square
+
+            Parameters
+            ----------
+            colour: int
+                WHITE or BLACK
+
+            piece_type: int
+                PAWN, KNIGHT, BISHOP, ROOK, QUEEN or KING
+
+            sq: int
+                the square of the piece
+        '''
+        self.boards[colour * 6 + piece_type] |= 1 << sq
+        self.occupancy[colour] |= 1 << sq
+
+    def piece_at(self, sq: int) -> Tuple[int, int]:
+        '''
+            Returns the piece on a square
+
+            Parameters
+            ----------
+            sq: int
+                the square
+
+            Returns
+            -------
+            Tuple[int, int]
+                (colour, piece type) of the piece
+            None
+                if the square is empty
+        '''
+        bit = 1 << sq
+        if not (self.occupancy[WHITE] | self.occupancy[BLACK]) & bit:
+            return None
+        for index, bb in enumerate(self.boards):
+            if bb & bit:
+                return divmod(index, 6)
+
+    def attacks_from(self, sq: int) -> int:
+        '''
+            Returns the squares the piece on a square attacks
+            (for pawns only the diagonal squares)
+
+            Parameters
+            ----------
+            sq: int
+                the square of the piece
+
+            Returns
+            -------
+            int
+                the attacked squares
+        '''
+        colour, piece_type = self.piece_at(sq)
+        occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+        match piece_type:
+            case 0:
+                return PAWN_ATTACKS[colour][sq]
+            case 1:
+                return KNIGHT_ATTACKS[sq]
+            case 2:
+                return bishop_attacks(sq, occupied)
+            case 3:
+                return rook_attacks(sq, occupied)
+            case 4:
+                return queen_attacks(sq, occupied)
+            case 5:
+                return KING_ATTACKS[sq]
+
+    def is_attacked(self, sq: int, colour: int) -> bool:
+        '''
+            Checks if a square is attacked by a given colour
+
+            Parameters
+            ----------
+            sq: int
+                the square
+
+            colour: int
+                the attacking colour
+
+            Returns
+            -------
+            bool
+                if the square is attacked or not
+        '''
+        boards = self.boards
+        base = colour * 6
+        occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+        if PAWN_ATTACKS[1 - colour][sq] & boards[base + PAWN]:
+            return True
+        if KNIGHT_ATTACKS[sq] & boards[base + KNIGHT] or KING_ATTACKS[sq] & boards[base + KING]:
+            return True
+        queens = boards[base + QUEEN]
+        if rook_attacks(sq, occupied) & (boards[base + ROOK] | queens):
+            return True
+        return bool(bishop_attacks(sq, occupied) & (boards[base + BISHOP] | queens))
+
+    def is_over(self) -> bool:
+        '''
+            Checks if a king has been taken
+
+            Returns
+            -------
+            bool
+                if the game is over or not
+        '''
+        return not (self.boards[KING] and self.boards[6 + KING])
+
+    def generate_moves(self) -> List[int]:
+        '''
+            Returns all the possible moves of the colour to move,
+            promotions are returned once for every promotion piece
+
+            Returns
+            -------
+            List[int]
+                the encoded moves
+        '''
+        if self.is_over():
+            return []
+        moves = []
+        append = moves.append
+        us = self.turn
+        boards = self.boards
+        own = self.occupancy[us]
+        enemy = self.occupancy[1 - us]
+        occupied = own | enemy
+        free = FULL ^ occupied
+        base = us * 6
+
+        direction = PAWN_DIRECTION[us]
+        promotion_row = PROMOTION_ROW[us]
+        takeable = enemy | (1 << self.ghost if self.ghost >= 0 else 0)
+        pawns = boards[base + PAWN]
+        while pawns:
+            lsb = pawns & -pawns
+            pawns ^= lsb
+            sq = lsb.bit_length() - 1
+            targets = PAWN_ATTACKS[us][sq] & takeable
+            one = sq + direction
+            if 0 <= one < 64 and free >> one & 1:
+                targets |= 1 << one
+                two = one + direction
+                if self.unmoved_pawns & lsb and 0 <= two < 64 and free >> two & 1:
+                    targets |= 1 << two
+            while targets:
+                bit = targets & -targets
+                targets ^= bit
+                to_sq = bit.bit_length() - 1
+                if to_sq >> 3 == promotion_row:
+                    for promotion in (QUEEN, KNIGHT, BISHOP, ROOK):
+                        append(sq | to_sq << 6 | promotion << 12)
+                else:
+                    append(sq | to_sq << 6)
+
+        for piece_type in (KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            pieces = boards[base + piece_type]
+            while pieces:
+                lsb = pieces & -pieces
+                pieces ^= lsb
+                sq = lsb.bit_length() - 1
+                if piece_type == KNIGHT:
+                    targets = KNIGHT_ATTACKS[sq]
+                elif piece_type == BISHOP:
+                    targets = _slider_attacks(sq, occupied, BISHOP_RAYS)
+                elif piece_type == ROOK:
+                    targets = _slider_attacks(sq, occupied, ROOK_RAYS)
+                elif piece_type == QUEEN:
+                    targets = _slider_attacks(sq, occupied, QUEEN_RAYS)
+                else:
+                    targets = KING_ATTACKS[sq]
+                targets &= ~own
+                while targets:
+                    bit = targets & -targets
+                    targets ^= bit
+                    append(sq | (bit.bit_length() - 1) << 6)
+
+        if self.castling and boards[base + KING] >> KING_HOME[us] & 1:
+            for right, rook_sq, king_to, _, path in CASTLING[us]:
+                if self.castling & right and boards[base + ROOK] >> rook_sq & 1 and not occupied & path:
+                    append(KING_HOME[us] | king_to << 6)
+        return moves
+
+    def make_move(self, move: int) -> 'Bitboard_Position':
+        '''
+            Returns the position after a move (the position itself is not changed)
+
+            Parameters
+            ----------
+            move: int
+                the encoded move
+
+            Returns
+            -------
+            Bitboard_Position
+                the new position
+        '''
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        promotion = move >> 12
+        position = self.copy()
+        boards = position.boards
+        occupancy = position.occupancy
+        us = self.turn
+        them = 1 - us
+        from_bit = 1 << from_sq
+        to_bit = 1 << to_sq
+
+        piece_type = next(t for t in range(6) if boards[us * 6 + t] & from_bit)
+        if occupancy[them] & to_bit:
+            for index in range(them * 6, them * 6 + 6):
+                if boards[index] & to_bit:
+                    boards[index] ^= to_bit
+                    break
+            occupancy[them] ^= to_bit
+        boards[us * 6 + piece_type] ^= from_bit
+        boards[us * 6 + (promotion or piece_type)] |= to_bit
+        occupancy[us] ^= from_bit | to_bit
+
+        position.ghost = -1
+        if piece_type == PAWN:
+            if to_sq == self.ghost:
+                captured_sq = to_sq - PAWN_DIRECTION[us]
+                for index in range(them * 6, them * 6 + 6):
+                    if boards[index] >> captured_sq & 1:
+                        boards[index] ^= 1 << captured_sq
+                        break
+                occupancy[them] &= ~(1 << captured_sq)
+                position.unmoved_pawns &= ~(1 << captured_sq)
+            elif abs(to_sq - from_sq) == 16:
+                position.ghost = from_sq + PAWN_DIRECTION[us]
+        elif piece_type == KING and abs(to_sq - from_sq) == 2:
+            for _, rook_sq, king_to, rook_to, _ in CASTLING[us]:
+                if king_to == to_sq:
+                    rook_bits = 1 << rook_sq | 1 << rook_to
+                    boards[us * 6 + ROOK] ^= rook_bits
+                    occupancy[us] ^= rook_bits
+        position.unmoved_pawns &= ~(from_bit | to_bit)
+        position.castling &= ~(CASTLING_MASK[from_sq] | CASTLING_MASK[to_sq])
+        position.turn = them
+        return position
+
+    @staticmethod
+    def move_to_str(move: int) -> str:
+        '''
+            Returns a move in coordinate notation (e.g. e2e4 or e7e8q)
+
+            Parameters
+            ----------
+            move: int
+                the encoded move
+
+            Returns
+            -------
+            str
+                the move as a string
+        '''
+        from_sq, to_sq, promotion = decode_move(move)
+        text = '{}{}{}{}'.format(chr(97 + from_sq % 8), 8 - from_sq // 8, chr(97 + to_sq % 8), 8 - to_sq // 8)
+        return text + ('', 'n', 'b', 'r', 'q')[promotion] if promotion else text
+
+    @staticmethod
+    def from_fen(fen: str) -> 'Bitboard_Position':
+        '''
+            Parses a position in Forsyth-Edwards Notation without creating
+            any piece objects (the fast path for loading many positions).
+            The move counters are not part of a bitboard position,
+            castling rights without the king or rook on its square are dropped
+
+            Parameters
+            ----------
+            fen: str
+                the position (e.g. rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1)
+
+            Returns
+            -------
+            Bitboard_Position
+                the position
+        '''
+        fields = fen.split()
+        rows = fields[0].split('/') if fields else ()
+        if len(fields) < 4 or len(rows) != 8 or fields[1] not in ('w', 'b'):
+            raise ValueError('invalid FEN: {}'.format(fen))
+        position = Bitboard_Position()
+        boards = position.boards
+        for y, row in enumerate(rows):
+            sq = y * 8
+            end = sq + 8
+            for letter in row:
+                if letter in '12345678':
+                    sq += ord(letter) - 48
+                    continue
+                index = FEN_INDEX.get(letter)
+                if index is None or sq >= end:
+                    raise ValueError('invalid FEN: {}'.format(fen))
+                boards[index] |= 1 << sq
+                sq += 1
+            if sq != end:
+                raise ValueError('invalid FEN: {}'.format(fen))
+        position.occupancy = [boards[0] | boards[1] | boards[2] | boards[3] | boards[4] | boards[5],
+                              boards[6] | boards[7] | boards[8] | boards[9] | boards[10] | boards[11]]
+        position.unmoved_pawns = boards[PAWN] & PAWN_START[WHITE] | boards[6 + PAWN] & PAWN_START[BLACK]
+        castling = 0
+        if fields[2] != '-':
+            for letter in fields[2]:
+                if letter not in FEN_CASTLING:
+                    raise ValueError('invalid FEN: {}'.format(fen))
+                castling |= FEN_CASTLING[letter]
+        for colour in (WHITE, BLACK):
+            king_home = boards[colour * 6 + KING] >> KING_HOME[colour] & 1
+            for right, rook_sq, _, _, _ in CASTLING[colour]:
+                if not (king_home and boards[colour * 6 + ROOK] >> rook_sq & 1):
+                    castling &= ~right
+        position.castling = castling
+        ghost = fields[3]
+        if ghost != '-':
+            if len(ghost) != 2 or ghost[0] not in 'abcdefgh' or ghost[1] not in '12345678':
+                raise ValueError('invalid FEN: {}'.format(fen))
+            sq = (56 - ord(ghost[1])) * 8 + ord(ghost[0]) - 97
+            # the square a pawn of the other colour just skipped, with that pawn in front of it
+            pawn_sq, rank = (sq + 8, '6') if fields[1] == 'w' else (sq - 8, '3')
+            enemy_pawns = boards[(BLACK if fields[1] == 'w' else WHITE) * 6 + PAWN]
+            occupied = position.occupancy[WHITE] | position.occupancy[BLACK]
+            if ghost[1] != rank or not enemy_pawns >> pawn_sq & 1 or occupied >> sq & 1:
+                raise ValueError('invalid en passant square in FEN: {}'.format(fen))
+            position.ghost = sq
+        position.turn = WHITE if fields[1] == 'w' else BLACK
+        return position
+
+    def to_fen(self, halfmove: int = 0, fullmove: int = 1) -> str:
+        '''
+            Returns the position in Forsyth-Edwards Notation
+
+            Parameters
+            ----------
+            halfmove: int
+                the plies since the last capture or pawn move
+
+            fullmove: int
+                the number of the move (starts at 1, increases after every move of black)
+
+            Returns
+            -------
+            str
+                the position
+        '''
+        squares = [''] * 64
+        for index, bb in enumerate(self.boards):
+            for sq in squares_of(bb):
+                squares[sq] = FEN_LETTERS[index]
+        rows = []
+        for y in range(0, 64, 8):
+            row = ''
+            empty = 0
+            for letter in squares[y:y + 8]:
+                if not letter:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += letter
+            rows.append(row + str(empty) if empty else row)
+        castling = ''.join(letter for letter, right in FEN_CASTLING.items() if self.castling & right) or '-'
+        ghost = '{}{}'.format(chr(97 + self.ghost % 8), 8 - self.ghost // 8) if self.ghost >= 0 else '-'
+        return '{} {} {} {} {} {}'.format('/'.join(rows), 'wb'[self.turn], castling, ghost, halfmove, fullmove)
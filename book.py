@@ -0,0 +1,332 @@
+'''
+    Opening books: the moves played in a position, stored on disk
+
+    The file has the layout of a Polyglot .bin book: 16-byte big-endian
+    entries of (position hash: 8 bytes, move: 2 bytes, weight: 2 bytes,
+    learn: 4 bytes), sorted by the hash. Moves are encoded like in Polyglot
+    (to file, to rank, from file, from rank and promotion in 3 bits each,
+    castling as the king taking its rook). The hash is the Zobrist hash of
+    objects.py (Board.hash), not the Polyglot one, so books have to be built
+    with this module.
+
+    A lookup is a binary search over the memory-mapped file, so a book
+    opens instantly and only the pages that are touched are read.
+
+    Usage:
+
+        python book.py build games.pgn book.bin --max-ply 20
+        python book.py probe book.bin
+        python book.py probe book.bin --fen "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
+'''
+import argparse
+import mmap
+import os
+import random
+import struct
+from typing import Dict, Iterable, List, Tuple
+import bitboard
+from objects import Board
+import pgn
+import perft
+
+Move = Tuple[Tuple[int, int], Tuple[int, int], str]
+
+ENTRY = struct.Struct('>QHHI')
+KEY = struct.Struct('>Q')
+PROMOTION_CODES = {'': 0, 'knight': 1, 'bishop': 2, 'rook': 3, 'queen': 4}
+PROMOTION_NAMES = {code: name for name, code in PROMOTION_CODES.items()}
+MAX_WEIGHT = 0xFFFF
+# the weight a move gets for the side that won, drew or lost the game
+RESULT_WEIGHTS = {'win': 2, 'draw': 1, 'loss': 0, '*': 1}
+
+
+def encode_move(move: Move, board: Board) -> int:
+    '''
+        Turns a move into the 16 bits of a book entry
+
+        Parameters
+        ----------
+        move: Move
+            the move (from, to, promotion)
+
+        board: Board
+            the board before the move (to tell castling apart from other king moves)
+
+        Returns
+        -------
+        int
+            the encoded move
+    '''
+    (from_x, from_y), (to_x, to_y), promotion = move
+    piece = board.get_piece_on_board((from_x, from_y))
+    if piece is not None and piece.get_class_name() == 'King' and abs(to_x - from_x) == 2:
+        # castling is stored as the king taking its own rook
+        to_x = 7 if to_x > from_x else 0
+    return to_x | (7 - to_y) << 3 | from_x << 6 | (7 - from_y) << 9 | PROMOTION_CODES[promotion] << 12
+
+
+def decode_move(code: int, board: Board) -> Move:
+    '''
+        Turns the 16 bits of a book entry into a move
+
+        Parameters
+        ----------
+        code: int
+            the encoded move
+
+        board: Board
+            the board the move is played on (to tell castling apart from a king taking a rook)
+
+        Returns
+        -------
+        Move
+            the move (from, to, promotion)
+    '''
+    from_pos = (code >> 6 & 7, 7 - (code >> 9 & 7))
+    to_pos = (code & 7, 7 - (code >> 3 & 7))
+    piece = board.get_piece_on_board(from_pos)
+    target = board.get_piece_on_board(to_pos)
+    if (piece is not None and piece.get_class_name() == 'King' and target is not None
+            and target.get_class_name() == 'Rook' and target.get_colour() == piece.get_colour()):
+        to_pos = (from_pos[0] + 2 if to_pos[0] > from_pos[0] else from_pos[0] - 2, from_pos[1])
+    return (from_pos, to_pos, PROMOTION_NAMES.get(code >> 12 & 7, ''))
+
+
+class Opening_Book():
+    '''
+        A memory-mapped opening book
+
+        ...
+
+        Attributes
+        ----------
+        path: str
+            the file of the book
+
+        size: int
+            the number of entries
+
+        Methods
+        -------
+        find(self, key: int) -> int
+            Returns the index of the first entry of a hash
+
+        get_entries(self, key: int) -> List[Tuple[int, int]]
+            Returns the moves and weights of a hash
+
+        get_moves(self, board: Board) -> List[Tuple[Move, int]]
+            Returns the book moves of a board that are valid in its position
+
+        get_move(self, board: Board, rng: random.Random = None) -> Move
+            Chooses a book move by weight
+
+        close(self) -> None
+            Unmaps the file
+    '''
+    def __init__(self, path: str) -> None:
+        '''
+            Parameters
+            ----------
+            path: str
+                the file of the book
+        '''
+        self.path = path
+        self.data = None
+        self.size = os.path.getsize(path) // ENTRY.size
+        if self.size:
+            with open(path, 'rb') as file:
+                self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def find(self, key: int) -> int:
+        '''
+            Returns the index of the first entry with a hash that is not smaller than key
+
+            Parameters
+            ----------
+            key: int
+                the hash of a position
+
+            Returns
+            -------
+            int
+                the index (size if all the hashes are smaller)
+        '''
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get_entries(self, key: int) -> List[Tuple[int, int]]:
+        '''
+            Returns the entries of a position
+
+            Parameters
+            ----------
+            key: int
+                the hash of the position
+
+            Returns
+            -------
+            List[Tuple[int, int]]
+                (encoded move, weight) for every entry of the position
+        '''
+        entries = []
+        index = self.find(key)
+        while index < self.size:
+            entry_key, move, weight, _ = ENTRY.unpack_from(self.data, index * ENTRY.size)
+            if entry_key != key:
+                break
+            entries.append((move, weight))
+            index += 1
+        return entries
+
+    def get_moves(self, board: Board) -> List[Tuple[Move, int]]:
+        '''
+            Returns the book moves of the position of a board (moves that aren't
+            valid in the position, e.g. from a hash collision, are left out)
+
+            Parameters
+            ----------
+            board: Board
+                the board
+
+            Returns
+            -------
+            List[Tuple[Move, int]]
+                (move, weight) for every book move
+        '''
+        moves = []
+        for code, weight in self.get_entries(board.hash):
+            move = decode_move(code, board)
+            piece = board.get_piece_on_board(move[0])
+            if piece is not None and piece.get_colour() == board.turn and move[1] in board.get_piece_moves(piece):
+                moves.append((move, weight))
+        return moves
+
+    def get_move(self, board: Board, rng: random.Random = None) -> Move:
+        '''
+            Chooses one of the book moves of a board, moves with a higher weight are chosen more often
+
+            Parameters
+            ----------
+            board: Board
+                the board
+
+            rng: random.Random
+                the random generator (the one of the random module if None)
+
+            Returns
+            -------
+            Move
+                the move (None if the position isn't in the book)
+        '''
+        moves = [(move, weight) for move, weight in self.get_moves(board) if weight > 0]
+        if not moves:
+            return None
+        return (rng or random).choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+    def close(self) -> None:
+        '''
+            Unmaps the file
+        '''
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+
+def build_book(games: Iterable[pgn.Pgn_Game], path: str, max_ply: int = 20, min_games: int = 1) -> int:
+    '''
+        Builds a book from the first moves of games
+
+        A move gets 2 points for every game the side playing it won,
+        1 for a draw or an unknown result and 0 for a loss.
+
+        Parameters
+        ----------
+        games: Iterable[pgn.Pgn_Game]
+            the games (invalid moves end a game)
+
+        path: str
+            the file of the book
+
+        max_ply: int
+            the number of moves of a game that are added
+
+        min_games: int
+            the number of games a move needs to be played in to be added
+
+        Returns
+        -------
+        int
+            the number of entries
+    '''
+    weights: Dict[Tuple[int, int], int] = {}
+    counts: Dict[Tuple[int, int], int] = {}
+    board = Board()
+    for game in games:
+        winner = {'1-0': 'white', '0-1': 'black'}.get(game.result)
+        try:
+            board.load_fen(game.get_fen())
+            for ply, san in enumerate(game.moves):
+                if ply >= max_ply:
+                    break
+                move = pgn.resolve_san(board, san)
+                if game.result in ('1-0', '0-1'):
+                    weight = RESULT_WEIGHTS['win' if board.turn == winner else 'loss']
+                else:
+                    weight = RESULT_WEIGHTS['draw' if game.result == '1/2-1/2' else '*']
+                entry = (board.hash, encode_move(move, board))
+                weights[entry] = weights.get(entry, 0) + weight
+                counts[entry] = counts.get(entry, 0) + 1
+                perft.apply_move(move, board)
+                board.history.clear()
+        except ValueError:
+            continue
+    entries = [(key, move, weight) for (key, move), weight in weights.items() if weight > 0 and counts[(key, move)] >= min_games]
+    scale = max((weight for _, _, weight in entries), default=0) / MAX_WEIGHT
+    entries.sort(key=lambda entry: (entry[0], -entry[2]))
+    with open(path, 'wb') as file:
+        for key, move, weight in entries:
+            if scale > 1:
+                weight = max(int(weight / scale), 1)
+            file.write(ENTRY.pack(key, move, weight, 0))
+    return len(entries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Builds and probes opening books')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='builds a book from a PGN file')
+    build.add_argument('pgn', help='the PGN file')
+    build.add_argument('book', help='the book file to write')
+    build.add_argument('--max-ply', type=int, default=20, help='the number of moves of every game that are added')
+    build.add_argument('--min-games', type=int, default=1, help='the number of games a move needs to be played in')
+    probe = commands.add_parser('probe', help='prints the book moves of a position')
+    probe.add_argument('book', help='the book file')
+    probe.add_argument('--fen', default=bitboard.START_FEN, help='the position (the start position if not given)')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        with open(args.pgn, encoding='utf-8', errors='replace') as stream:
+            entries = build_book(pgn.read_games(stream), args.book, args.max_ply, args.min_games)
+        print('{} entries written to {}'.format(entries, args.book))
+    else:
+        board = Board()
+        board.load_fen(args.fen)
+        book = Opening_Book(args.book)
+        moves = book.get_moves(board)
+        total = sum(weight for _, weight in moves)
+        for move, weight in moves:
+            print('{:<8} {:<6} weight {:>5} ({:.1f} %)'.format(
+                pgn.move_to_san(board, move), perft.move_to_str(move), weight, 100 * weight / total if total else 0))
+        if not moves:
+            print('the position is not in the book')
+        book.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,600 @@
+'''
+    Position datasets: files of fixed-size position records and a
+    deduplication that works on files larger than the memory
+
+    A dataset file starts with a 16-byte header (the magic bytes PYCHDATA,
+    the format version and the record size) followed by 50-byte records:
+
+        bytes 0-7    the Zobrist hash of the position (big-endian, Board.hash)
+        bytes 8-45   the packed position (packed.py: pieces, colour to move,
+                     castling rights from the has_moved-flags, ghost square
+                     and the move counters)
+        bytes 46-49  how often the position was collected (big-endian)
+
+    The first 42 bytes (hash and position without the move counters) are the
+    key of a record: records with the same key are the same position. As
+    the hash comes first, sorting the raw records sorts them by hash.
+
+    A Dataset maps the file into memory, so a record is only turned into
+    an object when it is asked for. dedup sorts runs of records that fit
+    into memory, writes them to temporary files and merges the runs, adding
+    up the counts of records with the same key.
+
+    Usage:
+
+        python dataset.py collect games.pgn positions.dat
+        python dataset.py collect positions.fen positions.dat --append
+        python dataset.py dedup positions.dat more.dat --output unique.dat --run-size 1000000
+        python dataset.py show unique.dat --first 10
+'''
+import argparse
+import heapq
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from typing import BinaryIO, Iterable, Iterator, List, TextIO, Tuple
+from objects import Board
+import packed
+import pgn
+
+MAGIC = b'PYCHDATA'
+VERSION = 1
+HEADER = struct.Struct('>8sHH4x')
+HASH = struct.Struct('>Q')
+COUNT = struct.Struct('>I')
+RECORD_SIZE = HASH.size + packed.PACKED_SIZE + COUNT.size
+# the hash and the position without the move counters
+KEY_SIZE = HASH.size + packed.PACKED_SIZE - 4
+MAX_COUNT = 0xFFFFFFFF
+# the records read and written at once by the streaming readers
+BLOCK_RECORDS = 4096
+# the number of runs that are merged at once
+MAX_RUNS = 64
+
+
+def make_record(board: Board, count: int = 1) -> bytes:
+    '''
+        Returns the record of the position of a board
+
+        Parameters
+        ----------
+        board: Board
+            the board
+
+        count: int
+            how often the position was collected
+
+        Returns
+        -------
+        bytes
+            the record
+    '''
+    return HASH.pack(board.hash) + packed.pack_board(board) + COUNT.pack(min(count, MAX_COUNT))
+
+
+def write_header(file: BinaryIO) -> None:
+    '''
+        Writes the header of a dataset file
+
+        Parameters
+        ----------
+        file: BinaryIO
+            the file (at its start)
+    '''
+    file.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE))
+
+
+def read_header(file: BinaryIO, path: str) -> None:
+    '''
+        Reads and checks the header of a dataset file
+
+        Parameters
+        ----------
+        file: BinaryIO
+            the file (at its start)
+
+        path: str
+            the name of the file (for the error messages)
+    '''
+    data = file.read(HEADER.size)
+    if len(data) < HEADER.size:
+        raise ValueError('{} is no dataset (the header is missing)'.format(path))
+    magic, version, record_size = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError('{} is no dataset'.format(path))
+    if version != VERSION or record_size != RECORD_SIZE:
+        raise ValueError('{} has version {} with {}-byte records, expected version {} with {}-byte records'.format(
+            path, version, record_size, VERSION, RECORD_SIZE))
+
+
+def read_records(path: str) -> Iterator[bytes]:
+    '''
+        Reads the records of a dataset file one block at a time
+
+        Parameters
+        ----------
+        path: str
+            the file
+
+        Returns
+        -------
+        Iterator[bytes]
+            the records
+    '''
+    with open(path, 'rb') as file:
+        read_header(file, path)
+        while True:
+            block = file.read(BLOCK_RECORDS * RECORD_SIZE)
+            if len(block) % RECORD_SIZE:
+                raise ValueError('{} ends with an incomplete record'.format(path))
+            if not block:
+                return
+            for start in range(0, len(block), RECORD_SIZE):
+                yield block[start:start + RECORD_SIZE]
+
+
+class Dataset_Writer():
+    '''
+        Writes records to a dataset file
+
+        ...
+
+        Attributes
+        ----------
+        path: str
+            the file
+
+        count: int
+            the number of records written
+
+        Methods
+        -------
+        write(self, board: Board, count: int = 1) -> None
+            Writes the position of a board
+
+        write_record(self, record: bytes) -> None
+            Writes a record
+
+        close(self) -> None
+            Writes the buffered records and closes the file
+    '''
+    def __init__(self, path: str, append: bool = False) -> None:
+        '''
+            Parameters
+            ----------
+            path: str
+                the file
+
+            append: bool
+                if the records are added to an existing dataset (else the file is replaced)
+        '''
+        self.path = path
+        self.count = 0
+        self.buffer = []
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as file:
+                read_header(file, path)
+            self.file = open(path, 'ab')
+        else:
+            self.file = open(path, 'wb')
+            write_header(self.file)
+
+    def write(self, board: Board, count: int = 1) -> None:
+        '''
+            Writes the position of a board
+
+            Parameters
+            ----------
+            board: Board
+                the board
+
+            count: int
+                how often the position was collected
+        '''
+        self.write_record(make_record(board, count))
+
+    def write_record(self, record: bytes) -> None:
+        '''
+            Writes a record (the records are written in blocks)
+
+            Parameters
+            ----------
+            record: bytes
+                the record
+        '''
+        self.buffer.append(record)
+        self.count += 1
+        if len(self.buffer) >= BLOCK_RECORDS:
+            self.file.write(b''.join(self.buffer))
+            self.buffer.clear()
+
+    def close(self) -> None:
+        '''
+            Writes the buffered records and closes the file
+        '''
+        if self.file is not None:
+            self.file.write(b''.join(self.buffer))
+            self.buffer.clear()
+            self.file.close()
+            self.file = None
+
+
+class Dataset():
+    '''
+        A memory-mapped dataset file, records are only read when they are used
+
+        ...
+
+        Attributes
+        ----------
+        path: str
+            the file
+
+        size: int
+            the number of records
+
+        records: memoryview
+            the records (without the header)
+
+        Methods
+        -------
+        get_record(self, index: int) -> memoryview
+            Returns a record without copying it
+
+        get_hash(self, index: int) -> int
+            Returns the hash of a record
+
+        get_count(self, index: int) -> int
+            Returns how often the position of a record was collected
+
+        get_packed(self, index: int) -> bytes
+            Returns the packed position of a record
+
+        piece_at(self, index: int, sq: int) -> Tuple[int, int]
+            Returns the piece on a square of a record
+
+        load(self, index: int, board: Board) -> None
+            Sets up the position of a record on a board
+
+        close(self) -> None
+            Unmaps the file (once the records handed out are gone)
+    '''
+    def __init__(self, path: str) -> None:
+        '''
+            Parameters
+            ----------
+            path: str
+                the file
+        '''
+        self.path = path
+        with open(path, 'rb') as file:
+            read_header(file, path)
+            length = os.path.getsize(path) - HEADER.size
+            if length % RECORD_SIZE:
+                raise ValueError('{} ends with an incomplete record'.format(path))
+            self.size = length // RECORD_SIZE
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.records = memoryview(self.data)[HEADER.size:] if self.size else memoryview(b'')
+
+    def __len__(self) -> int:
+        return self.size
+
+    def get_record(self, index: int) -> memoryview:
+        '''
+            Returns a record without copying it
+
+            Parameters
+            ----------
+            index: int
+                the number of the record
+
+            Returns
+            -------
+            memoryview
+                the record
+        '''
+        if not 0 <= index < self.size:
+            raise IndexError('record {} is not in {} ({} records)'.format(index, self.path, self.size))
+        return self.records[index * RECORD_SIZE:(index + 1) * RECORD_SIZE]
+
+    def get_hash(self, index: int) -> int:
+        '''
+            Returns the hash of the position of a record
+
+            Parameters
+            ----------
+            index: int
+                the number of the record
+
+            Returns
+            -------
+            int
+                the hash
+        '''
+        return HASH.unpack_from(self.get_record(index))[0]
+
+    def get_count(self, index: int) -> int:
+        '''
+            Returns how often the position of a record was collected
+
+            Parameters
+            ----------
+            index: int
+                the number of the record
+
+            Returns
+            -------
+            int
+                the count
+        '''
+        return COUNT.unpack_from(self.get_record(index), RECORD_SIZE - COUNT.size)[0]
+
+    def get_packed(self, index: int) -> bytes:
+        '''
+            Returns the packed position of a record (see packed.py)
+
+            Parameters
+            ----------
+            index: int
+                the number of the record
+
+            Returns
+            -------
+            bytes
+                the packed position
+        '''
+        return self.get_record(index)[HASH.size:HASH.size + packed.PACKED_SIZE].tobytes()
+
+    def piece_at(self, index: int, sq: int) -> Tuple[int, int]:
+        '''
+            Returns the piece on a square of the position of a record without unpacking it
+
+            Parameters
+            ----------
+            index: int
+                the number of the record
+
+            sq: int
+                the square (y * 8 + x)
+
+            Returns
+            -------
+            Tuple[int, int]
+                (colour, piece type), None if the square is empty
+        '''
+        return packed.piece_at(self.get_record(index)[HASH.size:], sq)
+
+    def load(self, index: int, board: Board) -> None:
+        '''
+            Sets up the position of a record on a board
+
+            Parameters
+            ----------
+            index: int
+                the number of the record
+
+            board: Board
+                the board
+        '''
+        packed.unpack_board(self.get_packed(index), board)
+
+    def close(self) -> None:
+        '''
+            Unmaps the file. Records from get_record still point into the map,
+            while any of them is alive the map is only dropped here and unmapped
+            when the last record is garbage collected
+        '''
+        self.size = 0
+        records, self.records = self.records, memoryview(b'')
+        data, self.data = self.data, None
+        try:
+            records.release()
+            if data is not None:
+                data.close()
+        except BufferError:
+            pass
+
+
+def combine(records: Iterable[bytes]) -> Iterator[bytes]:
+    '''
+        Combines neighbouring records with the same key into one record
+        with the sum of their counts (the first record is kept)
+
+        Parameters
+        ----------
+        records: Iterable[bytes]
+            the records, sorted
+
+        Returns
+        -------
+        Iterator[bytes]
+            the combined records
+    '''
+    current = None
+    count = 0
+    for record in records:
+        if current is not None and record[:KEY_SIZE] == current[:KEY_SIZE]:
+            count += COUNT.unpack_from(record, KEY_SIZE + 4)[0]
+            continue
+        if current is not None:
+            yield current[:KEY_SIZE + 4] + COUNT.pack(min(count, MAX_COUNT))
+        current = record
+        count = COUNT.unpack_from(record, KEY_SIZE + 4)[0]
+    if current is not None:
+        yield current[:KEY_SIZE + 4] + COUNT.pack(min(count, MAX_COUNT))
+
+
+def write_run(records: Iterable[bytes], path: str) -> int:
+    '''
+        Writes records to a dataset file
+
+        Parameters
+        ----------
+        records: Iterable[bytes]
+            the records
+
+        path: str
+            the file
+
+        Returns
+        -------
+        int
+            the number of records
+    '''
+    writer = Dataset_Writer(path)
+    for record in records:
+        writer.write_record(record)
+    writer.close()
+    return writer.count
+
+
+def dedup(inputs: List[str], output: str, run_size: int = 500000, temp_dir: str = None) -> Tuple[int, int]:
+    '''
+        Merges dataset files into one file in which every position is only
+        stored once (sorted by hash), the counts of the duplicates are added up
+
+        At most run_size records are held in memory: the input is cut into
+        sorted runs that are written to temporary files and merged afterwards
+        (at most MAX_RUNS at a time).
+
+        Parameters
+        ----------
+        inputs: List[str]
+            the dataset files
+
+        output: str
+            the file to write (may be one of the inputs)
+
+        run_size: int
+            the number of records sorted in memory at once
+
+        temp_dir: str
+            the directory of the temporary files (the one of tempfile if None)
+
+        Returns
+        -------
+        Tuple[int, int]
+            the number of records read and written
+    '''
+    read = 0
+    with tempfile.TemporaryDirectory(dir=temp_dir) as directory:
+        runs = []
+        run = []
+        for path in inputs:
+            for record in read_records(path):
+                run.append(record)
+                read += 1
+                if len(run) >= run_size:
+                    run.sort()
+                    runs.append(os.path.join(directory, 'run{}.dat'.format(len(runs))))
+                    write_run(combine(run), runs[-1])
+                    run.clear()
+        run.sort()
+        if not runs:
+            return read, write_run(combine(run), output)
+        if run:
+            runs.append(os.path.join(directory, 'run{}.dat'.format(len(runs))))
+            write_run(combine(run), runs[-1])
+            run.clear()
+        merged = 0
+        while len(runs) > MAX_RUNS:
+            group, runs = runs[:MAX_RUNS], runs[MAX_RUNS:]
+            runs.append(os.path.join(directory, 'merge{}.dat'.format(merged)))
+            merged += 1
+            write_run(combine(heapq.merge(*(read_records(path) for path in group))), runs[-1])
+            for path in group:
+                os.remove(path)
+        return read, write_run(combine(heapq.merge(*(read_records(path) for path in runs))), output)
+
+
+def collect(stream: TextIO, kind: str, writer: Dataset_Writer, board: Board = None) -> Tuple[int, int]:
+    '''
+        Writes the positions of a FEN or PGN file to a dataset
+        (every position after a move of every game for PGN files)
+
+        Parameters
+        ----------
+        stream: TextIO
+            the input
+
+        kind: str
+            fen or pgn
+
+        writer: Dataset_Writer
+            the dataset
+
+        board: Board
+            the board the positions are set up on (a new one if None)
+
+        Returns
+        -------
+        Tuple[int, int]
+            the number of positions written and of lines or games with errors
+    '''
+    board = board or Board(cache_size=0)
+    written = errors = 0
+    if kind == 'pgn':
+        for game in pgn.read_games(stream):
+            try:
+                for _ in pgn.replay_game(game, board):
+                    writer.write(board)
+                    written += 1
+            except ValueError:
+                errors += 1
+    else:
+        for line in stream:
+            if not line.strip() or line.startswith('#'):
+                continue
+            try:
+                board.load_fen(line)
+            except ValueError:
+                errors += 1
+                continue
+            writer.write(board)
+            written += 1
+    return written, errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Collects, deduplicates and shows position datasets')
+    commands = parser.add_subparsers(dest='command', required=True)
+    collect_parser = commands.add_parser('collect', help='writes the positions of a FEN or PGN file to a dataset')
+    collect_parser.add_argument('file', help='the FEN or PGN file')
+    collect_parser.add_argument('dataset', help='the dataset file')
+    collect_parser.add_argument('--format', choices=('fen', 'pgn'), help='the format of the input (from the file extension if not given)')
+    collect_parser.add_argument('--append', action='store_true', help='adds the positions to an existing dataset')
+    dedup_parser = commands.add_parser('dedup', help='merges datasets and removes duplicate positions')
+    dedup_parser.add_argument('datasets', nargs='+', help='the dataset files')
+    dedup_parser.add_argument('--output', required=True, help='the dataset file to write')
+    dedup_parser.add_argument('--run-size', type=int, default=500000, help='the number of records sorted in memory at once')
+    dedup_parser.add_argument('--temp-dir', help='the directory of the temporary files')
+    show_parser = commands.add_parser('show', help='prints the positions of a dataset as FEN')
+    show_parser.add_argument('dataset', help='the dataset file')
+    show_parser.add_argument('--first', type=int, default=10, help='the number of records to print (0 for all)')
+    args = parser.parse_args()
+
+    if args.command == 'collect':
+        kind = args.format or ('pgn' if args.file.lower().endswith('.pgn') else 'fen')
+        writer = Dataset_Writer(args.dataset, args.append)
+        with open(args.file, encoding='utf-8', errors='replace') as stream:
+            written, errors = collect(stream, kind, writer)
+        writer.close()
+        print('{} positions written to {} ({} errors)'.format(written, args.dataset, errors))
+    elif args.command == 'dedup':
+        if args.run_size < 1:
+            parser.error('--run-size needs to be at least 1')
+        read, written = dedup(args.datasets, args.output, args.run_size, args.temp_dir)
+        print('{} records read, {} unique positions written to {}'.format(read, written, args.output))
+    else:
+        dataset = Dataset(args.dataset)
+        print('{} records'.format(len(dataset)), file=sys.stderr)
+        for index in range(len(dataset) if args.first <= 0 else min(args.first, len(dataset))):
+            print('{:016x} {:>6} {}'.format(dataset.get_hash(index), dataset.get_count(index),
+                                            packed.to_fen(dataset.get_packed(index))))
+        dataset.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,451 @@
+'''
+    Endgame tables for a king and one piece against a lone king
+
+    The tables are built by retrograde analysis with the rules of the game
+    (pseudo-legal moves, the game ends when a king is taken): starting from
+    the positions where a king can be taken, the results are passed back to
+    the positions before them until nothing changes. Every table holds one
+    signed byte per position: n > 0 if the side to move takes the king in
+    n plies, -n if its own king is taken in n plies, 0 for a draw.
+
+    The index is (side to move, square of the strong king, square of the
+    piece, square of the lone king), with the strong side as white; if the
+    piece is black, the squares are mirrored. The tables are memory-mapped
+    when they are probed. KPK needs the tables of the pieces a pawn can
+    promote to, the others are generated in parallel.
+
+    Usage:
+
+        python endgame.py generate --dir tables --workers 4
+        python endgame.py probe --dir tables --fen "8/8/8/4k3/8/8/8/KQ6 w - - 0 1"
+'''
+import argparse
+import mmap
+import os
+import time
+from array import array
+from typing import Dict, List, Tuple
+import bitboard
+from bitboard import KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, bishop_attacks, queen_attacks, rook_attacks, squares_of
+from objects import Board
+import perft
+
+Move = Tuple[Tuple[int, int], Tuple[int, int], str]
+
+TABLES = {'KQK': 'Queen', 'KRK': 'Rook', 'KBK': 'Bishop', 'KNK': 'Knight', 'KPK': 'Pawn'}
+TABLE_NAMES = {piece: name for name, piece in TABLES.items()}
+# the tables a table needs to be generated first
+DEPENDENCIES = {'KPK': ('KQK', 'KRK', 'KBK', 'KNK')}
+PROMOTIONS = (('KQK', 'queen'), ('KRK', 'rook'), ('KBK', 'bishop'), ('KNK', 'knight'))
+DEFAULT_DIRECTORY = 'tables'
+STRONG = 0
+WEAK = 1
+SIZE = 2 * 64 * 64 * 64
+KING_SQUARES = [squares_of(KING_ATTACKS[sq]) for sq in range(64)]
+
+
+def table_index(side: int, strong_king: int, piece: int, weak_king: int) -> int:
+    '''
+        Returns the index of a position in a table
+
+        Parameters
+        ----------
+        side: int
+            STRONG or WEAK, the side to move
+
+        strong_king: int
+            the square of the king of the side with the piece
+
+        piece: int
+            the square of the piece
+
+        weak_king: int
+            the square of the lone king
+
+        Returns
+        -------
+        int
+            the index
+    '''
+    return ((side * 64 + strong_king) * 64 + piece) * 64 + weak_king
+
+
+def piece_attacks(name: str, sq: int, occupied: int) -> int:
+    '''
+        Returns the squares the piece of a table attacks (as the strong side, white)
+    '''
+    if name == 'Queen':
+        return queen_attacks(sq, occupied)
+    if name == 'Rook':
+        return rook_attacks(sq, occupied)
+    if name == 'Bishop':
+        return bishop_attacks(sq, occupied)
+    if name == 'Knight':
+        return KNIGHT_ATTACKS[sq]
+    return PAWN_ATTACKS[bitboard.WHITE][sq]
+
+
+def table_path(directory: str, name: str) -> str:
+    '''
+        Returns the file of a table
+    '''
+    return os.path.join(directory, name + '.tbl')
+
+
+def generate_table(name: str, directory: str) -> Tuple[str, int, float]:
+    '''
+        Generates a table by retrograde analysis and writes it to the directory
+        (the tables it depends on need to be there already)
+
+        Parameters
+        ----------
+        name: str
+            the name of the table (e.g. KQK)
+
+        directory: str
+            the directory of the tables
+
+        Returns
+        -------
+        Tuple[str, int, float]
+            the name, the longest win in plies and the seconds it took
+    '''
+    start = time.perf_counter()
+    piece_name = TABLES[name]
+    dependencies = {}
+    for dependency in DEPENDENCIES.get(name, ()):
+        with open(table_path(directory, dependency), 'rb') as file:
+            dependencies[dependency] = array('b', file.read())
+    values = array('b', bytes(SIZE))
+    final = bytearray(SIZE)
+    remaining = bytearray(SIZE)
+    can_draw = bytearray(SIZE)
+    external_win = bytearray(SIZE)
+    external_loss = bytearray(SIZE)
+    # the positions whose result was decided, by ply (their predecessors still need to be updated)
+    buckets: Dict[int, List[int]] = {}
+    # wins through a move out of the table, by ply (a move inside the table can still win faster)
+    pending: Dict[int, List[int]] = {}
+
+    def settle(index: int, value: int, ply: int) -> None:
+        if ply > 127:
+            raise ValueError('{}: a result is longer than 127 plies'.format(name))
+        final[index] = 1
+        values[index] = value
+        buckets.setdefault(ply, []).append(index)
+
+    def add_external(index: int, value: int) -> None:
+        # value is the result of a position outside the table for the other side
+        if value == 0:
+            can_draw[index] = 1
+        elif value < 0:
+            if not external_win[index] or 1 - value < external_win[index]:
+                external_win[index] = 1 - value
+        elif value + 1 > external_loss[index]:
+            external_loss[index] = value + 1
+
+    # every position: the king captures, the moves inside the table and the results outside of it
+    piece_squares = range(8, 56) if piece_name == 'Pawn' else range(64)
+    for strong_king in range(64):
+        for piece in piece_squares:
+            if piece == strong_king:
+                continue
+            for weak_king in range(64):
+                if weak_king == strong_king or weak_king == piece:
+                    continue
+                occupied = 1 << strong_king | 1 << piece | 1 << weak_king
+                index = table_index(STRONG, strong_king, piece, weak_king)
+                attacks = piece_attacks(piece_name, piece, occupied)
+                if (KING_ATTACKS[strong_king] | attacks) >> weak_king & 1:
+                    settle(index, 1, 1)
+                else:
+                    count = sum(1 for sq in KING_SQUARES[strong_king] if sq != piece)
+                    if piece_name != 'Pawn':
+                        count += bin(attacks & ~(1 << strong_king)).count('1')
+                    elif not occupied >> (piece - 8) & 1:
+                        if piece < 16:
+                            for dependency, _ in PROMOTIONS:
+                                add_external(index, dependencies[dependency][table_index(WEAK, strong_king, piece - 8, weak_king)])
+                        else:
+                            count += 1
+                            if piece >= 48 and not occupied >> (piece - 16) & 1:
+                                count += 1
+                    remaining[index] = count
+                index = table_index(WEAK, strong_king, piece, weak_king)
+                if KING_ATTACKS[weak_king] >> strong_king & 1:
+                    settle(index, 1, 1)
+                    continue
+                count = 0
+                for sq in KING_SQUARES[weak_king]:
+                    if sq == piece:
+                        # only the two kings are left, the side to move takes the other one if it can
+                        add_external(index, 1 if KING_ATTACKS[strong_king] >> sq & 1 else 0)
+                    else:
+                        count += 1
+                remaining[index] = count
+
+    for index in range(SIZE):
+        if final[index]:
+            continue
+        if external_win[index]:
+            pending.setdefault(external_win[index], []).append(index)
+        elif not remaining[index] and external_loss[index] and not can_draw[index]:
+            settle(index, -external_loss[index], external_loss[index])
+
+    # the results are passed back ply by ply, so the first result a position gets is the shortest
+    longest = 0
+    while buckets or pending:
+        ply = min(list(buckets) + list(pending))
+        for index in pending.pop(ply, ()):
+            if not final[index]:
+                settle(index, ply, ply)
+        for index in buckets.pop(ply, ()):
+            value = values[index]
+            longest = max(longest, ply)
+            side, rest = divmod(index, 64 * 64 * 64)
+            strong_king, rest = divmod(rest, 64 * 64)
+            piece, weak_king = divmod(rest, 64)
+            occupied = 1 << strong_king | 1 << piece | 1 << weak_king
+            if side == WEAK:
+                predecessors = [table_index(STRONG, sq, piece, weak_king) for sq in KING_SQUARES[strong_king]
+                                if not occupied >> sq & 1]
+                if piece_name != 'Pawn':
+                    predecessors += [table_index(STRONG, strong_king, sq, weak_king)
+                                     for sq in squares_of(piece_attacks(piece_name, piece, occupied) & ~occupied)]
+                elif piece < 48 and not occupied >> (piece + 8) & 1:
+                    predecessors.append(table_index(STRONG, strong_king, piece + 8, weak_king))
+                    if 32 <= piece < 40 and not occupied >> (piece + 16) & 1:
+                        predecessors.append(table_index(STRONG, strong_king, piece + 16, weak_king))
+            else:
+                predecessors = [table_index(WEAK, strong_king, piece, sq) for sq in KING_SQUARES[weak_king]
+                                if not occupied >> sq & 1]
+            for predecessor in predecessors:
+                if final[predecessor]:
+                    continue
+                if value < 0:
+                    settle(predecessor, ply + 1, ply + 1)
+                    continue
+                remaining[predecessor] -= 1
+                if not remaining[predecessor] and not external_win[predecessor] and not can_draw[predecessor]:
+                    loss = max(ply + 1, external_loss[predecessor])
+                    settle(predecessor, -loss, loss)
+
+    os.makedirs(directory, exist_ok=True)
+    with open(table_path(directory, name), 'wb') as file:
+        file.write(values.tobytes())
+    return name, longest, time.perf_counter() - start
+
+
+def generate_tables(directory: str, workers: int = 1) -> List[Tuple[str, int, float]]:
+    '''
+        Generates all the tables, the independent ones in parallel
+
+        Parameters
+        ----------
+        directory: str
+            the directory of the tables
+
+        workers: int
+            the number of worker processes (0 to generate in this process)
+
+        Returns
+        -------
+        List[Tuple[str, int, float]]
+            the name, the longest win in plies and the seconds of every table
+    '''
+    # imported here, the search imports this module only to probe
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    stages = [[name for name in TABLES if name not in DEPENDENCIES], list(DEPENDENCIES)]
+    results = []
+    if workers == 0:
+        for stage in stages:
+            results.extend(generate_table(name, directory) for name in stage)
+        return results
+    with ProcessPoolExecutor(workers, multiprocessing.get_context('spawn')) as executor:
+        for stage in stages:
+            results.extend(executor.map(generate_table, stage, [directory] * len(stage)))
+    return results
+
+
+class Endgame_Tables():
+    '''
+        The memory-mapped tables of a directory
+
+        ...
+
+        Attributes
+        ----------
+        directory: str
+            the directory of the tables
+
+        tables: Dict[str, mmap.mmap]
+            the tables that were opened (None for missing files)
+
+        Methods
+        -------
+        get_table(self, name: str) -> mmap.mmap
+            Returns a table (None if it wasn't generated)
+
+        probe(self, board: Board) -> int
+            Returns the result of the position of a board
+
+        best_move(self, board: Board) -> Tuple[Move, int]
+            Returns the move with the best result
+
+        close(self) -> None
+            Unmaps the tables
+    '''
+    def __init__(self, directory: str = DEFAULT_DIRECTORY) -> None:
+        '''
+            Parameters
+            ----------
+            directory: str
+                the directory of the tables
+        '''
+        self.directory = directory
+        self.tables: Dict[str, mmap.mmap] = {}
+
+    def get_table(self, name: str) -> mmap.mmap:
+        '''
+            Returns a table, it is mapped the first time it is needed
+
+            Parameters
+            ----------
+            name: str
+                the name of the table (e.g. KQK)
+
+            Returns
+            -------
+            mmap.mmap
+                the table (None if it wasn't generated)
+        '''
+        if name not in self.tables:
+            path = table_path(self.directory, name)
+            self.tables[name] = None
+            if os.path.exists(path) and os.path.getsize(path) == SIZE:
+                with open(path, 'rb') as file:
+                    self.tables[name] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.tables[name]
+
+    def probe(self, board: Board) -> int:
+        '''
+            Returns the result of the position of a board
+
+            Parameters
+            ----------
+            board: Board
+                the board
+
+            Returns
+            -------
+            int
+                n > 0 if the side to move takes the king in n plies, -n if it loses
+                in n plies, 0 for a draw (None if there is no table for the position)
+        '''
+        pieces = board.pieces
+        if len(pieces) > 3 or board.castling:
+            return None
+        kings = {}
+        other = None
+        for piece in pieces:
+            if piece.get_class_name() == 'King':
+                kings[piece.get_colour()] = board.square_index(piece.get_pos())
+            elif other is None:
+                other = piece
+            else:
+                return None
+        if len(kings) != 2:
+            return None
+        if other is None:
+            # two kings: the side to move takes the other one if they stand next to each other
+            return 1 if KING_ATTACKS[kings['white']] >> kings['black'] & 1 else 0
+        table = self.get_table(TABLE_NAMES[other.get_class_name()])
+        if table is None:
+            return None
+        strong = other.get_colour()
+        weak = 'black' if strong == 'white' else 'white'
+        flip = 0 if strong == 'white' else 56
+        value = table[table_index(STRONG if board.turn == strong else WEAK, kings[strong] ^ flip,
+                                  board.square_index(other.get_pos()) ^ flip, kings[weak] ^ flip)]
+        return value - 256 if value > 127 else value
+
+    def best_move(self, board: Board) -> Tuple[Move, int]:
+        '''
+            Returns the move with the best result: the fastest win,
+            else a draw, else the slowest loss
+
+            Parameters
+            ----------
+            board: Board
+                the board
+
+            Returns
+            -------
+            Tuple[Move, int]
+                the move and the result of the position (None if there is no table for the position)
+        '''
+        value = self.probe(board)
+        if value is None:
+            return None
+        best = None
+        best_rank = None
+        for move in board.generate_moves():
+            from_pos, to_pos, promotion = move
+            target = board.get_piece_on_board(to_pos)
+            if target is not None and target.get_class_name() == 'King':
+                return move, 1
+            board.make_move(board.get_piece_on_board(from_pos), to_pos, promotion)
+            result = self.probe(board)
+            board.unmake_move()
+            if result is None:
+                continue
+            # the result of the other side: a fast loss is best, then a draw, then a slow win
+            rank = (2, result) if result < 0 else (1, 0) if result == 0 else (0, result)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return (best, value) if best is not None else None
+
+    def close(self) -> None:
+        '''
+            Unmaps the tables
+        '''
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generates and probes endgame tables')
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate = commands.add_parser('generate', help='generates the tables')
+    generate.add_argument('--dir', default=DEFAULT_DIRECTORY, help='the directory of the tables')
+    generate.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='the number of worker processes (0 for none)')
+    probe = commands.add_parser('probe', help='prints the result and the best move of a position')
+    probe.add_argument('--dir', default=DEFAULT_DIRECTORY, help='the directory of the tables')
+    probe.add_argument('--fen', required=True, help='the position')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        start = time.perf_counter()
+        for name, longest, elapsed in generate_tables(args.dir, args.workers):
+            print('{}: longest win {} plies, {:.1f} s'.format(name, longest, elapsed))
+        print('generated in {:.1f} s'.format(time.perf_counter() - start))
+    else:
+        board = Board()
+        board.load_fen(args.fen)
+        tables = Endgame_Tables(args.dir)
+        hit = tables.best_move(board)
+        if hit is None:
+            print('there is no table for this position')
+        else:
+            move, value = hit
+            result = 'draw' if value == 0 else '{} in {} plies'.format('win' if value > 0 else 'loss', abs(value))
+            print('{} (best move {})'.format(result, perft.move_to_str(move)))
+        tables.close()
+
+
+if __name__ == '__main__':
+    main()
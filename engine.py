@@ -0,0 +1,166 @@
+'''
+    Runs the search of the computer opponent in a separate process,
+    so the pygame loop keeps drawing while the computer thinks
+'''
+import multiprocessing
+import queue
+from bitboard import Bitboard_Position
+from objects import Board
+from endgame import Endgame_Tables
+from search import Search, Search_Result
+
+
+def run_worker(tasks: multiprocessing.Queue, results: multiprocessing.Queue, current_task: multiprocessing.Value,
+               tables: str = None) -> None:
+    '''
+        The loop of the worker process: searches every position it receives
+        and puts the result into the result queue
+
+        Parameters
+        ----------
+        tasks: multiprocessing.Queue
+            (task id, position, max depth, max nodes, max time) or None to quit
+
+        results: multiprocessing.Queue
+            (task id, Search_Result)
+
+        current_task: multiprocessing.Value
+            the id of the task the main process is waiting for,
+            a search stops as soon as it changes
+
+        tables: str
+            the directory of the endgame tables (None to always search)
+    '''
+    board = Board()
+    search = Search(board=board, tables=Endgame_Tables(tables) if tables is not None else None)
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, position, max_depth, max_nodes, max_time = task
+        if current_task.value != task_id:
+            continue
+        board.set_position(position)
+        search.should_stop = lambda: current_task.value != task_id
+        result = search.search(max_depth, max_nodes, max_time)
+        results.put((task_id, result))
+
+
+class Engine_Worker():
+    '''
+        A worker process for the search of the computer opponent
+
+        ...
+
+        Attributes
+        ----------
+        max_depth: int
+            the deepest iteration of a search
+
+        max_nodes: int
+            the node budget of a search (0 for no limit)
+
+        max_time: float
+            the time budget of a search in seconds (0 for no limit)
+
+        tables: str
+            the directory of the endgame tables (None to always search)
+
+        Methods
+        -------
+        start(self) -> None
+            Starts the worker process
+
+        request_move(self, position: Bitboard_Position) -> None
+            Starts searching a position
+
+        poll(self) -> Search_Result
+            Returns the result of the search if it is finished
+
+        is_thinking(self) -> bool
+            Checks if the worker is searching
+
+        cancel(self) -> None
+            Cancels the running search
+
+        shutdown(self) -> None
+            Stops the worker process
+    '''
+    def __init__(self, max_depth: int = 64, max_nodes: int = 0, max_time: float = 2.0, tables: str = None) -> None:
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_time = max_time
+        self.tables = tables
+        context = multiprocessing.get_context('spawn')
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.current_task = context.Value('i', 0, lock=False)
+        self.process = context.Process(target=run_worker, args=(self.tasks, self.results, self.current_task, tables), daemon=True)
+        self.task_id = 0
+        self.thinking = False
+
+    def start(self) -> None:
+        '''
+            Starts the worker process
+        '''
+        self.process.start()
+
+    def request_move(self, position: Bitboard_Position) -> None:
+        '''
+            Starts searching a position (a snapshot, the board of the game isn't touched)
+
+            Parameters
+            ----------
+            position: Bitboard_Position
+                the position to search
+        '''
+        self.task_id += 1
+        self.current_task.value = self.task_id
+        self.tasks.put((self.task_id, position, self.max_depth, self.max_nodes, self.max_time))
+        self.thinking = True
+
+    def poll(self) -> Search_Result:
+        '''
+            Returns the result of the search if it is finished (never blocks)
+
+            Returns
+            -------
+            Search_Result
+                the result
+            None
+                if the search is still running
+        '''
+        while self.thinking:
+            try:
+                task_id, result = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            if task_id == self.task_id:
+                self.thinking = False
+                return result
+        return None
+
+    def is_thinking(self) -> bool:
+        '''
+            Checks if the worker is searching
+        '''
+        return self.thinking
+
+    def cancel(self) -> None:
+        '''
+            Cancels the running search, its result is thrown away
+        '''
+        self.task_id += 1
+        self.current_task.value = self.task_id
+        self.thinking = False
+
+    def shutdown(self) -> None:
+        '''
+            Stops the worker process
+        '''
+        self.cancel()
+        if self.process.is_alive():
+            self.tasks.put(None)
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.terminate()
@@ -0,0 +1,315 @@
+'''
+    Opt-in counters and timers for the hot paths of the game
+
+    Nothing is measured until a function is instrumented: instrument()
+    replaces a function of a class or module with a wrapper that counts its
+    calls (and adds up the seconds they took), and restore() puts the
+    original functions back. Code that is never instrumented runs exactly as
+    before, so the instrumentation costs nothing while it is disabled.
+
+    end_frame() closes a frame: the calls and seconds of every function since
+    the last frame are added to the totals and kept for the last frames, so
+    the cost per frame can be shown while the game runs and the whole
+    session can be dumped to JSON and compared offline. The seconds of a
+    function include the functions it calls.
+
+    Usage:
+
+        instruments = Instrumentation()
+        instruments.instrument(Board, 'get_piece_on_board', timed=False)
+        instruments.instrument(Piece, 'calculate_moves')
+        ...
+        instruments.end_frame(frame_seconds)
+        instruments.dump('profile.json')
+
+        python instrumentation.py profile.json [other.json]
+'''
+import argparse
+import functools
+import json
+import time
+from collections import deque
+from typing import Callable, Dict, List, Tuple
+
+# the frames the recent summary is calculated from
+WINDOW = 120
+# the frame times kept for the percentiles of the whole session
+MAX_FRAMES = 100000
+
+
+def percentiles(times: List[float]) -> Dict[str, float]:
+    '''
+        Returns the mean, p50, p95, p99 and max of frame times in milliseconds
+
+        Parameters
+        ----------
+        times: List[float]
+            the frame times in seconds
+
+        Returns
+        -------
+        Dict[str, float]
+            the statistics (all 0 without frames)
+    '''
+    times = sorted(times)
+    if not times:
+        return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    last = len(times) - 1
+    return {'mean': 1000 * sum(times) / len(times), 'p50': 1000 * times[len(times) // 2],
+            'p95': 1000 * times[min(int(len(times) * 0.95), last)],
+            'p99': 1000 * times[min(int(len(times) * 0.99), last)], 'max': 1000 * times[-1]}
+
+
+class Instrumentation():
+    '''
+        Counts the calls of instrumented functions and the time they take, per frame and in total
+
+        ...
+
+        Attributes
+        ----------
+        counters: Dict[str, List]
+            [calls, seconds] of every instrumented function since the last frame
+
+        totals: Dict[str, List]
+            [calls, seconds] of every instrumented function since the start
+
+        timed: Dict[str, bool]
+            if the time of a function is measured or only its calls are counted
+
+        recent: deque
+            (end of the frame, frame seconds, {name: (calls, seconds)}) of the last frames
+
+        frame_times: deque
+            the seconds of the frames of the session (the last MAX_FRAMES)
+
+        frames: int
+            the number of frames
+
+        start: float
+            when the instrumentation was created (time.perf_counter)
+
+        Methods
+        -------
+        wrap(self, name: str, func: Callable, timed: bool = True) -> Callable
+            Returns a wrapper of a function that counts its calls
+
+        instrument(self, owner: object, attribute: str, name: str = None, timed: bool = True) -> None
+            Replaces a function of a class or module with a wrapper
+
+        restore(self) -> None
+            Puts all the original functions back
+
+        end_frame(self, seconds: float) -> None
+            Closes a frame
+
+        summary(self, recent: bool = True) -> Dict[str, object]
+            Returns the frame times and the cost of every function per frame
+
+        dump(self, path: str, extra: Dict[str, object] = None) -> None
+            Writes the summary of the session to a JSON file
+    '''
+    def __init__(self, window: int = WINDOW) -> None:
+        '''
+            Parameters
+            ----------
+            window: int
+                the number of frames the recent summary is calculated from
+        '''
+        self.counters = {}
+        self.totals = {}
+        self.timed = {}
+        self.recent = deque(maxlen=window)
+        self.frame_times = deque(maxlen=MAX_FRAMES)
+        self.frames = 0
+        self.start = time.perf_counter()
+        # (owner, attribute, original) of every instrumented function
+        self.originals: List[Tuple[object, str, object]] = []
+
+    def wrap(self, name: str, func: Callable, timed: bool = True) -> Callable:
+        '''
+            Returns a wrapper of a function that counts its calls under a name
+
+            Parameters
+            ----------
+            name: str
+                the name the calls are counted under
+
+            func: Callable
+                the function
+
+            timed: bool
+                if the seconds of the calls are added up too (only counting is cheaper
+                for functions that are called thousands of times per frame)
+
+            Returns
+            -------
+            Callable
+                the wrapper
+        '''
+        entry = self.counters.setdefault(name, [0, 0.0])
+        self.totals.setdefault(name, [0, 0.0])
+        self.timed[name] = timed
+        if not timed:
+            @functools.wraps(func)
+            def counted(*args, **kwargs):
+                entry[0] += 1
+                return func(*args, **kwargs)
+            return counted
+        perf_counter = time.perf_counter
+
+        @functools.wraps(func)
+        def measured(*args, **kwargs):
+            entry[0] += 1
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                entry[1] += perf_counter() - start
+        return measured
+
+    def instrument(self, owner: object, attribute: str, name: str = None, timed: bool = True) -> None:
+        '''
+            Replaces a function of a class or module with a wrapper that counts its calls
+            (a module function is only counted where it is called through the module)
+
+            Parameters
+            ----------
+            owner: object
+                the class or module
+
+            attribute: str
+                the name of the function
+
+            name: str
+                the name the calls are counted under (Class.function or function if None)
+
+            timed: bool
+                if the seconds of the calls are added up too
+        '''
+        if name is None:
+            name = '{}.{}'.format(owner.__name__, attribute) if isinstance(owner, type) else attribute
+        original = owner.__dict__[attribute]
+        self.originals.append((owner, attribute, original))
+        setattr(owner, attribute, self.wrap(name, original, timed))
+
+    def restore(self) -> None:
+        '''
+            Puts all the original functions back, the counts are kept
+        '''
+        while self.originals:
+            owner, attribute, original = self.originals.pop()
+            setattr(owner, attribute, original)
+
+    def end_frame(self, seconds: float) -> None:
+        '''
+            Closes a frame: the counts since the last frame are added to the totals and the recent frames
+
+            Parameters
+            ----------
+            seconds: float
+                the time the frame took
+        '''
+        record = {}
+        for name, entry in self.counters.items():
+            if entry[0]:
+                record[name] = (entry[0], entry[1])
+                total = self.totals[name]
+                total[0] += entry[0]
+                total[1] += entry[1]
+                entry[0] = 0
+                entry[1] = 0.0
+        self.recent.append((time.perf_counter(), seconds, record))
+        self.frame_times.append(seconds)
+        self.frames += 1
+
+    def summary(self, recent: bool = True) -> Dict[str, object]:
+        '''
+            Returns the frame times and the cost of every function per frame
+
+            Parameters
+            ----------
+            recent: bool
+                only the last frames (for the overlay) or the whole session
+
+            Returns
+            -------
+            Dict[str, object]
+                frames, fps, frame_time_ms (mean, p50, p95, p99, max) and phases
+                (calls, ms, calls_per_frame and ms_per_frame of every function)
+        '''
+        if recent:
+            times = [seconds for _, seconds, _ in self.recent]
+            counts = {}
+            for _, _, record in self.recent:
+                for name, (calls, seconds) in record.items():
+                    entry = counts.setdefault(name, [0, 0.0])
+                    entry[0] += calls
+                    entry[1] += seconds
+            frames = len(times)
+            elapsed = self.recent[-1][0] - self.recent[0][0] + self.recent[0][1] if self.recent else 0.0
+        else:
+            times = list(self.frame_times)
+            counts = self.totals
+            frames = self.frames
+            elapsed = time.perf_counter() - self.start
+        phases = {}
+        for name in self.totals:
+            calls, seconds = counts.get(name, (0, 0.0))
+            phases[name] = {'calls': calls, 'ms': 1000 * seconds if self.timed[name] else None,
+                            'calls_per_frame': calls / frames if frames else 0.0,
+                            'ms_per_frame': 1000 * seconds / frames if frames and self.timed[name] else None}
+        return {'frames': frames, 'fps': frames / elapsed if elapsed else 0.0,
+                'frame_time_ms': percentiles(times), 'phases': phases}
+
+    def dump(self, path: str, extra: Dict[str, object] = None) -> None:
+        '''
+            Writes the summary of the whole session to a JSON file
+
+            Parameters
+            ----------
+            path: str
+                the file
+
+            extra: Dict[str, object]
+                more values to write, e.g. the settings of the session
+        '''
+        data = dict(extra or {})
+        data.update(self.summary(recent=False))
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, indent=2)
+
+
+def format_phase(name: str, phase: Dict[str, object]) -> str:
+    '''
+        Returns the cost of a function per frame as text
+    '''
+    if phase['ms_per_frame'] is None:
+        return '{}: {:.1f} calls'.format(name, phase['calls_per_frame'])
+    return '{}: {:.2f} ms, {:.1f} calls'.format(name, phase['ms_per_frame'], phase['calls_per_frame'])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Prints and compares JSON dumps of the instrumentation (main.py --instrument-json)')
+    parser.add_argument('files', nargs='+', help='the dumps, the first one is the baseline of the others')
+    args = parser.parse_args()
+
+    dumps = []
+    for path in args.files:
+        with open(path, encoding='utf-8') as file:
+            dumps.append(json.load(file))
+    base = dumps[0]
+    for path, data in zip(args.files, dumps):
+        times = data['frame_time_ms']
+        print('{}: {} frames, {:.1f} fps, frame time mean {:.2f} ms, p50 {:.2f} ms, p95 {:.2f} ms, p99 {:.2f} ms, max {:.2f} ms'.format(
+            path, data['frames'], data['fps'], times['mean'], times['p50'], times['p95'], times['p99'], times['max']))
+        for name, phase in data['phases'].items():
+            line = '    ' + format_phase(name, phase) + ' per frame'
+            old = base['phases'].get(name)
+            if data is not base and old is not None and phase['ms_per_frame'] and old['ms_per_frame']:
+                line += '  ({:+.0f} %)'.format(100 * (phase['ms_per_frame'] / old['ms_per_frame'] - 1))
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+'''
+    Load generator for server.py
+
+    Opens a number of connections to a running server, every connection
+    plays random games as fast as it can (asking for the legal moves and
+    playing one of them), and reports the moves per second and the
+    request latencies.
+
+    Usage:
+
+        python server.py --port 8765 &
+        python loadgen.py --port 8765 --clients 200 --duration 10
+'''
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import List
+
+
+class Load_Client():
+    '''
+        One connection that plays random games on the server
+
+        ...
+
+        Attributes
+        ----------
+        latencies: List[float]
+            the seconds of every request
+
+        moves: int
+            the number of moves played
+
+        games: int
+            the number of games started
+
+        Methods
+        -------
+        request(self, message: dict) -> dict
+            Sends a request and waits for the response
+
+        run(self, host: str, port: int, deadline: float) -> None
+            Plays games until the deadline
+    '''
+    def __init__(self, seed: int) -> None:
+        '''
+            Parameters
+            ----------
+            seed: int
+                the seed of the random moves
+        '''
+        self.random = random.Random(seed)
+        self.latencies: List[float] = []
+        self.moves = 0
+        self.games = 0
+        self.reader = None
+        self.writer = None
+        self.next_id = 0
+
+    async def request(self, message: dict) -> dict:
+        '''
+            Sends a request and waits for the response
+
+            Parameters
+            ----------
+            message: dict
+                the request
+
+            Returns
+            -------
+            dict
+                the response
+        '''
+        self.next_id += 1
+        message['id'] = self.next_id
+        start = time.perf_counter()
+        self.writer.write((json.dumps(message) + '\n').encode())
+        response = json.loads(await self.reader.readline())
+        self.latencies.append(time.perf_counter() - start)
+        if not response.get('ok'):
+            raise RuntimeError('request failed: {} -> {}'.format(message, response.get('error')))
+        return response
+
+    async def run(self, host: str, port: int, deadline: float) -> None:
+        '''
+            Plays games until the deadline
+
+            Parameters
+            ----------
+            host: str
+                the address of the server
+
+            port: int
+                the port of the server
+
+            deadline: float
+                the time.perf_counter() at which to stop
+        '''
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        try:
+            game = None
+            while time.perf_counter() < deadline:
+                if game is None:
+                    game = (await self.request({'cmd': 'create'}))['game']
+                    self.games += 1
+                moves = (await self.request({'cmd': 'moves', 'game': game}))['moves']
+                if not moves:
+                    await self.request({'cmd': 'close', 'game': game})
+                    game = None
+                    continue
+                await self.request({'cmd': 'move', 'game': game, 'move': self.random.choice(moves)})
+                self.moves += 1
+            if game is not None:
+                await self.request({'cmd': 'close', 'game': game})
+        finally:
+            self.writer.close()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    '''
+        Returns a percentile of sorted values
+    '''
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_load(host: str, port: int, clients: int, duration: float, seed: int) -> None:
+    '''
+        Runs the clients against the server and prints the results
+
+        Parameters
+        ----------
+        host: str
+            the address of the server
+
+        port: int
+            the port of the server
+
+        clients: int
+            the number of connections (and games played at the same time)
+
+        duration: float
+            the seconds to run
+
+        seed: int
+            the seed of the random moves
+    '''
+    load_clients = [Load_Client(seed + i) for i in range(clients)]
+    start = time.perf_counter()
+    await asyncio.gather(*(client.run(host, port, start + duration) for client in load_clients))
+    elapsed = time.perf_counter() - start
+    moves = sum(client.moves for client in load_clients)
+    latencies = sorted(latency for client in load_clients for latency in client.latencies)
+    print('clients: {}  games: {}  requests: {}'.format(clients, sum(client.games for client in load_clients), len(latencies)))
+    print('moves: {} in {:.1f} s ({:.0f} moves/s)'.format(moves, elapsed, moves / elapsed))
+    if latencies:
+        print('latency: p50 {:.2f} ms  p90 {:.2f} ms  p99 {:.2f} ms  max {:.2f} ms'.format(
+            1000 * percentile(latencies, 0.5), 1000 * percentile(latencies, 0.9),
+            1000 * percentile(latencies, 0.99), 1000 * latencies[-1]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Plays random games against server.py and reports the throughput')
+    parser.add_argument('--host', default='127.0.0.1', help='the address of the server')
+    parser.add_argument('--port', type=int, default=8765, help='the port of the server')
+    parser.add_argument('--clients', type=int, default=100, help='the number of connections')
+    parser.add_argument('--duration', type=float, default=10.0, help='the seconds to run')
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the random moves')
+    args = parser.parse_args()
+    asyncio.run(run_load(args.host, args.port, args.clients, args.duration, args.seed))
+
+
+if __name__ == '__main__':
+    main()
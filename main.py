@@ -1,20 +1,29 @@
 import pygame
-from objects import Piece_Handler, Piece
-from typing import Tuple
+import argparse
+import sys
+import time
+from collections import deque
+from objects import Piece_Handler, Piece, Board
+import pgn
+from book import Opening_Book
+from engine import Engine_Worker
+from assets import sprites, Asset_Cache
+from instrumentation import Instrumentation, format_phase
+from typing import Tuple, List
 from sys import exit
-from pathlib import Path
 from enum import Enum
 
-pygame.init()
 X = 800
 Y = 750
-screen = pygame.display.set_mode((X, Y))
-screen.fill('mediumseagreen')
-pygame.display.set_caption('PyChess')
-clock = pygame.time.Clock()
+screen = None
+clock = None
 PIECE_SIDE = 70
 START_X = 120
 START_Y = 100
+LIGHT_COLOUR = 'cornsilk'
+DARK_COLOUR = 'burlywood4'
+board_background = None
+board_background_key = None
 circles = []
 current_piece = None
 current_player = 0
@@ -23,20 +32,67 @@ boardRectangle = pygame.Rect(START_X, START_Y, 8 * PIECE_SIDE, 8 * PIECE_SIDE)
 GameState = Enum('GameState', ['MENUE', 'RUNNING', 'GAMEOVER'])
 state = GameState.MENUE
 btnRect = None
+computer_player = None
+engine = None
+# the opening book of the computer (None to always search)
+opening_book = None
+# 'full' redraws everything every frame, 'dirty' only redraws what changed
+# and sleeps in pygame.event.wait while nothing happens
+render_mode = 'full'
+IDLE_TIMEOUT = 1000
+THINKING_TIMEOUT = 1000 // 60
+full_redraw = True
+dirty_squares = set()
+dirty_thinking = False
+frame_times = deque(maxlen=100000)
+# the moves of the current game, written to pgn_path when the game ends
+pgn_path = None
+played_moves = []
+# the counters and timers of --instrument (None while the instrumentation is disabled)
+instruments = None
+overlay_visible = False
+overlay_font = None
+OVERLAY_KEY = pygame.K_F3
+# the draw phases that are timed with --instrument
+DRAW_PHASES = ('draw_state', 'draw_changes', 'load_board', 'load_pieces', 'drawCircles',
+               'draw_promotion_screen', 'draw_thinking', 'draw_overlay')
+
+
+def render_board() -> pygame.Surface:
+    '''
+        Draws the checkered board into a new surface
+
+        Returns
+        -------
+        pygame.Surface
+            the board
+    '''
+    board = pygame.Surface((8 * PIECE_SIDE, 8 * PIECE_SIDE))
+    for i in range(8):
+        for j in range(8):
+            colour = LIGHT_COLOUR if (i + j) % 2 == 0 else DARK_COLOUR
+            board.fill(colour, (PIECE_SIDE * i, PIECE_SIDE * j, PIECE_SIDE, PIECE_SIDE))
+    return board.convert()
+
+
+def get_board_background() -> pygame.Surface:
+    '''
+        Returns the board without pieces, it is only rendered again
+        if the colours, the size or the position of the board changed
+    '''
+    global board_background, board_background_key
+    key = (LIGHT_COLOUR, DARK_COLOUR, PIECE_SIDE, START_X, START_Y)
+    if key != board_background_key:
+        board_background = render_board()
+        board_background_key = key
+    return board_background
 
 
 def load_board() -> None:
     '''
         Draws the board on the window
     '''
-    is_white = True
-    for i in range(8):
-        for j in range(8):
-            plate = pygame.Surface((PIECE_SIDE, PIECE_SIDE))
-            plate.fill('cornsilk' if is_white else 'burlywood4')
-            is_white = not is_white
-            screen.blit(plate, (START_X + PIECE_SIDE * i, START_Y + PIECE_SIDE * j))
-        is_white = not is_white
+    screen.blit(get_board_background(), (START_X, START_Y))
 
 
 def drawCircle(pos: Tuple[int, int]) -> None:
@@ -49,16 +105,12 @@ def drawCircle(pos: Tuple[int, int]) -> None:
             the position of the circle where it needs to be drawn
     '''
     if Piece_Handler.get_piece_on_board(pos) is None and (pos != Piece_Handler.get_ghost_piece() or current_piece.get_class_name() != "Pawn"):
-        rel_path = '\\sprites\\others\\move_circle.png'
+        image = sprites.get('others', 'move_circle')
     else:
-        rel_path = '\\sprites\\others\\take_circle.png'
-    source_path = Path(__file__).resolve()
-    source_dir = source_path.parent
-    image = pygame.image.load(source_dir.__str__() + rel_path)
+        image = sprites.get('others', 'take_circle')
     x, y = pos
     x_real = START_X + PIECE_SIDE * x + (PIECE_SIDE - image.get_width()) / 2
     y_real = START_Y + PIECE_SIDE * y + (PIECE_SIDE - image.get_height()) / 2
-    image.set_alpha(100)
     screen.blit(image, (x_real, y_real))
 
 
@@ -80,7 +132,7 @@ def set_circles(piece: Piece) -> None:
             the piece from which the moves need to be saved
     '''
     global circles
-    circles = piece.get_moves()
+    circles = Piece_Handler.get_piece_moves(piece)
 
 
 def load_single_piece(piece: Piece) -> None:
@@ -92,7 +144,7 @@ def load_single_piece(piece: Piece) -> None:
         piece: Piece
             The piece that needs to be drawn on the board
     '''
-    image = piece.getImage()
+    image = sprites.get_piece(piece)
     x, y = piece.get_pos()
     x_real = START_X + PIECE_SIDE * x + (PIECE_SIDE - image.get_width()) / 2
     y_real = START_Y + PIECE_SIDE * y + (PIECE_SIDE - image.get_height()) / 2
@@ -176,11 +228,7 @@ def draw_promotion_piece(colour: str, piece: str, pos: Tuple[int, int]) -> None:
         pos: Tuple[int, int]
             where the piece is located on the promotion-screen
     '''
-    rel_path = '\\sprites\\{}\\{}.png'.format(colour, piece)
-    source_path = Path(__file__).resolve()
-    source_dir = source_path.parent
-    image = pygame.image.load(source_dir.__str__() + rel_path)
-    image = pygame.transform.rotozoom(image, 0, 0.45)
+    image = sprites.get(colour, piece)
     x = pos[0] + 3
     y = pos[1] + 3
     x_real = START_X + PIECE_SIDE * x + (PIECE_SIDE - image.get_width()) / 2
@@ -258,15 +306,271 @@ def draw_menue() -> None:
     draw_screen("PyChess")
 
 
+def thinking_text() -> str:
+    '''
+        Returns the text of the thinking-indicator (empty if the computer isn't searching)
+    '''
+    if engine is not None and engine.is_thinking():
+        return 'Thinking' + '.' * (pygame.time.get_ticks() // 300 % 4)
+    return ''
+
+
+def thinking_area() -> pygame.Rect:
+    '''
+        Returns the area of the thinking-indicator
+    '''
+    return pygame.Rect(START_X, START_Y - 60, 8 * PIECE_SIDE, 50)
+
+
+def draw_thinking() -> None:
+    '''
+        Draws the thinking-indicator above the board while the computer searches
+    '''
+    screen.fill('mediumseagreen', thinking_area())
+    text = thinking_text()
+    if text:
+        font = pygame.font.Font("freesansbold.ttf", 30)
+        screen.blit(font.render(text, True, (0, 0, 0)), (START_X, START_Y - 50))
+
+
 def draw_game() -> None:
     '''
         Draws the game to the window
     '''
+    sprites.set_tile_size(PIECE_SIDE)
     load_board()
     load_pieces()
     drawCircles()
     if promotion_screen_active:
         draw_promotion_screen()
+    draw_thinking()
+
+
+def draw_state() -> None:
+    '''
+        Draws the whole window for the current state
+    '''
+    match state:
+        case GameState.MENUE:
+            draw_menue()
+        case GameState.RUNNING:
+            draw_game()
+        case GameState.GAMEOVER:
+            draw_gameover()
+
+
+def square_rect(pos: Tuple[int, int]) -> pygame.Rect:
+    '''
+        Returns the area of a square of the board on the window
+
+        Parameters
+        ----------
+        pos: Tuple[int, int]
+            the position of the square
+    '''
+    return pygame.Rect(START_X + PIECE_SIDE * pos[0], START_Y + PIECE_SIDE * pos[1], PIECE_SIDE, PIECE_SIDE)
+
+
+def promotion_rect() -> pygame.Rect:
+    '''
+        Returns the area of the promotion-screen on the window
+    '''
+    return pygame.Rect(START_X + PIECE_SIDE * 3, START_Y + PIECE_SIDE * 3, PIECE_SIDE * 2, PIECE_SIDE * 2)
+
+
+def scene_snapshot() -> tuple:
+    '''
+        Returns everything that decides what the window shows,
+        two snapshots are compared to find what needs to be drawn again
+
+        Returns
+        -------
+        tuple
+            (state, pieces on the squares, circles, promotion-screen, thinking-indicator, selected piece)
+    '''
+    return (state, Piece_Handler.squares[:], circles[:], promotion_screen_active, thinking_text(), current_piece)
+
+
+def mark_changes(before: tuple, after: tuple) -> None:
+    '''
+        Marks everything that changed between two snapshots as dirty
+
+        Parameters
+        ----------
+        before: tuple
+            the snapshot before the events were handled
+
+        after: tuple
+            the snapshot after the events were handled
+    '''
+    global full_redraw, dirty_thinking
+    if before[0] != after[0]:
+        full_redraw = True
+        return
+    for i, (old, new) in enumerate(zip(before[1], after[1])):
+        if old is not new:
+            dirty_squares.add((i % 8, i // 8))
+    dirty_squares.update(set(before[2]).symmetric_difference(after[2]))
+    if before[3] != after[3] or (after[3] and before[5] is not after[5]):
+        dirty_squares.update((x, y) for x in range(3, 5) for y in range(3, 5))
+    if before[4] != after[4]:
+        dirty_thinking = True
+
+
+def draw_square(pos: Tuple[int, int]) -> None:
+    '''
+        Draws a single square of the board with its piece and circle
+
+        Parameters
+        ----------
+        pos: Tuple[int, int]
+            the position of the square
+    '''
+    rect = square_rect(pos)
+    screen.blit(get_board_background(), rect, rect.move(-START_X, -START_Y))
+    piece = Piece_Handler.get_piece_on_board(pos)
+    if piece is not None:
+        load_single_piece(piece)
+    if pos in circles:
+        drawCircle(pos)
+
+
+def draw_changes() -> List[pygame.Rect]:
+    '''
+        Draws everything that was marked as dirty
+
+        Returns
+        -------
+        List[pygame.Rect]
+            the areas of the window that changed
+    '''
+    global full_redraw, dirty_thinking
+    if full_redraw:
+        draw_state()
+        full_redraw = False
+        dirty_squares.clear()
+        dirty_thinking = False
+        return [screen.get_rect()]
+    rects = []
+    if state == GameState.RUNNING:
+        if dirty_squares:
+            sprites.set_tile_size(PIECE_SIDE)
+            overlay = promotion_rect()
+            for pos in dirty_squares:
+                draw_square(pos)
+                rects.append(square_rect(pos))
+            if promotion_screen_active and overlay.collidelist(rects) != -1:
+                draw_promotion_screen()
+                rects.append(overlay)
+        if dirty_thinking:
+            draw_thinking()
+            rects.append(thinking_area())
+    dirty_squares.clear()
+    dirty_thinking = False
+    return rects
+
+
+def print_frame_stats(wall_time: float, cpu_time: float) -> None:
+    '''
+        Prints the frame times and the CPU usage of the session
+
+        Parameters
+        ----------
+        wall_time: float
+            the seconds the window was open
+
+        cpu_time: float
+            the CPU seconds the process used in that time
+    '''
+    times = sorted(frame_times)
+    if not times:
+        return
+    print('render mode: {}'.format(render_mode))
+    print('frames: {} in {:.1f} s ({:.1f} per second)'.format(len(times), wall_time, len(times) / wall_time))
+    print('frame time: mean {:.2f} ms, p50 {:.2f} ms, p95 {:.2f} ms, max {:.2f} ms'.format(
+        1000 * sum(times) / len(times), 1000 * times[len(times) // 2],
+        1000 * times[int(len(times) * 0.95)], 1000 * times[-1]))
+    print('cpu usage: {:.1f} %'.format(100 * cpu_time / wall_time))
+
+
+def enable_instrumentation() -> None:
+    '''
+        Counts and times the move generation, the sprite loading and lookups and the
+        draw phases and shows the overlay (without --instrument nothing is wrapped)
+    '''
+    global instruments, overlay_visible
+    instruments = Instrumentation()
+    instruments.instrument(Board, 'get_piece_on_board', timed=False)
+    instruments.instrument(Piece, 'calculate_moves')
+    instruments.instrument(Board, 'get_piece_moves')
+    instruments.instrument(Asset_Cache, 'set_tile_size')
+    instruments.instrument(Asset_Cache, 'get', timed=False)
+    instruments.instrument(Asset_Cache, 'get_piece', timed=False)
+    module = sys.modules[__name__]
+    for phase in DRAW_PHASES:
+        instruments.instrument(module, phase)
+    overlay_visible = True
+
+
+def overlay_area() -> pygame.Rect:
+    '''
+        Returns the area of the instrumentation overlay (below the board)
+    '''
+    top = START_Y + 8 * PIECE_SIDE + 5
+    return pygame.Rect(0, top, X, Y - top)
+
+
+def draw_overlay() -> None:
+    '''
+        Draws the frames per second, the frame-time percentiles and the cost of
+        every instrumented function per frame (over the last frames)
+    '''
+    global overlay_font
+    if overlay_font is None:
+        overlay_font = pygame.font.Font("freesansbold.ttf", 11)
+    area = overlay_area()
+    screen.fill('mediumseagreen', area)
+    summary = instruments.summary()
+    times = summary['frame_time_ms']
+    header = '{:.1f} fps   frame time p50 {:.2f} ms   p95 {:.2f} ms   p99 {:.2f} ms   max {:.2f} ms   (per frame, F3 hides)'.format(
+        summary['fps'], times['p50'], times['p95'], times['p99'], times['max'])
+    screen.blit(overlay_font.render(header, True, (0, 0, 0)), (10, area.y))
+    column_width = (X - 20) // 3
+    rows = (area.height - 16) // 13
+    for i, (name, phase) in enumerate(summary['phases'].items()):
+        x = 10 + column_width * (i // rows)
+        y = area.y + 16 + 13 * (i % rows)
+        screen.blit(overlay_font.render(format_phase(name, phase), True, (0, 0, 0)), (x, y))
+
+
+def toggle_overlay() -> None:
+    '''
+        Shows or hides the instrumentation overlay
+    '''
+    global overlay_visible, full_redraw
+    overlay_visible = not overlay_visible
+    if not overlay_visible:
+        screen.fill('mediumseagreen', overlay_area())
+        full_redraw = True
+
+
+def save_game(result: str) -> None:
+    '''
+        Appends the current game to the PGN file (if one was given with --pgn)
+
+        Parameters
+        ----------
+        result: str
+            1-0, 0-1 or * (unfinished)
+    '''
+    if pgn_path is None or not played_moves:
+        return
+    players = ["Human", "Human"]
+    if computer_player is not None:
+        players[computer_player] = "PyChess"
+    with open(pgn_path, "a", encoding="utf-8") as file:
+        pgn.write_game(file, played_moves, {"Event": "PyChess game", "White": players[0], "Black": players[1]}, result)
+    played_moves.clear()
 
 
 def click_on_menue() -> None:
@@ -276,8 +580,11 @@ def click_on_menue() -> None:
     global btnRect, state, circles, current_player
     pos = pygame.mouse.get_pos()
     if (btnRect.collidepoint(pos)):
+        if engine is not None:
+            engine.cancel()
         state = GameState.RUNNING
         Piece_Handler.init_pieces()
+        played_moves.clear()
         circles = []
         current_player = 0
 
@@ -293,6 +600,76 @@ def draw_gameover() -> None:
         draw_screen("Black has won")
 
 
+def is_computer_turn() -> bool:
+    '''
+        Checks if the computer needs to move
+    '''
+    return computer_player is not None and current_player == computer_player and not promotion_screen_active
+
+
+def run_computer() -> None:
+    '''
+        Plays a move from the opening book or starts the search when the computer
+        needs to move and plays the result as soon as it arrived (called once per
+        frame, never blocks)
+    '''
+    if not engine.is_thinking():
+        move = opening_book.get_move(Piece_Handler) if opening_book is not None else None
+        if move is not None:
+            play_computer_move(move)
+        else:
+            engine.request_move(Piece_Handler.get_position())
+        return
+    result = engine.poll()
+    if result is None or result.move is None:
+        return
+    play_computer_move(result.move)
+
+
+def play_computer_move(move: Tuple[Tuple[int, int], Tuple[int, int], str]) -> None:
+    '''
+        Plays a move of the computer (from the search or the opening book)
+
+        Parameters
+        ----------
+        move: Tuple[Tuple[int, int], Tuple[int, int], str]
+            the move (from, to, promotion)
+    '''
+    global current_player, state, circles
+    from_pos, to_pos, promotion = move
+    piece = Piece_Handler.get_piece_on_board(from_pos)
+    taken = Piece_Handler.get_piece_on_board(to_pos)
+    if taken is not None and taken.get_class_name() == "King":
+        state = GameState.GAMEOVER
+        screen.fill("mediumseagreen")
+        played_moves.append(move)
+        save_game("1-0" if current_player == 0 else "0-1")
+    elif piece.move_piece(to_pos):
+        played_moves.append(move)
+        if promotion:
+            Piece_Handler.promote_piece(piece, promotion)
+        circles = []
+        current_player = (current_player + 1) % 2
+
+
+def leave_game() -> None:
+    '''
+        Returns to the menue and cancels the search of the computer
+    '''
+    global state, circles, current_piece, promotion_screen_active
+    if engine is not None:
+        engine.cancel()
+    if promotion_screen_active:
+        # the promotion was not chosen, so the last move is incomplete
+        played_moves.pop()
+    save_game("*")
+    state = GameState.MENUE
+    circles = []
+    current_piece = None
+    promotion_screen_active = False
+    screen.fill("mediumseagreen")
+
+
 def run_game() -> None:
     '''
         Runs the game and contains all the chess-logic
@@ -303,6 +680,7 @@ def run_game() -> None:
         if pos != (-1, -1):
             promotion_piece = get_promotion(pos)
             Piece_Handler.promote_piece(current_piece, promotion_piece)
+            played_moves[-1] = played_moves[-1][:2] + (promotion_piece,)
             current_piece = None
             promotion_screen_active = False
     else:
@@ -316,10 +694,14 @@ def run_game() -> None:
                 current_piece = piece_clicked
         elif current_piece is not None and clicked_pos != (-1, -1) and clicked_pos in circles:
             clicked_piece = Piece_Handler.get_piece_on_board(clicked_pos)
+            from_pos = current_piece.get_pos()
             if clicked_piece is not None and clicked_piece.get_class_name() == "King":
                 state = GameState.GAMEOVER
                 screen.fill("mediumseagreen")
+                played_moves.append((current_piece.get_pos(), clicked_pos, ""))
+                save_game("1-0" if current_player == 0 else "0-1")
             elif current_piece.move_piece(clicked_pos):
+                played_moves.append((from_pos, clicked_pos, ""))
                 circles = []
                 current_player = (current_player + 1) % 2
                 if is_promotion_ready():
@@ -332,23 +714,86 @@ def run_game() -> None:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='PyChess')
+    parser.add_argument('--computer', choices=('white', 'black'), help='the colour the computer plays')
+    parser.add_argument('--think-time', type=float, default=2.0, help='the seconds the computer thinks per move')
+    parser.add_argument('--render', choices=('full', 'dirty'), default='full',
+                        help='redraw everything every frame or only what changed')
+    parser.add_argument('--stats', action='store_true', help='print frame times and cpu usage when the window is closed')
+    parser.add_argument('--pgn', help='append the played games to this PGN file')
+    parser.add_argument('--book', help='an opening book (built with book.py) the computer plays from')
+    parser.add_argument('--tables', help='a directory of endgame tables (generated with endgame.py) the computer plays from')
+    parser.add_argument('--instrument', action='store_true',
+                        help='count and time the move generation, sprites and draw phases and show them (F3 toggles the overlay)')
+    parser.add_argument('--instrument-json', help='write the instrumentation of the session to this JSON file when the window is closed')
+    args = parser.parse_args()
+    render_mode = args.render
+    pgn_path = args.pgn
+    if args.instrument or args.instrument_json:
+        enable_instrumentation()
+    if args.computer is not None:
+        computer_player = 0 if args.computer == 'white' else 1
+        engine = Engine_Worker(max_time=args.think_time, tables=args.tables)
+        engine.start()
+        if args.book is not None:
+            opening_book = Opening_Book(args.book)
+
+    pygame.init()
+    screen = pygame.display.set_mode((X, Y))
+    screen.fill('mediumseagreen')
+    pygame.display.set_caption('PyChess')
+    clock = pygame.time.Clock()
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
     while True:
-        for event in pygame.event.get():
+        before = scene_snapshot()
+        if render_mode == 'dirty':
+            timeout = THINKING_TIMEOUT if state == GameState.RUNNING and is_computer_turn() else IDLE_TIMEOUT
+            events = [pygame.event.wait(timeout)] + pygame.event.get()
+        else:
+            events = pygame.event.get()
+        frame_start = time.perf_counter()
+        for event in events:
             if event.type == pygame.QUIT:
+                if state == GameState.RUNNING:
+                    leave_game()
+                if engine is not None:
+                    engine.shutdown()
                 pygame.quit()
+                if args.stats:
+                    print_frame_stats(time.perf_counter() - start_wall, time.process_time() - start_cpu)
+                if args.instrument_json:
+                    instruments.dump(args.instrument_json, {'render_mode': render_mode})
                 exit()
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                full_redraw = True
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE and state == GameState.RUNNING:
+                leave_game()
+            elif event.type == pygame.KEYDOWN and event.key == OVERLAY_KEY and instruments is not None:
+                toggle_overlay()
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 match state:
                     case GameState.MENUE | GameState.GAMEOVER:
                         click_on_menue()
                     case GameState.RUNNING:
-                        run_game()
-        match state:
-            case GameState.MENUE:
-                draw_menue()
-            case GameState.RUNNING:
-                draw_game()
-            case GameState.GAMEOVER:
-                draw_gameover()
-        pygame.display.update()
+                        if not is_computer_turn():
+                            run_game()
+        if state == GameState.RUNNING and is_computer_turn():
+            run_computer()
+        if render_mode == 'dirty':
+            mark_changes(before, scene_snapshot())
+            rects = draw_changes()
+            if overlay_visible:
+                draw_overlay()
+                rects.append(overlay_area())
+            if rects:
+                pygame.display.update(rects)
+        else:
+            draw_state()
+            if overlay_visible:
+                draw_overlay()
+            pygame.display.update()
+        frame_times.append(time.perf_counter() - frame_start)
+        if instruments is not None:
+            instruments.end_frame(frame_times[-1])
         clock.tick(60)
@@ -1,8 +1,9 @@
-import pygame
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from typing import Tuple, List
-from pathlib import Path
 import itertools
+import bitboard
+import zobrist
 
 
 class Piece(ABC):
@@ -19,6 +20,13 @@ class Piece(ABC):
         pos: Tuple[int, int]
             the position of the piece on the board
 
+        board: Board
+            the board the piece is on, all the moves are looked up on it
+            (set when the piece is added to a board)
+
+        piece_type: int
+            the piece type of bitboard.py (a class attribute, e.g. bitboard.PAWN)
+
         Methods
         -------
         get_colour(self) -> str
@@ -33,13 +41,14 @@ class Piece(ABC):
         get_class_name(self) -> str
             Returns the name of the class (for distinction of the inheriting pieces)
 
-        getImage(self) -> pygame.Surface
-            returns the image of the piece from the ressources
-
         move_piece(self, pos: Tuple[int, int]) -> bool
             Tries to move the piece to a given position.
             Returns True if the movement was successfull, else false
 
+        apply_move(self, pos: Tuple[int, int], record: Move_Record) -> None
+            Moves the piece to a given position without checking the move
+            and saves everything needed to take the move back in the record
+
         valid_take(self, pos: Tuple[int, int]) -> bool
             Returns if a piece on a given position can be taken or not
 
@@ -58,6 +67,11 @@ class Piece(ABC):
             Returns all the possible moves for a piece
             (implementation by all the inheriting pieces)
     '''
+    # no __dict__: millions of pieces can be created for analysis
+    __slots__ = ('colour', 'pos', 'board')
+    # the piece type of bitboard.py (PAWN, KNIGHT, ...), set by every inheriting piece
+    piece_type = -1
+
     def __init__(self, colour: str, pos: Tuple[int, int]) -> None:
         '''
             Parameters
@@ -70,6 +84,7 @@ class Piece(ABC):
         '''
         self.colour = colour
         self.pos = pos
+        self.board = None
 
     def get_colour(self) -> str:
         '''
@@ -115,21 +130,6 @@ class Piece(ABC):
         '''
         return self.__class__.__name__
 
-    def getImage(self) -> pygame.Surface:
-        '''
-            returns the image of the piece from the ressources
-
-            Returns
-            -------
-            pygame.Surface
-                the image of the piece
-        '''
-        rel_path = '\\sprites\\{}\\{}.png'.format(self.colour, self.get_class_name())
-        source_path = Path(__file__).resolve()
-        source_dir = source_path.parent
-        image = pygame.image.load(source_dir.__str__() + rel_path)
-        return pygame.transform.rotozoom(image, 0, 0.45)
-
     def move_piece(self, pos: Tuple[int, int]) -> bool:
         '''
             Tries to move the piece to a given position.
@@ -145,16 +145,30 @@ class Piece(ABC):
             bool
                 is the given position a valid move or not
         '''
-        new_pos = next((position for position in self.get_moves() if pos == position), None)
-        if new_pos is not None:
-            piece_on_new_pos = Piece_Handler.get_piece_on_board(pos)
-            if piece_on_new_pos is not None:
-                Piece_Handler.remove_piece(piece_on_new_pos)
-            self.set_pos(pos)
-            Piece_Handler.set_ghost_piece((-1, -1))
+        if pos in self.board.get_piece_moves(self):
+            self.board.make_move(self, pos)
             return True
         return False
 
+    def apply_move(self, pos: Tuple[int, int], record: 'Move_Record') -> None:
+        '''
+            Moves the piece to a given position without checking the move
+            and saves everything needed to take the move back in the record
+
+            Parameters
+            ----------
+            pos: Tuple[int, int]
+                the position the piece needs to be moved to
+
+            record: Move_Record
+                the record of the move
+        '''
+        piece_on_new_pos = self.board.get_piece_on_board(pos)
+        if piece_on_new_pos is not None:
+            self.board.take_piece(piece_on_new_pos, record)
+        self.board.relocate_piece(self, pos)
+        self.board.set_ghost_piece((-1, -1))
+
     def valid_take(self, pos: Tuple[int, int]) -> bool:
         '''
             Returns if a piece on a given position can be taken or not
@@ -169,7 +183,7 @@ class Piece(ABC):
             bool
                 can the piece be taken or not
         '''
-        piece_taken = Piece_Handler.get_piece_on_board(pos)
+        piece_taken = self.board.get_piece_on_board(pos)
         return piece_taken is not None and self.colour != piece_taken.colour
 
     def calculate_moves(self, xChange: int, yChange: int = 0) -> List[Tuple[int, int]]:
@@ -192,7 +206,7 @@ class Piece(ABC):
         moves = []
         i = xChange
         j = yChange
-        while Piece_Handler.free_pos((self.pos[0] + i, self.pos[1] + j)):
+        while self.board.free_pos((self.pos[0] + i, self.pos[1] + j)):
             moves.append((self.pos[0] + i, self.pos[1] + j))
             i += xChange
             j += yChange
@@ -214,7 +228,7 @@ class Piece(ABC):
             bool
                 if the position is already reserved by a piece of the same colour or not
         '''
-        return not Piece_Handler.free_pos(pos) and Piece_Handler.get_piece_on_board(pos).get_colour() == self.get_colour()
+        return not self.board.free_pos(pos) and self.board.get_piece_on_board(pos).get_colour() == self.get_colour()
 
     def filter_moves(self, moves: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
         '''
@@ -227,7 +241,7 @@ class Piece(ABC):
             List[Tuple[int, int]]
                 all the valid moves the piece
         '''
-        moves = Piece_Handler.filter_moves(moves)
+        moves = self.board.filter_moves(moves)
         for move in range(moves.__len__() - 1, -1, -1):
             currentMove = moves[move]
             if self.pos_reserved(currentMove):
@@ -271,14 +285,17 @@ class Pawn(Piece):
             Returns all the possible moves for a piece
             Overrides the method from the Piece-class
 
-        move_piece(self, pos: Tuple[int, int]) -> bool
-            Extends the move_piece method from the Piece-class,
+        apply_move(self, pos: Tuple[int, int], record: Move_Record) -> None
+            Extends the apply_move method from the Piece-class,
             takes into account the en passant move
 
         Parent
         ------
         Piece
     '''
+    __slots__ = ('has_moved',)
+    piece_type = bitboard.PAWN
+
     def __init__(self, colour: str, pos: Tuple[int, int]) -> None:
         Piece.__init__(self, colour, pos)
         self.has_moved = False
@@ -295,20 +312,20 @@ class Pawn(Piece):
         '''
         moves = []
         black_white = -1 if self.get_colour() == 'white' else 1
-        if Piece_Handler.get_piece_on_board((self.pos[0], self.pos[1] + black_white)) is None:
+        if self.board.get_piece_on_board((self.pos[0], self.pos[1] + black_white)) is None:
             moves.append((self.pos[0], self.pos[1] + black_white))
-        if not self.has_moved and Piece_Handler.get_piece_on_board((self.pos[0], self.pos[1] + 2 * black_white)) is None:
-            moves.append((self.pos[0], self.pos[1] + 2 * black_white))
-        if self.valid_take((self.pos[0] + 1, self.pos[1] + black_white)) or Piece_Handler.get_ghost_piece() == (self.pos[0] + 1, self.pos[1] + black_white):
+            if not self.has_moved and self.board.get_piece_on_board((self.pos[0], self.pos[1] + 2 * black_white)) is None:
+                moves.append((self.pos[0], self.pos[1] + 2 * black_white))
+        if self.valid_take((self.pos[0] + 1, self.pos[1] + black_white)) or self.board.get_ghost_piece() == (self.pos[0] + 1, self.pos[1] + black_white):
             moves.append((self.pos[0] + 1, self.pos[1] + black_white))
-        if self.valid_take((self.pos[0] - 1, self.pos[1] + black_white)) or Piece_Handler.get_ghost_piece() == (self.pos[0] - 1, self.pos[1] + black_white):
+        if self.valid_take((self.pos[0] - 1, self.pos[1] + black_white)) or self.board.get_ghost_piece() == (self.pos[0] - 1, self.pos[1] + black_white):
             moves.append((self.pos[0] - 1, self.pos[1] + black_white))
-        moves = Piece_Handler.filter_moves(moves)
+        moves = self.board.filter_moves(moves)
         return moves
 
-    def move_piece(self, pos: Tuple[int, int]) -> bool:
+    def apply_move(self, pos: Tuple[int, int], record: 'Move_Record') -> None:
         '''
-            Extends the move_piece method from the Piece-class,
+            Extends the apply_move method from the Piece-class,
             takes into account the en passant move
 
             Parameters
@@ -316,21 +333,17 @@ class Pawn(Piece):
             pos: Tuple[int, int]
                 the position the piece needs to be moved to
 
-            Returns
-            -------
-            bool
-                is the given position a valid move or not
+            record: Move_Record
+                the record of the move
         '''
         old_pos = self.pos
-        ghost_piece = Piece_Handler.get_ghost_piece()
-        valid_move = super().move_piece(pos)
+        super().apply_move(pos, record)
         black_white = 1 if self.get_colour() == 'white' else -1
-        if not self.has_moved and valid_move and abs(old_pos[1] - self.pos[1]) == 2:
-            Piece_Handler.set_ghost_piece((self.pos[0], self.pos[1] + black_white))
+        if abs(old_pos[1] - self.pos[1]) == 2:
+            self.board.set_ghost_piece((self.pos[0], self.pos[1] + black_white))
         self.has_moved = True
-        if self.pos == ghost_piece:
-            Piece_Handler.remove_piece(Piece_Handler.get_piece_on_board((self.pos[0], self.pos[1] + black_white)))
-        return valid_move
+        if self.pos == record.ghost:
+            self.board.take_piece(self.board.get_piece_on_board((self.pos[0], self.pos[1] + black_white)), record)
 
 
 class Knight(Piece):
@@ -364,6 +377,9 @@ class Knight(Piece):
         ------
         Piece
     '''
+    __slots__ = ()
+    piece_type = bitboard.KNIGHT
+
     def get_moves(self) -> List[Tuple[int, int]]:
         '''
             Returns all the possible moves for a piece
@@ -434,6 +450,9 @@ class Bishop(Piece):
         ------
         Piece
     '''
+    __slots__ = ()
+    piece_type = bitboard.BISHOP
+
     def get_moves(self) -> List[Tuple[int, int]]:
         '''
             Returns all the possible moves for a piece
@@ -474,6 +493,10 @@ class Rook(Piece):
             Returns all the possible moves for a piece
             Overrides the method from the Piece-class
 
+        apply_move(self, pos: Tuple[int, int], record: Move_Record) -> None
+            Extends the apply_move method from the Piece-class,
+            the rook can't castle anymore after it moved
+
         get_has_moved(self) -> bool
             Returns if the rook has moved or not
 
@@ -481,6 +504,9 @@ class Rook(Piece):
         ------
         Piece
     '''
+    __slots__ = ('has_moved',)
+    piece_type = bitboard.ROOK
+
     def __init__(self, colour: str, pos: Tuple[int, int]) -> None:
         Piece.__init__(self, colour, pos)
         self.has_moved = False
@@ -501,23 +527,21 @@ class Rook(Piece):
         moves.extend(self.calculate_moves(0, -1))
         return moves
 
-    def move_piece(self, pos: Tuple[int, int]) -> bool:
+    def apply_move(self, pos: Tuple[int, int], record: 'Move_Record') -> None:
         '''
-            Extends the move_piece method from the Piece-class,
-            takes into account castling
+            Extends the apply_move method from the Piece-class,
+            the rook can't castle anymore after it moved
 
             Parameters
             ----------
             pos: Tuple[int, int]
                 the position the piece needs to be moved to
 
-            Returns
-            -------
-            bool
-                is the given position a valid move or not
+            record: Move_Record
+                the record of the move
         '''
+        super().apply_move(pos, record)
         self.has_moved = True
-        return super().move_piece(pos)
 
     def get_has_moved(self) -> bool:
         '''
@@ -554,10 +578,20 @@ class King(Piece):
             Returns all the possible moves for a piece
             Overrides the method from the Piece-class
 
+        can_castle(self, rook_x: int) -> bool
+            Checks if the king can castle with the rook in a given corner
+
+        apply_move(self, pos: Tuple[int, int], record: Move_Record) -> None
+            Extends the apply_move method from the Piece-class,
+            takes into account castling
+
         Parent
         ------
         Piece
     '''
+    __slots__ = ('has_moved',)
+    piece_type = bitboard.KING
+
     def __init__(self, colour: str, pos: Tuple[int, int]) -> None:
         Piece.__init__(self, colour, pos)
         self.has_moved = False
@@ -578,39 +612,58 @@ class King(Piece):
                 if not (i == 0 and j == 0):
                     moves.append((self.pos[0] + i, self.pos[1] + j))
         if not self.has_moved:
-            rook = Piece_Handler.get_piece_on_board((0, self.pos[1]))
-            rook.__class__ = Rook
-            if rook is not None and not rook.get_has_moved():
+            if self.can_castle(0):
                 moves.append((self.pos[0] - 2, self.pos[1]))
-            rook = Piece_Handler.get_piece_on_board((7, self.pos[1]))
-            rook.__class__ = Rook
-            if rook is not None and not rook.get_has_moved():
+            if self.can_castle(7):
                 moves.append((self.pos[0] + 2, self.pos[1]))
         return self.filter_moves(moves)
 
-    def move_piece(self, pos: Tuple[int, int]) -> bool:
+    def can_castle(self, rook_x: int) -> bool:
         '''
-            Extends the move_piece method from the Piece-class,
-            takes into account castling
+            Checks if the king can castle with the rook in a given corner.
+            The rook needs to be unmoved and all squares between
+            the king and the rook need to be free
 
             Parameters
             ----------
-            pos: Tuple[int, int]
-                the position the piece needs to be moved to
+            rook_x: int
+                the x-coordinate of the corner (0 or 7)
 
             Returns
             -------
             bool
-                is the given position a valid move or not
+                if the king can castle with that rook or not
+        '''
+        rook = self.board.get_piece_on_board((rook_x, self.pos[1]))
+        if rook is None or rook.get_class_name() != "Rook" or rook.get_colour() != self.get_colour() or rook.get_has_moved():
+            return False
+        step = 1 if rook_x > self.pos[0] else -1
+        return all(self.board.get_piece_on_board((x, self.pos[1])) is None for x in range(self.pos[0] + step, rook_x, step))
+
+    def apply_move(self, pos: Tuple[int, int], record: 'Move_Record') -> None:
+        '''
+            Extends the apply_move method from the Piece-class,
+            takes into account castling
+
+            Parameters
+            ----------
+            pos: Tuple[int, int]
+                the position the piece needs to be moved to
+
+            record: Move_Record
+                the record of the move
         '''
         old_pos = self.pos
-        successfull = super().move_piece(pos)
+        super().apply_move(pos, record)
         if self.pos[0] - old_pos[0] == 2:
-            Piece_Handler.get_piece_on_board((self.pos[0] + 1, self.pos[1])).set_pos((self.pos[0] - 1, self.pos[1]))
+            record.rook = self.board.get_piece_on_board((self.pos[0] + 1, self.pos[1]))
+            record.rook_pos = record.rook.get_pos()
+            self.board.relocate_piece(record.rook, (self.pos[0] - 1, self.pos[1]))
         elif self.pos[0] - old_pos[0] == -2:
-            Piece_Handler.get_piece_on_board((self.pos[0] - 2, self.pos[1])).set_pos((self.pos[0] + 1, self.pos[1]))
+            record.rook = self.board.get_piece_on_board((self.pos[0] - 2, self.pos[1]))
+            record.rook_pos = record.rook.get_pos()
+            self.board.relocate_piece(record.rook, (self.pos[0] + 1, self.pos[1]))
         self.has_moved = True
-        return successfull
 
 
 class Queen(Piece):
@@ -637,6 +690,9 @@ class Queen(Piece):
         ------
         Piece
     '''
+    __slots__ = ()
+    piece_type = bitboard.QUEEN
+
     def get_moves(self) -> List[Tuple[int, int]]:
         '''
             Returns all the possible moves for a piece
@@ -652,9 +708,211 @@ class Queen(Piece):
         return moves
 
 
-class Piece_Handler():
+# indexed by the piece types of bitboard.py
+PIECE_CLASSES = (Pawn, Knight, Bishop, Rook, Queen, King)
+
+
+class Move_Record():
     '''
-        A class which handles all the pieces of the game
+        Everything that is needed to take back a move
+
+        ...
+
+        Attributes
+        ----------
+        piece: Piece
+            the moved piece
+
+        pos: Tuple[int, int]
+            the position the piece moved from
+
+        has_moved: bool
+            the has_moved-flag of the piece before the move
+            (None for pieces without the flag)
+
+        ghost: Tuple[int, int]
+            the ghost-position before the move
+
+        captured: Piece
+            the piece that was taken (None if no piece was taken)
+
+        captured_index: int
+            the index of the taken piece in Board.pieces
+
+        rook: Piece
+            the rook that was moved when castling (None if the move was no castling)
+
+        rook_pos: Tuple[int, int]
+            the position of the rook before castling
+
+        promoted: Piece
+            the piece the pawn was promoted to (None if there was no promotion)
+
+        promoted_index: int
+            the index of the pawn in Board.pieces before the promotion
+
+        castling: int
+            the castling rights before the move
+
+        hash: int
+            the hash of the position before the move
+
+        halfmove: int
+            the halfmove clock before the move
+    '''
+    __slots__ = ('piece', 'pos', 'has_moved', 'ghost', 'captured', 'captured_index',
+                 'rook', 'rook_pos', 'promoted', 'promoted_index', 'castling', 'hash', 'halfmove')
+
+    def __init__(self, piece: Piece, ghost: Tuple[int, int], castling: int, hash: int, halfmove: int) -> None:
+        '''
+            Parameters
+            ----------
+            piece: Piece
+                the moved piece
+
+            ghost: Tuple[int, int]
+                the ghost-position before the move
+
+            castling: int
+                the castling rights before the move
+
+            hash: int
+                the hash of the position before the move
+
+            halfmove: int
+                the halfmove clock before the move
+        '''
+        self.piece = piece
+        self.pos = piece.get_pos()
+        self.has_moved = getattr(piece, 'has_moved', None)
+        self.ghost = ghost
+        self.castling = castling
+        self.hash = hash
+        self.halfmove = halfmove
+        self.captured = None
+        self.captured_index = -1
+        self.rook = None
+        self.rook_pos = None
+        self.promoted = None
+        self.promoted_index = -1
+
+
+class Move_Cache():
+    '''
+        A least-recently-used cache of the moves of pieces, keyed by
+        (hash of the position, square of the piece)
+
+        The moves of a piece only depend on the position, so the hash
+        identifies them as long as the board keeps it up to date.
+        The cached lists are shared and must not be changed.
+
+        ...
+
+        Attributes
+        ----------
+        size: int
+            the largest number of entries (0 turns the cache off)
+
+        entries: OrderedDict
+            the moves of every key, the least recently used first
+
+        hits: int
+            the number of lookups that found their moves
+
+        misses: int
+            the number of lookups that didn't
+
+        Methods
+        -------
+        get(self, key: Tuple[int, int]) -> List[Tuple[int, int]]
+            Returns the cached moves of a key
+
+        put(self, key: Tuple[int, int], moves: List[Tuple[int, int]]) -> None
+            Adds the moves of a key
+
+        clear(self) -> None
+            Removes all the entries
+
+        hit_rate(self) -> float
+            Returns the share of the lookups that were hits
+    '''
+    __slots__ = ('size', 'entries', 'hits', 'misses')
+
+    def __init__(self, size: int = 1024) -> None:
+        '''
+            Parameters
+            ----------
+            size: int
+                the largest number of entries (0 turns the cache off)
+        '''
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[int, int]) -> List[Tuple[int, int]]:
+        '''
+            Returns the cached moves of a key and marks them as recently used
+
+            Parameters
+            ----------
+            key: Tuple[int, int]
+                (hash of the position, square of the piece)
+
+            Returns
+            -------
+            List[Tuple[int, int]]
+                the moves (None if they aren't cached)
+        '''
+        moves = self.entries.get(key)
+        if moves is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return moves
+
+    def put(self, key: Tuple[int, int], moves: List[Tuple[int, int]]) -> None:
+        '''
+            Adds the moves of a key, the least recently used entry is removed if the cache is full
+
+            Parameters
+            ----------
+            key: Tuple[int, int]
+                (hash of the position, square of the piece)
+
+            moves: List[Tuple[int, int]]
+                the moves
+        '''
+        if self.size <= 0:
+            return
+        self.entries[key] = moves
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        '''
+            Removes all the entries (the counters are kept)
+        '''
+        self.entries.clear()
+
+    def hit_rate(self) -> float:
+        '''
+            Returns the share of the lookups that were hits
+
+            Returns
+            -------
+            float
+                hits / lookups (0 without lookups)
+        '''
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class Board():
+    '''
+        A board with its own pieces, ghost-position and colour to move,
+        any number of boards (and games) can be used at the same time
 
         ...
 
@@ -662,28 +920,78 @@ class Piece_Handler():
         ----------
         pieces: List[Piece]
             all the pieces
+        squares: List[Piece]
+            a 64-entry index of the board (None for empty squares),
+            kept in sync with pieces for constant-time lookups
         ghost: Tuple[int, int]
             the ghost-position plays an important role for en passant,
             as this is where the position is saved after a pawn moved 2 squares forward
+        history: List[Move_Record]
+            the records of all the moves that can be taken back
+        turn: str
+            the colour to move
+        castling: int
+            the castling rights (bitboard.WHITE_KINGSIDE | bitboard.WHITE_QUEENSIDE | ...)
+        hash: int
+            the Zobrist hash of the position, updated with every change of the board
+        halfmove: int
+            the plies since the last capture or pawn move
+        fullmove: int
+            the number of the move (starts at 1, increases after every move of black)
+        move_cache: Move_Cache
+            the moves of the pieces in recent positions, shared by everything that asks for moves
 
         Methods
         -------
-        init_pieces() -> None
+        init_pieces(self) -> None
             Initializes all the pieces
 
-        get_pieces() -> List[Piece]
+        get_pieces(self) -> List[Piece]
             Returns the piece on a given position
 
-        get_piece_on_board(pos: Tuple[int, int]) -> Piece
+        square_index(pos: Tuple[int, int]) -> int
+            Returns the index of a position in the square index
+
+        add_piece(self, piece: Piece, index: int = -1) -> None
+            Adds a piece to the board
+
+        get_piece_on_board(self, pos: Tuple[int, int]) -> Piece
             Removes a piece from the board
 
-        remove_piece(piece: Piece) -> None
+        get_piece_moves(self, piece: Piece) -> List[Tuple[int, int]]
+            Returns the moves of a piece, from the move cache if the position was seen before
+
+        relocate_piece(self, piece: Piece, pos: Tuple[int, int]) -> None
+            Moves a piece to a new position and updates the square index
+
+        remove_piece(self, piece: Piece) -> None
             Removes a piece from the board
 
-        set_ghost_piece(pos: Tuple[int, int]) -> None
+        take_piece(self, piece: Piece, record: Move_Record) -> None
+            Removes a taken piece from the board and saves it in the record of the move
+
+        make_move(self, piece: Piece, pos: Tuple[int, int], promotion: str = "") -> Move_Record
+            Moves a piece without checking the move and saves how to take it back
+
+        unmake_move(self) -> None
+            Takes back the last move
+
+        castling_rights(self) -> int
+            Calculates the castling rights from the kings and rooks
+
+        is_game_over(self) -> bool
+            Checks if a king has been taken
+
+        generate_moves(self, colour: str = None) -> List[Tuple[Tuple[int, int], Tuple[int, int], str]]
+            Returns all the moves of one colour, with one move per promotion piece
+
+        compute_hash(self) -> int
+            Calculates the hash of the position from scratch
+
+        set_ghost_piece(self, pos: Tuple[int, int]) -> None
             Sets the ghost-position
 
-        get_ghost_piece() -> Tuple[int, int]
+        get_ghost_piece(self) -> Tuple[int, int]
             Returns the ghost-position
 
         filter_moves(moves: List[Tuple[int, int]]) -> List[Tuple[int, int]]
@@ -692,44 +1000,61 @@ class Piece_Handler():
         pos_on_board(pos: Tuple[int, int]) -> bool
             Checks if a position is on the board
 
-        free_pos(pos: Tuple[int, int]) -> bool
+        square_name(pos: Tuple[int, int]) -> str
+            Returns the name of a position (e.g. e4)
+
+        parse_square(name: str) -> Tuple[int, int]
+            Returns the position of a square name (e.g. e4)
+
+        free_pos(self, pos: Tuple[int, int]) -> bool
             Checks if a position is free or not
 
-        promote_piece(piece: Piece, promotion: str) -> None
+        promote_piece(self, piece: Piece, promotion: str) -> None
             Promotes a pawn to a given piece
-    '''
 
-    pieces = []
-    ghost = (-1, -1)
+        set_pieces(self, pieces: List[Piece], ghost: Tuple[int, int] = (-1, -1), turn: str = "white") -> None
+            Replaces all the pieces on the board
 
-    @staticmethod
-    def init_pieces() -> None:
+        get_position(self, turn: str = None) -> bitboard.Bitboard_Position
+            Returns the current position as bitboards
+
+        set_position(self, position: bitboard.Bitboard_Position) -> None
+            Replaces all the pieces with the ones of a bitboard position
+
+        has_moved_from_rights(colour: int, piece_type: int, sq: int, castling: int) -> bool
+            Returns the has_moved-flag of a king or rook from the castling rights
+
+        load_fen(self, fen: str) -> None
+            Replaces all the pieces with the ones of a FEN string
+
+        to_fen(self) -> str
+            Returns the position as a FEN string
+    '''
+    def __init__(self, cache_size: int = 1024) -> None:
+        '''
+            Parameters
+            ----------
+            cache_size: int
+                the number of move lists the move cache keeps (0 turns it off)
+        '''
+        self.pieces = []
+        self.squares = [None] * 64
+        self.ghost = (-1, -1)
+        self.history = []
+        self.turn = "white"
+        self.castling = 0
+        self.hash = 0
+        self.halfmove = 0
+        self.fullmove = 1
+        self.move_cache = Move_Cache(cache_size)
+
+    def init_pieces(self) -> None:
         '''
             Initializes all the pieces
         '''
-        Piece_Handler.pieces = []
-        for i in range(8):
-            Piece_Handler.pieces.append(Pawn("white", (i, 6)))
-            Piece_Handler.pieces.append(Pawn("black", (i, 1)))
-        Piece_Handler.pieces.append(Rook("black", (0, 0)))
-        Piece_Handler.pieces.append(Rook("black", (7, 0)))
-        Piece_Handler.pieces.append(Rook("white", (0, 7)))
-        Piece_Handler.pieces.append(Rook("white", (7, 7)))
-        Piece_Handler.pieces.append(Knight("black", (1, 0)))
-        Piece_Handler.pieces.append(Knight("black", (6, 0)))
-        Piece_Handler.pieces.append(Knight("white", (1, 7)))
-        Piece_Handler.pieces.append(Knight("white", (6, 7)))
-        Piece_Handler.pieces.append(Bishop("black", (2, 0)))
-        Piece_Handler.pieces.append(Bishop("black", (5, 0)))
-        Piece_Handler.pieces.append(Bishop("white", (2, 7)))
-        Piece_Handler.pieces.append(Bishop("white", (5, 7)))
-        Piece_Handler.pieces.append(King("black", (4, 0)))
-        Piece_Handler.pieces.append(King("white", (4, 7)))
-        Piece_Handler.pieces.append(Queen("black", (3, 0)))
-        Piece_Handler.pieces.append(Queen("white", (3, 7)))
+        self.load_fen(bitboard.START_FEN)
 
-    @staticmethod
-    def get_pieces() -> List[Piece]:
+    def get_pieces(self) -> List[Piece]:
         '''
             Returns all the pieces
 
@@ -738,10 +1063,47 @@ class Piece_Handler():
             List[Piece]
                 all the pieces
         '''
-        return Piece_Handler.pieces
+        return self.pieces
 
     @staticmethod
-    def get_piece_on_board(pos: Tuple[int, int]) -> Piece:
+    def square_index(pos: Tuple[int, int]) -> int:
+        '''
+            Returns the index of a position in the square index
+
+            Parameters
+            ----------
+            pos: Tuple[int, int]
+                the position (needs to be on the board)
+
+            Returns
+            -------
+            int
+                the index of the position
+        '''
+        return pos[1] * 8 + pos[0]
+
+    def add_piece(self, piece: Piece, index: int = -1) -> None:
+        '''
+            Adds a piece to the board
+
+            Parameters
+            ----------
+            piece: Piece
+                the piece that needs to be added
+
+            index: int
+                where the piece is inserted into the pieces (appended if negative)
+        '''
+        if index < 0:
+            self.pieces.append(piece)
+        else:
+            self.pieces.insert(index, piece)
+        piece.board = self
+        sq = self.square_index(piece.get_pos())
+        self.squares[sq] = piece
+        self.hash ^= zobrist.PIECES[(piece.get_colour(), piece.get_class_name())][sq]
+
+    def get_piece_on_board(self, pos: Tuple[int, int]) -> Piece:
         '''
             Returns the piece on a given position
 
@@ -757,10 +1119,56 @@ class Piece_Handler():
             None
                 if no piece is on the given position
         '''
-        return next((piece for piece in Piece_Handler.get_pieces() if piece.get_pos() == pos), None)
+        x, y = pos
+        if 0 <= x < 8 and 0 <= y < 8:
+            return self.squares[y * 8 + x]
+        return None
 
-    @staticmethod
-    def remove_piece(piece: Piece) -> None:
+    def get_piece_moves(self, piece: Piece) -> List[Tuple[int, int]]:
+        '''
+            Returns the moves of a piece on the board, they are only generated
+            if the piece wasn't asked for in the same position before
+
+            Parameters
+            ----------
+            piece: Piece
+                the piece
+
+            Returns
+            -------
+            List[Tuple[int, int]]
+                all the valid moves (shared with the cache, must not be changed)
+        '''
+        pos = piece.pos
+        key = (self.hash, pos[1] * 8 + pos[0])
+        moves = self.move_cache.get(key)
+        if moves is None:
+            moves = piece.get_moves()
+            self.move_cache.put(key, moves)
+        return moves
+
+    def relocate_piece(self, piece: Piece, pos: Tuple[int, int]) -> None:
+        '''
+            Moves a piece to a new position and updates the square index
+
+            Parameters
+            ----------
+            piece: Piece
+                the piece that needs to be moved
+
+            pos: Tuple[int, int]
+                the new position of the piece
+        '''
+        old_index = self.square_index(piece.get_pos())
+        if self.squares[old_index] is piece:
+            self.squares[old_index] = None
+        piece.set_pos(pos)
+        new_index = self.square_index(pos)
+        self.squares[new_index] = piece
+        keys = zobrist.PIECES[(piece.get_colour(), piece.get_class_name())]
+        self.hash ^= keys[old_index] ^ keys[new_index]
+
+    def remove_piece(self, piece: Piece) -> None:
         '''
             Removes a piece from the board
 
@@ -769,10 +1177,176 @@ class Piece_Handler():
             piece: Piece
                 the piece that needs to be removed
         '''
-        Piece_Handler.pieces.remove(piece)
+        self.pieces.remove(piece)
+        index = self.square_index(piece.get_pos())
+        if self.squares[index] is piece:
+            self.squares[index] = None
+        self.hash ^= zobrist.PIECES[(piece.get_colour(), piece.get_class_name())][index]
 
-    @staticmethod
-    def set_ghost_piece(pos: Tuple[int, int]) -> None:
+    def take_piece(self, piece: Piece, record: Move_Record) -> None:
+        '''
+            Removes a taken piece from the board and saves it in the record of the move
+
+            Parameters
+            ----------
+            piece: Piece
+                the piece that was taken
+
+            record: Move_Record
+                the record of the move
+        '''
+        record.captured = piece
+        record.captured_index = self.pieces.index(piece)
+        self.remove_piece(piece)
+
+    def make_move(self, piece: Piece, pos: Tuple[int, int], promotion: str = "") -> Move_Record:
+        '''
+            Moves a piece without checking the move and saves how to take it back
+            (the move needs to be one of the moves of piece.get_moves())
+
+            Parameters
+            ----------
+            piece: Piece
+                the piece that is moved
+
+            pos: Tuple[int, int]
+                the position the piece is moved to
+
+            promotion: str
+                the name of the piece a pawn is promoted to (empty for no promotion)
+
+            Returns
+            -------
+            Move_Record
+                the record of the move
+        '''
+        record = Move_Record(piece, self.ghost, self.castling, self.hash, self.halfmove)
+        self.history.append(record)
+        piece.apply_move(pos, record)
+        if promotion:
+            self.promote_piece(piece, promotion)
+        if record.captured is not None or piece.get_class_name() == "Pawn":
+            self.halfmove = 0
+        else:
+            self.halfmove += 1
+        if self.turn == "black":
+            self.fullmove += 1
+        castling = self.castling_rights()
+        if castling != record.castling:
+            self.hash ^= zobrist.CASTLING[record.castling] ^ zobrist.CASTLING[castling]
+            self.castling = castling
+        self.turn = "black" if self.turn == "white" else "white"
+        self.hash ^= zobrist.SIDE
+        return record
+
+    def unmake_move(self) -> None:
+        '''
+            Takes back the last move
+        '''
+        record = self.history.pop()
+        piece = record.piece
+        if record.promoted is not None:
+            self.remove_piece(record.promoted)
+            self.add_piece(piece, record.promoted_index)
+        if record.rook is not None:
+            self.relocate_piece(record.rook, record.rook_pos)
+        self.relocate_piece(piece, record.pos)
+        if record.has_moved is not None:
+            piece.has_moved = record.has_moved
+        if record.captured is not None:
+            self.add_piece(record.captured, record.captured_index)
+        self.ghost = record.ghost
+        self.castling = record.castling
+        self.turn = "black" if self.turn == "white" else "white"
+        self.hash = record.hash
+        self.halfmove = record.halfmove
+        if self.turn == "black":
+            self.fullmove -= 1
+
+    def castling_rights(self) -> int:
+        '''
+            Calculates the castling rights from the kings and rooks:
+            a king that hasn't moved can castle with every rook
+            of its colour that hasn't moved
+
+            Returns
+            -------
+            int
+                the castling rights (bitboard.WHITE_KINGSIDE | bitboard.WHITE_QUEENSIDE | ...)
+        '''
+        rights = 0
+        for colour, king_sq in enumerate(bitboard.KING_HOME):
+            king = self.squares[king_sq]
+            if king is None or king.get_class_name() != "King" or king.has_moved:
+                continue
+            for right, rook_sq, _, _, _ in bitboard.CASTLING[colour]:
+                rook = self.squares[rook_sq]
+                if rook is not None and rook.get_class_name() == "Rook" and rook.get_colour() == king.get_colour() and not rook.has_moved:
+                    rights |= right
+        return rights
+
+    def is_game_over(self) -> bool:
+        '''
+            Checks if a king has been taken
+
+            Returns
+            -------
+            bool
+                if the game is over or not
+        '''
+        return sum(1 for piece in self.pieces if piece.get_class_name() == "King") < 2
+
+    def generate_moves(self, colour: str = None) -> List[Tuple[Tuple[int, int], Tuple[int, int], str]]:
+        '''
+            Returns all the moves of one colour, with one move per promotion piece
+
+            Parameters
+            ----------
+            colour: str
+                the colour to move (the turn of the board if None)
+
+            Returns
+            -------
+            List[Tuple[Tuple[int, int], Tuple[int, int], str]]
+                the moves as (from, to, promotion), promotion is empty if the move is no promotion
+        '''
+        if self.is_game_over():
+            return []
+        colour = colour or self.turn
+        moves = []
+        for piece in self.pieces:
+            if piece.get_colour() != colour:
+                continue
+            from_pos = piece.get_pos()
+            promoting = piece.get_class_name() == "Pawn"
+            # the search visits almost every position once, so the move cache would only cost time here
+            for to_pos in piece.get_moves():
+                if promoting and (to_pos[1] == 0 or to_pos[1] == 7):
+                    moves.extend((from_pos, to_pos, promotion) for promotion in ("queen", "knight", "bishop", "rook"))
+                else:
+                    moves.append((from_pos, to_pos, ""))
+        return moves
+
+    def compute_hash(self) -> int:
+        '''
+            Calculates the hash of the position from scratch
+            (the hash of the board is kept up to date without this)
+
+            Returns
+            -------
+            int
+                the 64-bit hash
+        '''
+        key = zobrist.CASTLING[self.castling_rights()]
+        for piece in self.pieces:
+            key ^= zobrist.PIECES[(piece.get_colour(), piece.get_class_name())][self.square_index(piece.get_pos())]
+        if self.pos_on_board(self.ghost):
+            key ^= zobrist.GHOST[self.square_index(self.ghost)]
+        if self.turn == "black":
+            key ^= zobrist.SIDE
+        return key
+
+    def set_ghost_piece(self, pos: Tuple[int, int]) -> None:
         '''
             Sets the ghost-position (important for en passant)
 
@@ -781,10 +1355,13 @@ class Piece_Handler():
             pos: Tuple[int, int]
                 the new ghost-position
         '''
-        Piece_Handler.ghost = pos
+        if self.pos_on_board(self.ghost):
+            self.hash ^= zobrist.GHOST[self.square_index(self.ghost)]
+        if self.pos_on_board(pos):
+            self.hash ^= zobrist.GHOST[self.square_index(pos)]
+        self.ghost = pos
 
-    @staticmethod
-    def get_ghost_piece() -> Tuple[int, int]:
+    def get_ghost_piece(self) -> Tuple[int, int]:
         '''
             Returns the ghost-position (important for en passant)
 
@@ -793,7 +1370,7 @@ class Piece_Handler():
             Tuple[int, int]
                 the ghost-position
         '''
-        return Piece_Handler.ghost
+        return self.ghost
 
     @staticmethod
     def filter_moves(moves: List[Tuple[int, int]]) -> List[Tuple[int]]:
@@ -811,7 +1388,7 @@ class Piece_Handler():
                 all valid moves in the list
         '''
         for move in range(moves.__len__() - 1, -1, -1):
-            if not Piece_Handler.pos_on_board(moves[move]):
+            if not Board.pos_on_board(moves[move]):
                 moves.remove(moves[move])
         return moves
 
@@ -833,7 +1410,40 @@ class Piece_Handler():
         return pos[0] >= 0 and pos[0] < 8 and pos[1] >= 0 and pos[1] < 8
 
     @staticmethod
-    def free_pos(pos: Tuple[int, int]) -> bool:
+    def square_name(pos: Tuple[int, int]) -> str:
+        '''
+            Returns the name of a position (e.g. (4, 4) -> e4)
+
+            Parameters
+            ----------
+            pos: Tuple[int, int]
+                the position
+
+            Returns
+            -------
+            str
+                the name of the square
+        '''
+        return chr(97 + pos[0]) + str(8 - pos[1])
+
+    @staticmethod
+    def parse_square(name: str) -> Tuple[int, int]:
+        '''
+            Returns the position of a square name (e.g. e4 -> (4, 4))
+
+            Parameters
+            ----------
+            name: str
+                the name of the square
+
+            Returns
+            -------
+            Tuple[int, int]
+                the position
+        '''
+        return (ord(name[0]) - 97, 8 - int(name[1]))
+
+    def free_pos(self, pos: Tuple[int, int]) -> bool:
         '''
             Checks if a position is free or not
 
@@ -847,10 +1457,9 @@ class Piece_Handler():
             bool
                 a boolean if the position is free or not
         '''
-        return Piece_Handler.pos_on_board(pos) and Piece_Handler.get_piece_on_board(pos) is None
+        return self.pos_on_board(pos) and self.get_piece_on_board(pos) is None
 
-    @staticmethod
-    def promote_piece(piece: Piece, promotion: str) -> None:
+    def promote_piece(self, piece: Piece, promotion: str) -> None:
         '''
             Promotes a pawn to a given piece
 
@@ -862,7 +1471,9 @@ class Piece_Handler():
             promotion: str
                 the name of the new piece
         '''
-        Piece_Handler.pieces.remove(piece)
+        index = self.pieces.index(piece)
+        self.remove_piece(piece)
+        pawn = piece
         match promotion:
             case "queen":
                 piece = Queen(piece.get_colour(), piece.get_pos())
@@ -872,4 +1483,164 @@ class Piece_Handler():
                 piece = Bishop(piece.get_colour(), piece.get_pos())
             case "rook":
                 piece = Rook(piece.get_colour(), piece.get_pos())
-        Piece_Handler.pieces.append(piece)
+        self.add_piece(piece)
+        record = self.history[-1] if self.history else None
+        if record is not None and record.piece is pawn and record.promoted is None:
+            record.promoted = piece
+            record.promoted_index = index
+
+    def set_pieces(self, pieces: List[Piece], ghost: Tuple[int, int] = (-1, -1), turn: str = "white") -> None:
+        '''
+            Replaces all the pieces on the board
+
+            Parameters
+            ----------
+            pieces: List[Piece]
+                the new pieces
+
+            ghost: Tuple[int, int]
+                the ghost-position
+
+            turn: str
+                the colour to move
+        '''
+        self.pieces = []
+        self.squares = [None] * 64
+        self.history = []
+        # the has_moved-flags of the new pieces aren't part of the hash
+        self.move_cache.clear()
+        self.halfmove = 0
+        self.fullmove = 1
+        # add_piece hashes the pieces, the rest of the hash is added afterwards
+        self.hash = 0
+        for piece in pieces:
+            self.add_piece(piece)
+        self.ghost = ghost
+        self.turn = turn
+        self.castling = self.castling_rights()
+        self.hash ^= zobrist.CASTLING[self.castling]
+        if self.pos_on_board(ghost):
+            self.hash ^= zobrist.GHOST[self.square_index(ghost)]
+        if turn == "black":
+            self.hash ^= zobrist.SIDE
+
+    def get_position(self, turn: str = None) -> bitboard.Bitboard_Position:
+        '''
+            Returns the current position as bitboards (the fast path for bulk analysis)
+
+            Parameters
+            ----------
+            turn: str
+                the colour to move (the turn of the board if None)
+
+            Returns
+            -------
+            bitboard.Bitboard_Position
+                the position
+        '''
+        position = bitboard.Bitboard_Position()
+        for piece in self.pieces:
+            colour = bitboard.COLOURS.index(piece.get_colour())
+            piece_type = piece.piece_type
+            sq = self.square_index(piece.get_pos())
+            position.add_piece(colour, piece_type, sq)
+            if piece_type == bitboard.PAWN and not piece.has_moved:
+                position.unmoved_pawns |= 1 << sq
+        position.castling = self.castling_rights()
+        ghost = self.get_ghost_piece()
+        position.ghost = self.square_index(ghost) if self.pos_on_board(ghost) else -1
+        position.turn = bitboard.COLOURS.index(turn or self.turn)
+        return position
+
+    def set_position(self, position: bitboard.Bitboard_Position) -> None:
+        '''
+            Replaces all the pieces with the ones of a bitboard position
+
+            Parameters
+            ----------
+            position: bitboard.Bitboard_Position
+                the position
+        '''
+        pieces = []
+        for index, bb in enumerate(position.boards):
+            colour, piece_type = divmod(index, 6)
+            for sq in bitboard.squares_of(bb):
+                piece = PIECE_CLASSES[piece_type](bitboard.COLOURS[colour], (sq % 8, sq // 8))
+                if piece_type == bitboard.PAWN:
+                    piece.has_moved = not position.unmoved_pawns >> sq & 1
+                elif piece_type == bitboard.KING or piece_type == bitboard.ROOK:
+                    piece.has_moved = self.has_moved_from_rights(colour, piece_type, sq, position.castling)
+                pieces.append(piece)
+        ghost = position.ghost
+        self.set_pieces(pieces, (ghost % 8, ghost // 8) if ghost >= 0 else (-1, -1), bitboard.COLOURS[position.turn])
+
+    @staticmethod
+    def has_moved_from_rights(colour: int, piece_type: int, sq: int, castling: int) -> bool:
+        '''
+            Returns the has_moved-flag of a king or rook from the castling rights:
+            a king has moved if its colour can't castle anymore, a rook
+            has moved if it can't castle from its square
+
+            Parameters
+            ----------
+            colour: int
+                bitboard.WHITE or bitboard.BLACK
+
+            piece_type: int
+                bitboard.KING or bitboard.ROOK
+
+            sq: int
+                the square of the piece
+
+            castling: int
+                the castling rights
+
+            Returns
+            -------
+            bool
+                the has_moved-flag
+        '''
+        if piece_type == bitboard.KING:
+            return not any(castling & right for right, _, _, _, _ in bitboard.CASTLING[colour])
+        return not any(castling & right for right, rook_sq, _, _, _ in bitboard.CASTLING[colour] if rook_sq == sq)
+
+    def load_fen(self, fen: str) -> None:
+        '''
+            Replaces all the pieces with the ones of a FEN string
+            (e.g. rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1),
+            the move counters are optional
+
+            Parameters
+            ----------
+            fen: str
+                the position in Forsyth-Edwards Notation (raises ValueError
+                if it is invalid, the board isn't changed then)
+        '''
+        # everything is parsed before the board is changed
+        position = bitboard.Bitboard_Position.from_fen(fen)
+        fields = fen.split()
+        counters = None
+        if len(fields) >= 6:
+            if not (fields[4].isdigit() and fields[5].isdigit()):
+                raise ValueError('invalid move counters in FEN: {}'.format(fen))
+            counters = int(fields[4]), int(fields[5])
+        self.set_position(position)
+        if counters is not None:
+            self.halfmove, self.fullmove = counters
+
+    def to_fen(self) -> str:
+        '''
+            Returns the position as a FEN string, the castling rights
+            come from has_moved of the kings and rooks
+
+            Returns
+            -------
+            str
+                the position in Forsyth-Edwards Notation
+        '''
+        return self.get_position().to_fen(self.halfmove, self.fullmove)
+
+
+# the board of the game, the methods of this default board are the static
+# interface the game used before boards could be created (Piece_Handler.make_move, ...)
+Piece_Handler = Board()
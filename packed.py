@@ -0,0 +1,298 @@
+'''
+    Packed positions: a whole position in 38 immutable bytes
+
+    A board with its pieces takes a few kilobytes, which is too much to keep
+    millions of positions in memory (e.g. for analysis or training data).
+    A packed position is a bytes object:
+
+        bytes 0-31   the 64 squares, 4 bits each (the high bits first), 0 for
+                     an empty square, else 1 + colour * 6 + piece type
+                     (the board index of bitboard.py plus one)
+        byte 32      the colour to move (bit 4) and the castling rights (bits 0-3)
+        byte 33      the ghost square (0xFF if there is none)
+        bytes 34-35  the halfmove clock (big-endian)
+        bytes 36-37  the fullmove number (big-endian)
+
+    Like in a FEN, pawns on the square they started on count as unmoved.
+    Packed positions are hashable and compare by content, so they can be
+    used as keys or put into sets to remove duplicates.
+
+    Usage:
+
+        python packed.py pack positions.fen positions.bin
+        python packed.py unpack positions.bin
+'''
+import argparse
+import struct
+import sys
+from typing import Iterator, Tuple
+from objects import Board, Piece_Handler
+import bitboard
+
+PACKED_SIZE = 38
+SQUARE_BYTES = 32
+STATE = struct.Struct('>BBHH')
+NO_GHOST = 0xFF
+MAX_COUNTER = 0xFFFF
+
+
+def pack_squares(codes: bytearray, turn: int, castling: int, ghost: int, halfmove: int, fullmove: int) -> bytes:
+    '''
+        Packs the codes of the squares and the state of a position
+
+        Parameters
+        ----------
+        codes: bytearray
+            the code of every square (0 for empty, else 1 + colour * 6 + piece type)
+
+        turn: int
+            bitboard.WHITE or bitboard.BLACK
+
+        castling: int
+            the castling rights
+
+        ghost: int
+            the ghost square (-1 if there is none)
+
+        halfmove: int
+            the halfmove clock (larger values are stored as 65535)
+
+        fullmove: int
+            the fullmove number (larger values are stored as 65535)
+
+        Returns
+        -------
+        bytes
+            the packed position
+    '''
+    squares = bytes(codes[sq] << 4 | codes[sq + 1] for sq in range(0, 64, 2))
+    return squares + STATE.pack(turn << 4 | castling, ghost if ghost >= 0 else NO_GHOST,
+                                min(halfmove, MAX_COUNTER), min(fullmove, MAX_COUNTER))
+
+
+def pack_board(board: Board = Piece_Handler) -> bytes:
+    '''
+        Packs the position of a board
+
+        Parameters
+        ----------
+        board: Board
+            the board
+
+        Returns
+        -------
+        bytes
+            the packed position
+    '''
+    codes = bytearray(64)
+    for piece in board.pieces:
+        x, y = piece.pos
+        codes[y * 8 + x] = 1 + (6 if piece.colour == 'black' else 0) + piece.piece_type
+    ghost = board.ghost
+    return pack_squares(codes, bitboard.COLOURS.index(board.turn), board.castling,
+                        board.square_index(ghost) if board.pos_on_board(ghost) else -1, board.halfmove, board.fullmove)
+
+
+def pack_position(position: bitboard.Bitboard_Position, halfmove: int = 0, fullmove: int = 1) -> bytes:
+    '''
+        Packs a bitboard position
+
+        Parameters
+        ----------
+        position: bitboard.Bitboard_Position
+            the position
+
+        halfmove: int
+            the plies since the last capture or pawn move
+
+        fullmove: int
+            the number of the move
+
+        Returns
+        -------
+        bytes
+            the packed position
+    '''
+    codes = bytearray(64)
+    for index, bb in enumerate(position.boards):
+        for sq in bitboard.squares_of(bb):
+            codes[sq] = index + 1
+    return pack_squares(codes, position.turn, position.castling, position.ghost, halfmove, fullmove)
+
+
+def unpack_position(data: bytes) -> Tuple[bitboard.Bitboard_Position, int, int]:
+    '''
+        Unpacks a position into bitboards
+
+        Parameters
+        ----------
+        data: bytes
+            the packed position (any bytes-like object of PACKED_SIZE bytes)
+
+        Returns
+        -------
+        Tuple[bitboard.Bitboard_Position, int, int]
+            the position, the halfmove clock and the fullmove number
+    '''
+    if len(data) != PACKED_SIZE:
+        raise ValueError('a packed position has {} bytes, not {}'.format(PACKED_SIZE, len(data)))
+    boards = [0] * 12
+    for index in range(SQUARE_BYTES):
+        byte = data[index]
+        if not byte:
+            continue
+        for sq, code in ((2 * index, byte >> 4), (2 * index + 1, byte & 15)):
+            if code:
+                if code > 12:
+                    raise ValueError('invalid piece code {} on square {}'.format(code, sq))
+                boards[code - 1] |= 1 << sq
+    position = bitboard.Bitboard_Position()
+    position.boards = boards
+    position.occupancy = [boards[0] | boards[1] | boards[2] | boards[3] | boards[4] | boards[5],
+                          boards[6] | boards[7] | boards[8] | boards[9] | boards[10] | boards[11]]
+    position.unmoved_pawns = boards[bitboard.PAWN] & bitboard.PAWN_START[bitboard.WHITE] \
+        | boards[6 + bitboard.PAWN] & bitboard.PAWN_START[bitboard.BLACK]
+    state, ghost, halfmove, fullmove = STATE.unpack_from(data, SQUARE_BYTES)
+    position.turn = state >> 4 & 1
+    position.castling = state & 15
+    position.ghost = ghost if ghost < 64 else -1
+    return position, halfmove, fullmove
+
+
+def unpack_board(data: bytes, board: Board = Piece_Handler) -> None:
+    '''
+        Replaces all the pieces of a board with the ones of a packed position
+
+        Parameters
+        ----------
+        data: bytes
+            the packed position
+
+        board: Board
+            the board
+    '''
+    position, halfmove, fullmove = unpack_position(data)
+    board.set_position(position)
+    board.halfmove = halfmove
+    board.fullmove = fullmove
+
+
+def piece_at(data: bytes, sq: int) -> Tuple[int, int]:
+    '''
+        Returns the piece on a square of a packed position without unpacking it
+
+        Parameters
+        ----------
+        data: bytes
+            the packed position
+
+        sq: int
+            the square (y * 8 + x)
+
+        Returns
+        -------
+        Tuple[int, int]
+            (colour, piece type), None if the square is empty
+    '''
+    byte = data[sq >> 1]
+    code = byte & 15 if sq & 1 else byte >> 4
+    return divmod(code - 1, 6) if code else None
+
+
+def to_fen(data: bytes) -> str:
+    '''
+        Returns a packed position in Forsyth-Edwards Notation
+
+        Parameters
+        ----------
+        data: bytes
+            the packed position
+
+        Returns
+        -------
+        str
+            the position
+    '''
+    position, halfmove, fullmove = unpack_position(data)
+    return position.to_fen(halfmove, fullmove)
+
+
+def from_fen(fen: str) -> bytes:
+    '''
+        Packs a position in Forsyth-Edwards Notation (the move counters are optional)
+
+        Parameters
+        ----------
+        fen: str
+            the position
+
+        Returns
+        -------
+        bytes
+            the packed position (raises ValueError if the FEN is invalid
+            or a move counter doesn't fit into its 16 bits)
+    '''
+    fields = fen.split()
+    halfmove, fullmove = 0, 1
+    if len(fields) >= 6:
+        if not (fields[4].isdigit() and fields[5].isdigit()) or max(int(fields[4]), int(fields[5])) > MAX_COUNTER:
+            raise ValueError('invalid move counters in FEN: {}'.format(fen))
+        halfmove, fullmove = int(fields[4]), int(fields[5])
+    return pack_position(bitboard.Bitboard_Position.from_fen(fen), halfmove, fullmove)
+
+
+def read_packed(path: str) -> Iterator[bytes]:
+    '''
+        Reads the positions of a file of packed positions
+
+        Parameters
+        ----------
+        path: str
+            the file
+
+        Returns
+        -------
+        Iterator[bytes]
+            the packed positions
+    '''
+    with open(path, 'rb') as file:
+        while True:
+            data = file.read(PACKED_SIZE)
+            if len(data) < PACKED_SIZE:
+                if data:
+                    raise ValueError('{} ends with an incomplete position'.format(path))
+                return
+            yield data
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Converts between FEN files and files of packed positions')
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack = commands.add_parser('pack', help='packs a file with one FEN per line')
+    pack.add_argument('fen', help='the FEN file')
+    pack.add_argument('output', help='the file of packed positions to write')
+    unpack = commands.add_parser('unpack', help='prints the positions of a packed file as FEN')
+    unpack.add_argument('packed', help='the file of packed positions')
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        count = 0
+        with open(args.fen, encoding='utf-8') as stream, open(args.output, 'wb') as output:
+            for number, line in enumerate(stream, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    output.write(from_fen(line))
+                except ValueError as error:
+                    print('line {}: {}'.format(number, error), file=sys.stderr)
+                    continue
+                count += 1
+        print('{} positions packed into {} ({} bytes each)'.format(count, args.output, PACKED_SIZE))
+    else:
+        for data in read_packed(args.packed):
+            print(to_fen(data))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+'''
+    Perft: counts the leaf nodes of the move tree to measure the speed
+    of the move generation and to check that it is correct
+
+    The rules are the ones from objects.py: there is no check, so every
+    move a piece can make is counted, and a position in which a king has
+    been taken has no moves. Because of that the node counts of the
+    reference positions are larger than the usual perft tables once
+    checks become possible.
+
+    Usage:
+
+        python perft.py --depth 4
+        python perft.py --depth 3 --moves e2e4 e7e5 --divide
+        python perft.py --depth 3 --fen "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+        python perft.py --suite --backend bitboard
+'''
+import argparse
+import time
+from typing import Dict, List, Tuple
+from objects import Board, Piece_Handler
+import bitboard
+
+Move = Tuple[Tuple[int, int], Tuple[int, int], str]
+
+PROMOTIONS = {'q': 'queen', 'n': 'knight', 'b': 'bishop', 'r': 'rook'}
+
+# name, moves from the starting position, node counts for depth 1, 2, ...
+SUITE = [
+    ('start position', [], [20, 400, 8902, 197742]),
+    ('italian game', ['e2e4', 'e7e5', 'g1f3', 'b8c6', 'f1c4', 'f8c5'], [33, 1182, 39255]),
+    ('queens gambit declined', ['d2d4', 'd7d5', 'c2c4', 'e7e6', 'b1c3', 'g8f6', 'c1g5', 'f8e7'], [38, 1219, 46244]),
+    ('sicilian najdorf', ['e2e4', 'c7c5', 'g1f3', 'd7d6', 'd2d4', 'c5d4', 'f3d4', 'g8f6', 'b1c3', 'a7a6'], [43, 1281, 55622]),
+    ('en passant', ['e2e4', 'a7a6', 'e4e5', 'd7d5'], [31, 805, 25065]),
+    ('castling', ['e2e4', 'e7e5', 'g1f3', 'g8f6', 'f1c4', 'f8c5', 'd2d3', 'd7d6', 'c1g5', 'c8g4',
+                  'b1c3', 'b8c6', 'd1d2', 'd8d7'], [44, 1941, 85499]),
+    ('promotion', ['h2h4', 'g7g5', 'h4g5', 'h7h6', 'g5h6', 'f8g7', 'h6g7', 'h8h7'], [24, 575, 15411]),
+]
+
+
+def move_to_str(move: Move) -> str:
+    '''
+        Returns a move in coordinate notation (e.g. e2e4 or e7e8q)
+
+        Parameters
+        ----------
+        move: Move
+            the move (from, to, promotion)
+
+        Returns
+        -------
+        str
+            the move as a string
+    '''
+    from_pos, to_pos, promotion = move
+    text = Board.square_name(from_pos) + Board.square_name(to_pos)
+    return text + next((letter for letter, name in PROMOTIONS.items() if name == promotion), '')
+
+
+def parse_move(text: str) -> Move:
+    '''
+        Parses a move in coordinate notation
+
+        Parameters
+        ----------
+        text: str
+            the move (e.g. e2e4 or e7e8q)
+
+        Returns
+        -------
+        Move
+            the move (from, to, promotion), raises ValueError if the text isn't a move
+    '''
+    squares_valid = len(text) in (4, 5) and all(text[i] in 'abcdefgh' and text[i + 1] in '12345678' for i in (0, 2))
+    if not squares_valid or (len(text) == 5 and text[4] not in PROMOTIONS):
+        raise ValueError('invalid move: {}'.format(text))
+    promotion = PROMOTIONS[text[4]] if len(text) > 4 else ''
+    return (Board.parse_square(text[:2]), Board.parse_square(text[2:4]), promotion)
+
+
+def apply_move(move: Move, board: Board = Piece_Handler) -> None:
+    '''
+        Plays a move on a board, raises ValueError if the move isn't one of the
+        moves of the colour to move (the board isn't changed then)
+
+        Parameters
+        ----------
+        move: Move
+            the move (from, to, promotion)
+
+        board: Board
+            the board
+    '''
+    from_pos, to_pos, promotion = move
+    piece = board.get_piece_on_board(from_pos)
+    if piece is None or piece.get_colour() != board.turn or board.is_game_over() \
+            or to_pos not in board.get_piece_moves(piece):
+        raise ValueError('illegal move: {}'.format(move_to_str(move)))
+    # a pawn on the last rank has to be promoted, and only a pawn on the last rank can be
+    promoting = piece.get_class_name() == "Pawn" and (to_pos[1] == 0 or to_pos[1] == 7)
+    if promoting != bool(promotion) or (promotion and promotion not in PROMOTIONS.values()):
+        raise ValueError('illegal move: {}'.format(move_to_str(move)))
+    piece.move_piece(to_pos)
+    if promotion:
+        board.promote_piece(piece, promotion)
+
+
+def other(colour: str) -> str:
+    '''
+        Returns the other colour
+    '''
+    return 'black' if colour == 'white' else 'white'
+
+
+def perft(depth: int, colour: str, board: Board = Piece_Handler) -> int:
+    '''
+        Counts the leaf nodes of the position of a board
+
+        Parameters
+        ----------
+        depth: int
+            the number of plies
+
+        colour: str
+            the colour to move
+
+        board: Board
+            the board
+
+        Returns
+        -------
+        int
+            the number of leaf nodes
+    '''
+    moves = board.generate_moves(colour)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for from_pos, to_pos, promotion in moves:
+        board.make_move(board.get_piece_on_board(from_pos), to_pos, promotion)
+        nodes += perft(depth - 1, other(colour), board)
+        board.unmake_move()
+    return nodes
+
+
+def perft_bitboard(position: bitboard.Bitboard_Position, depth: int) -> int:
+    '''
+        Counts the leaf nodes of a bitboard position
+
+        Parameters
+        ----------
+        position: bitboard.Bitboard_Position
+            the position
+
+        depth: int
+            the number of plies
+
+        Returns
+        -------
+        int
+            the number of leaf nodes
+    '''
+    moves = position.generate_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    return sum(perft_bitboard(position.make_move(move), depth - 1) for move in moves)
+
+
+def divide(depth: int, colour: str, backend: str, board: Board = Piece_Handler) -> Dict[str, int]:
+    '''
+        Counts the leaf nodes below every move of the current position
+
+        Parameters
+        ----------
+        depth: int
+            the number of plies (including the divided move)
+
+        colour: str
+            the colour to move
+
+        backend: str
+            'objects' or 'bitboard'
+
+        board: Board
+            the board
+
+        Returns
+        -------
+        Dict[str, int]
+            the node count for every move
+    '''
+    result = {}
+    if backend == 'bitboard':
+        position = board.get_position(colour)
+        for move in position.generate_moves():
+            result[bitboard.Bitboard_Position.move_to_str(move)] = perft_bitboard(position.make_move(move), depth - 1)
+        return result
+    for move in board.generate_moves(colour):
+        from_pos, to_pos, promotion = move
+        board.make_move(board.get_piece_on_board(from_pos), to_pos, promotion)
+        result[move_to_str(move)] = perft(depth - 1, other(colour), board)
+        board.unmake_move()
+    return result
+
+
+def setup(moves: List[str], board: Board = Piece_Handler, fen: str = None) -> str:
+    '''
+        Sets up the starting position (or a FEN) and plays the given moves,
+        raises ValueError if the FEN or a move is invalid
+
+        Parameters
+        ----------
+        moves: List[str]
+            the moves in coordinate notation
+
+        board: Board
+            the board
+
+        fen: str
+            the position the moves are played from (the starting position if None)
+
+        Returns
+        -------
+        str
+            the colour to move
+    '''
+    if fen is None:
+        board.init_pieces()
+        board.set_ghost_piece((-1, -1))
+    else:
+        board.load_fen(fen)
+    colour = board.turn
+    for move in moves:
+        apply_move(parse_move(move), board)
+        colour = other(colour)
+    return colour
+
+
+def run(depth: int, colour: str, backend: str, board: Board = Piece_Handler) -> int:
+    '''
+        Runs perft on the position of a board with the given backend
+    '''
+    if backend == 'bitboard':
+        return perft_bitboard(board.get_position(colour), depth)
+    return perft(depth, colour, board)
+
+
+def run_suite(backend: str, max_depth: int) -> bool:
+    '''
+        Runs all the reference positions and compares the node counts
+
+        Parameters
+        ----------
+        backend: str
+            'objects' or 'bitboard'
+
+        max_depth: int
+            the deepest depth that is run
+
+        Returns
+        -------
+        bool
+            if all the node counts are correct
+    '''
+    correct = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, moves, counts in SUITE:
+        for depth, expected in enumerate(counts[:max_depth], 1):
+            colour = setup(moves)
+            start = time.perf_counter()
+            nodes = run(depth, colour, backend)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            status = 'ok' if nodes == expected else 'FAILED (expected {})'.format(expected)
+            print('{:<24} depth {}  {:>10} nodes  {:8.3f} s  {:>10.0f} nodes/s  {}'.format(
+                name, depth, nodes, elapsed, nodes / elapsed if elapsed else 0, status))
+            correct = correct and nodes == expected
+    print('total: {} nodes in {:.3f} s ({:.0f} nodes/s)'.format(total_nodes, total_time, total_nodes / total_time))
+    return correct
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Counts the leaf nodes of the move tree (perft)')
+    parser.add_argument('--depth', type=int, default=3, help='the number of plies')
+    parser.add_argument('--fen', help='the position to count from (the starting position if not given)')
+    parser.add_argument('--moves', nargs='*', default=[], help='moves from the starting position or --fen (e.g. e2e4 e7e5)')
+    parser.add_argument('--divide', action='store_true', help='print the node count below every move')
+    parser.add_argument('--backend', choices=('objects', 'bitboard'), default='objects', help='the move generator')
+    parser.add_argument('--suite', action='store_true', help='run the reference positions up to --depth')
+    args = parser.parse_args()
+
+    if args.suite:
+        raise SystemExit(0 if run_suite(args.backend, args.depth) else 1)
+
+    try:
+        colour = setup(args.moves, fen=args.fen)
+    except ValueError as error:
+        parser.error(str(error))
+    start = time.perf_counter()
+    if args.divide:
+        result = divide(args.depth, colour, args.backend)
+        for move, nodes in sorted(result.items()):
+            print('{}: {}'.format(move, nodes))
+        nodes = sum(result.values())
+        print('moves: {}'.format(len(result)))
+    else:
+        nodes = run(args.depth, colour, args.backend)
+    elapsed = time.perf_counter() - start
+    print('nodes: {}'.format(nodes))
+    print('time: {:.3f} s ({:.0f} nodes/s)'.format(elapsed, nodes / elapsed if elapsed else 0))
+
+
+if __name__ == '__main__':
+    main()
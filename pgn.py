@@ -0,0 +1,456 @@
+'''
+    Reading and writing games in Portable Game Notation
+
+    The reader streams: it reads a file line by line and yields one game
+    at a time, so only the current game is in memory however large the
+    archive is. The moves are given in Standard Algebraic Notation (SAN)
+    and are resolved against the moves of the pieces (get_moves), then
+    played with move_piece, so an archive is validated with the rules of
+    objects.py.
+
+    Usage:
+
+        python pgn.py games.pgn
+        python pgn.py games.pgn --verbose --fen
+'''
+import argparse
+import re
+import sys
+import time
+from datetime import date
+from typing import Dict, Iterator, List, TextIO, Tuple
+import bitboard
+from objects import Board
+import perft
+
+Move = Tuple[Tuple[int, int], Tuple[int, int], str]
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+SAN_PIECES = {'N': 'Knight', 'B': 'Bishop', 'R': 'Rook', 'Q': 'Queen', 'K': 'King'}
+SAN_LETTERS = {name: letter for letter, name in SAN_PIECES.items()}
+PROMOTIONS = {'Q': 'queen', 'R': 'rook', 'B': 'bishop', 'N': 'knight'}
+TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN = re.compile(r'[{}();]|[^\s{}();]+')
+MOVE_NUMBER = re.compile(r'^\d+\.*')
+SQUARE = re.compile(r'^[a-h][1-8]$')
+
+
+class Pgn_Game():
+    '''
+        A game read from a PGN file
+
+        ...
+
+        Attributes
+        ----------
+        headers: Dict[str, str]
+            the tag pairs (e.g. White, Black, Result, FEN)
+
+        moves: List[str]
+            the moves in SAN (without move numbers, comments and variations)
+
+        result: str
+            1-0, 0-1, 1/2-1/2 or * (unknown)
+
+        Methods
+        -------
+        get_fen(self) -> str
+            Returns the start position of the game
+    '''
+    def __init__(self) -> None:
+        self.headers: Dict[str, str] = {}
+        self.moves: List[str] = []
+        self.result = '*'
+
+    def get_fen(self) -> str:
+        '''
+            Returns the start position of the game (the FEN tag or the standard position)
+        '''
+        return self.headers.get('FEN', bitboard.START_FEN)
+
+
+class Replay_Result():
+    '''
+        The result of replaying a game
+
+        ...
+
+        Attributes
+        ----------
+        game: Pgn_Game
+            the game
+
+        plies: int
+            the number of moves that were played
+
+        error: str
+            why the game is invalid (None if all the moves were valid)
+
+        fen: str
+            the position after the last valid move (empty if the start position is invalid)
+    '''
+    def __init__(self, game: Pgn_Game, plies: int, error: str, fen: str) -> None:
+        self.game = game
+        self.plies = plies
+        self.error = error
+        self.fen = fen
+
+
+def read_games(stream: TextIO) -> Iterator[Pgn_Game]:
+    '''
+        Reads the games of a PGN file one at a time
+
+        Parameters
+        ----------
+        stream: TextIO
+            the file
+
+        Returns
+        -------
+        Iterator[Pgn_Game]
+            the games
+    '''
+    game = None
+    in_comment = False
+    variations = 0
+    for line in stream:
+        if not in_comment and not variations:
+            stripped = line.strip()
+            if stripped.startswith('%'):
+                continue
+            if stripped.startswith('['):
+                match = TAG.match(stripped)
+                if match is not None:
+                    if game is not None and game.moves:
+                        yield game
+                        game = None
+                    if game is None:
+                        game = Pgn_Game()
+                    game.headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+                    continue
+        for token in TOKEN.findall(line):
+            if in_comment:
+                in_comment = token != '}'
+            elif token == '{':
+                in_comment = True
+            elif token == ';':
+                break
+            elif token == '(':
+                variations += 1
+            elif token == ')':
+                variations = max(variations - 1, 0)
+            elif variations or token.startswith('$'):
+                continue
+            elif token in RESULTS:
+                if game is None:
+                    game = Pgn_Game()
+                game.result = token
+                yield game
+                game = None
+            else:
+                token = MOVE_NUMBER.sub('', token)
+                if token:
+                    if game is None:
+                        game = Pgn_Game()
+                    game.moves.append(token)
+    if game is not None and (game.moves or game.headers):
+        yield game
+
+
+def leaves_king_attacked(board: Board, move: Move) -> bool:
+    '''
+        Checks if a move leaves the own king attacked (only used to tell
+        apart SAN moves that would be ambiguous without the check rule)
+
+        Parameters
+        ----------
+        board: Board
+            the board
+
+        move: Move
+            the move
+
+        Returns
+        -------
+        bool
+            if the other colour could take the king after the move
+    '''
+    from_pos, to_pos, promotion = move
+    colour = bitboard.COLOURS.index(board.turn)
+    board.make_move(board.get_piece_on_board(from_pos), to_pos, promotion)
+    position = board.get_position()
+    king = position.boards[colour * 6 + bitboard.KING]
+    attacked = bool(king) and position.is_attacked(king.bit_length() - 1, 1 - colour)
+    board.unmake_move()
+    return attacked
+
+
+def resolve_san(board: Board, san: str) -> Move:
+    '''
+        Finds the move of a SAN string in the position of a board
+
+        Parameters
+        ----------
+        board: Board
+            the board
+
+        san: str
+            the move (e.g. e4, Nbd7, exd8=Q+ or O-O)
+
+        Returns
+        -------
+        Move
+            the move (from, to, promotion)
+    '''
+    text = san.rstrip('+#!?')
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        king = next((piece for piece in board.pieces if piece.get_colour() == board.turn and piece.get_class_name() == 'King'), None)
+        if king is not None:
+            x, y = king.get_pos()
+            to_pos = (x + 2, y) if len(text) == 3 else (x - 2, y)
+            if to_pos in board.get_piece_moves(king):
+                return (king.get_pos(), to_pos, '')
+        raise ValueError('illegal move: {}'.format(san))
+    promotion = ''
+    if '=' in text:
+        text, letter = text.split('=', 1)
+        promotion = PROMOTIONS.get(letter.upper(), '')
+        if not promotion:
+            raise ValueError('invalid promotion: {}'.format(san))
+    elif len(text) > 2 and text[-1] in PROMOTIONS and text[0] in 'abcdefgh':
+        promotion = PROMOTIONS[text[-1]]
+        text = text[:-1]
+    name = SAN_PIECES.get(text[:1], 'Pawn')
+    if name != 'Pawn':
+        text = text[1:]
+    if not SQUARE.match(text[-2:]):
+        raise ValueError('invalid move: {}'.format(san))
+    to_pos = Board.parse_square(text[-2:])
+    hint = text[:-2].replace('x', '').replace(':', '').replace('-', '')
+    file = rank = None
+    for letter in hint:
+        if 'a' <= letter <= 'h':
+            file = ord(letter) - 97
+        elif '1' <= letter <= '8':
+            rank = 8 - int(letter)
+        else:
+            raise ValueError('invalid move: {}'.format(san))
+    candidates = []
+    for piece in board.pieces:
+        x, y = piece.get_pos()
+        if (piece.get_colour() == board.turn and piece.get_class_name() == name
+                and (file is None or x == file) and (rank is None or y == rank) and to_pos in board.get_piece_moves(piece)):
+            candidates.append((piece.get_pos(), to_pos, promotion))
+    if len(candidates) > 1:
+        candidates = [move for move in candidates if not leaves_king_attacked(board, move)]
+    if len(candidates) != 1:
+        raise ValueError('{} move: {}'.format('ambiguous' if candidates else 'illegal', san))
+    if name == 'Pawn' and (to_pos[1] == 0 or to_pos[1] == 7) and not promotion:
+        raise ValueError('missing promotion: {}'.format(san))
+    return candidates[0]
+
+
+def move_to_san(board: Board, move: Move) -> str:
+    '''
+        Returns a move in SAN (the move needs to be valid in the position of the board)
+
+        Parameters
+        ----------
+        board: Board
+            the board before the move
+
+        move: Move
+            the move (from, to, promotion)
+
+        Returns
+        -------
+        str
+            the move (e.g. e4, Nbd7, exd8=Q+ or O-O)
+    '''
+    from_pos, to_pos, promotion = move
+    piece = board.get_piece_on_board(from_pos)
+    name = piece.get_class_name()
+    target = board.get_piece_on_board(to_pos)
+    capture = target is not None or (name == 'Pawn' and to_pos == board.get_ghost_piece())
+    square = Board.square_name(to_pos)
+    if name == 'King' and abs(to_pos[0] - from_pos[0]) == 2:
+        san = 'O-O' if to_pos[0] > from_pos[0] else 'O-O-O'
+    elif name == 'Pawn':
+        san = (Board.square_name(from_pos)[0] + 'x' if capture else '') + square
+        if promotion:
+            san += '=' + next(letter for letter, promoted in PROMOTIONS.items() if promoted == promotion)
+    else:
+        others = [other.get_pos() for other in board.pieces if other is not piece and other.get_colour() == piece.get_colour()
+                  and other.get_class_name() == name and to_pos in board.get_piece_moves(other)]
+        hint = ''
+        if others:
+            from_name = Board.square_name(from_pos)
+            if all(pos[0] != from_pos[0] for pos in others):
+                hint = from_name[0]
+            elif all(pos[1] != from_pos[1] for pos in others):
+                hint = from_name[1]
+            else:
+                hint = from_name
+        san = SAN_LETTERS[name] + hint + ('x' if capture else '') + square
+    if target is not None and target.get_class_name() == 'King':
+        return san
+    colour = bitboard.COLOURS.index(board.turn)
+    board.make_move(piece, to_pos, promotion)
+    position = board.get_position()
+    king = position.boards[(1 - colour) * 6 + bitboard.KING]
+    check = bool(king) and position.is_attacked(king.bit_length() - 1, colour)
+    board.unmake_move()
+    return san + '+' if check else san
+
+
+def replay_game(game: Pgn_Game, board: Board, load: bool = True) -> Iterator[Move]:
+    '''
+        Plays the moves of a game on a board, the board holds the position
+        after every yielded move (raises ValueError at the first invalid move)
+
+        Parameters
+        ----------
+        game: Pgn_Game
+            the game
+
+        board: Board
+            the board (its position is replaced)
+
+        load: bool
+            if the start position of the game is loaded first (False if the
+            caller already set it up, so it isn't parsed twice)
+
+        Returns
+        -------
+        Iterator[Move]
+            the moves
+    '''
+    if load:
+        board.load_fen(game.get_fen())
+    for san in game.moves:
+        move = resolve_san(board, san)
+        perft.apply_move(move, board)
+        # the moves are never taken back, so a long game doesn't collect records
+        board.history.clear()
+        yield move
+
+
+def replay_games(stream: TextIO, board: Board = None) -> Iterator[Replay_Result]:
+    '''
+        Reads and replays the games of a PGN file one at a time
+
+        Parameters
+        ----------
+        stream: TextIO
+            the file
+
+        board: Board
+            the board the games are played on (a new one if None)
+
+        Returns
+        -------
+        Iterator[Replay_Result]
+            the result of every game
+    '''
+    board = board if board is not None else Board()
+    for game in read_games(stream):
+        # an invalid start position leaves the board at the end of the game before
+        try:
+            board.load_fen(game.get_fen())
+        except ValueError as exception:
+            yield Replay_Result(game, 0, str(exception), '')
+            continue
+        plies = 0
+        error = None
+        try:
+            for _ in replay_game(game, board, load=False):
+                plies += 1
+        except ValueError as exception:
+            error = str(exception)
+        yield Replay_Result(game, plies, error, board.to_fen())
+
+
+def write_game(stream: TextIO, moves: List[Move], headers: Dict[str, str] = None,
+               result: str = '*', fen: str = bitboard.START_FEN) -> None:
+    '''
+        Writes a game as PGN
+
+        Parameters
+        ----------
+        stream: TextIO
+            the file
+
+        moves: List[Move]
+            the moves (from, to, promotion)
+
+        headers: Dict[str, str]
+            the tag pairs (Event, Site, Date, Round, White and Black are filled in if missing)
+
+        result: str
+            1-0, 0-1, 1/2-1/2 or *
+
+        fen: str
+            the start position
+    '''
+    tags = {'Event': '?', 'Site': '?', 'Date': date.today().strftime('%Y.%m.%d'), 'Round': '-', 'White': '?', 'Black': '?'}
+    tags.update(headers or {})
+    tags['Result'] = result
+    if fen != bitboard.START_FEN:
+        tags['SetUp'] = '1'
+        tags['FEN'] = fen
+    board = Board()
+    board.load_fen(fen)
+    tokens = []
+    for move in moves:
+        if board.turn == 'white':
+            tokens.append('{}.'.format(board.fullmove))
+        elif not tokens:
+            tokens.append('{}...'.format(board.fullmove))
+        tokens.append(move_to_san(board, move))
+        perft.apply_move(move, board)
+        board.history.clear()
+    tokens.append(result)
+    # the moves are checked before anything is written, so an invalid game leaves the file as it was
+    for name, value in tags.items():
+        stream.write('[{} "{}"]\n'.format(name, value.replace('\\', '\\\\').replace('"', '\\"')))
+    stream.write('\n')
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 79:
+            stream.write(line + '\n')
+            line = token
+        else:
+            line = line + ' ' + token if line else token
+    stream.write(line + '\n\n')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Replays and validates the games of a PGN file')
+    parser.add_argument('file', help='the PGN file (- for stdin)')
+    parser.add_argument('--verbose', action='store_true', help='print every game, not only the invalid ones')
+    parser.add_argument('--fen', action='store_true', help='print the final position of every printed game')
+    args = parser.parse_args()
+
+    stream = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8', errors='replace')
+    games = invalid = plies = 0
+    start = time.perf_counter()
+    with stream:
+        for number, replay in enumerate(replay_games(stream), 1):
+            games += 1
+            plies += replay.plies
+            if replay.error is not None:
+                invalid += 1
+            if args.verbose or replay.error is not None:
+                headers = replay.game.headers
+                print('game {}: {} - {} {} ({} plies) {}'.format(
+                    number, headers.get('White', '?'), headers.get('Black', '?'), replay.game.result,
+                    replay.plies, replay.error or 'ok'))
+                if args.fen:
+                    print('    ' + replay.fen)
+    elapsed = time.perf_counter() - start
+    print('games: {} ({} invalid), plies: {}, {:.1f} s ({:.0f} games/s, {:.0f} plies/s)'.format(
+        games, invalid, plies, elapsed, games / elapsed if elapsed else 0, plies / elapsed if elapsed else 0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,624 @@
+'''
+    Alpha-beta search for the computer opponent
+
+    Negamax with alpha-beta pruning, iterative deepening, a quiescence
+    search over captures and a fixed-size transposition table. The search
+    plays on its board (Piece_Handler by default) with make_move/unmake_move,
+    so the board is the same after the search as before.
+
+    Usage:
+
+        python search.py --depth 4 --moves e2e4 e7e5
+        python search.py --time 5
+'''
+import argparse
+import time
+from typing import Callable, List, Tuple
+from endgame import Endgame_Tables
+from objects import Board, Piece_Handler
+import perft
+
+Move = Tuple[Tuple[int, int], Tuple[int, int], str]
+
+MATE = 100000
+INFINITY = 1000000
+# scores above this are wins (the king can be taken), the rest is the distance in plies
+MATE_BOUND = MATE - 1000
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+VALUES = {'Pawn': 100, 'Knight': 320, 'Bishop': 330, 'Rook': 500, 'Queen': 900, 'King': 20000}
+# bonus for pieces close to the centre, indexed by Board.square_index
+CENTRE = [int(10 * (3.5 - max(abs(x - 3.5), abs(y - 3.5)))) for y in range(8) for x in range(8)]
+
+
+def evaluate(board: Board = Piece_Handler) -> int:
+    '''
+        Evaluates a position for the colour to move
+        (material, centralisation and advanced pawns)
+
+        Parameters
+        ----------
+        board: Board
+            the board of the position
+
+        Returns
+        -------
+        int
+            the score in centipawns
+    '''
+    score = 0
+    for piece in board.pieces:
+        name = piece.get_class_name()
+        x, y = piece.pos
+        value = VALUES[name]
+        if name == 'Pawn':
+            value += 8 * (6 - y if piece.colour == 'white' else y - 1)
+        elif name != 'King':
+            value += CENTRE[y * 8 + x]
+        score += value if piece.colour == 'white' else -value
+    return score if board.turn == 'white' else -score
+
+
+class Transposition_Table():
+    '''
+        A fixed-size hash table of search results, indexed by the hash of the position
+
+        An entry is replaced if it is from an older search, if it belongs to the
+        same position or if the new result was searched at least as deep.
+
+        ...
+
+        Attributes
+        ----------
+        size: int
+            the number of entries (a power of two)
+
+        entries: List[tuple]
+            the entries as (hash, depth, score, flag, move, age)
+
+        age: int
+            the number of the current search
+
+        Methods
+        -------
+        probe(self, key: int) -> tuple
+            Returns the entry of a position
+
+        store(self, key: int, depth: int, score: int, flag: int, move: Move) -> None
+            Saves the result of a position
+
+        new_search(self) -> None
+            Marks all the entries as old
+
+        clear(self) -> None
+            Removes all the entries
+    '''
+    def __init__(self, size: int = 1 << 18) -> None:
+        '''
+            Parameters
+            ----------
+            size: int
+                the number of entries (rounded down to a power of two)
+        '''
+        self.size = 1 << (max(size, 1).bit_length() - 1)
+        self.mask = self.size - 1
+        self.entries = [None] * self.size
+        self.age = 0
+
+    def probe(self, key: int) -> tuple:
+        '''
+            Returns the entry of a position
+
+            Parameters
+            ----------
+            key: int
+                the hash of the position
+
+            Returns
+            -------
+            tuple
+                (hash, depth, score, flag, move, age)
+            None
+                if the position isn't in the table
+        '''
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key: int, depth: int, score: int, flag: int, move: Move) -> None:
+        '''
+            Saves the result of a position (if the replacement policy allows it)
+
+            Parameters
+            ----------
+            key: int
+                the hash of the position
+
+            depth: int
+                the depth the position was searched with
+
+            score: int
+                the score
+
+            flag: int
+                EXACT, LOWER (score is a lower bound) or UPPER (score is an upper bound)
+
+            move: Move
+                the best move
+        '''
+        index = key & self.mask
+        old = self.entries[index]
+        if old is None or old[5] != self.age or old[0] == key or depth >= old[1]:
+            self.entries[index] = (key, depth, score, flag, move, self.age)
+
+    def new_search(self) -> None:
+        '''
+            Marks all the entries as old, so they are replaced first
+        '''
+        self.age += 1
+
+    def clear(self) -> None:
+        '''
+            Removes all the entries
+        '''
+        self.entries = [None] * self.size
+
+
+class Search_Result():
+    '''
+        The result of a search
+
+        ...
+
+        Attributes
+        ----------
+        move: Move
+            the best move (None if there are no moves)
+
+        score: int
+            the score for the colour to move in centipawns
+
+        depth: int
+            the deepest completed iteration
+
+        pv: List[Move]
+            the principal variation
+
+        nodes: int
+            the number of searched nodes
+
+        time: float
+            the time of the search in seconds
+    '''
+    def __init__(self, move: Move, score: int, depth: int, pv: List[Move], nodes: int, elapsed: float) -> None:
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.pv = pv
+        self.nodes = nodes
+        self.time = elapsed
+
+    def get_nps(self) -> int:
+        '''
+            Returns the searched nodes per second
+        '''
+        return int(self.nodes / self.time) if self.time > 0 else 0
+
+    def is_mate(self) -> bool:
+        '''
+            Returns if the score is a forced king capture (for either side)
+        '''
+        return abs(self.score) >= MATE_BOUND
+
+
+class Search():
+    '''
+        Negamax alpha-beta search with iterative deepening on the position of a board
+
+        ...
+
+        Attributes
+        ----------
+        board: Board
+            the board that is searched
+
+        table: Transposition_Table
+            the transposition table (kept between searches)
+
+        should_stop: Callable[[], bool]
+            polled during the search, the search stops when it returns True
+
+        tables: Endgame_Tables
+            the endgame tables (None to always search)
+
+        nodes: int
+            the nodes of the current search
+
+        Methods
+        -------
+        search(self, max_depth: int = 64, max_nodes: int = 0, max_time: float = 0,
+               on_iteration: Callable[[Search_Result], None] = None) -> Search_Result
+            Searches the current position until one of the limits is reached
+
+        stop(self) -> None
+            Stops the running search (can be called from another thread)
+    '''
+    def __init__(self, table: Transposition_Table = None, should_stop: Callable[[], bool] = None,
+                 board: Board = Piece_Handler, tables: Endgame_Tables = None) -> None:
+        '''
+            Parameters
+            ----------
+            table: Transposition_Table
+                the transposition table (a new one if None)
+
+            should_stop: Callable[[], bool]
+                polled during the search, the search stops when it returns True
+                (e.g. to cancel a search from another process)
+
+            board: Board
+                the board that is searched
+
+            tables: Endgame_Tables
+                the endgame tables, positions with a table are not searched
+        '''
+        self.board = board
+        self.table = table if table is not None else Transposition_Table()
+        self.should_stop = should_stop
+        self.tables = tables
+        self.nodes = 0
+        self.max_nodes = 0
+        self.deadline = 0.0
+        self.stopped = False
+
+    def stop(self) -> None:
+        '''
+            Stops the running search (can be called from another thread)
+        '''
+        self.stopped = True
+
+    def search(self, max_depth: int = 64, max_nodes: int = 0, max_time: float = 0,
+               on_iteration: Callable[[Search_Result], None] = None) -> Search_Result:
+        '''
+            Searches the current position until one of the limits is reached.
+            The result of the last completed iteration is returned
+
+            Parameters
+            ----------
+            max_depth: int
+                the deepest iteration
+
+            max_nodes: int
+                the node budget (0 for no limit)
+
+            max_time: float
+                the time budget in seconds (0 for no limit)
+
+            on_iteration: Callable[[Search_Result], None]
+                called after every completed iteration (e.g. to print the progress)
+
+            Returns
+            -------
+            Search_Result
+                the best move, score and principal variation
+        '''
+        start = time.perf_counter()
+        self.nodes = 0
+        self.max_nodes = max_nodes
+        self.deadline = start + max_time if max_time > 0 else 0.0
+        self.stopped = False
+        self.table.new_search()
+        if self.tables is not None:
+            hit = self.tables.best_move(self.board)
+            if hit is not None:
+                return Search_Result(hit[0], self.table_score(hit[1], 0), 0, [hit[0]], 0, time.perf_counter() - start)
+        moves = self.board.generate_moves()
+        result = Search_Result(moves[0] if moves else None, 0, 0, [], 0, 0.0)
+        if len(moves) <= 1:
+            return result
+        for depth in range(1, max_depth + 1):
+            score = self.negamax(depth, -INFINITY, INFINITY, 0)
+            if self.stopped:
+                break
+            pv = self.principal_variation(depth)
+            result = Search_Result(pv[0] if pv else result.move, score, depth, pv, self.nodes, time.perf_counter() - start)
+            if on_iteration is not None:
+                on_iteration(result)
+            if abs(score) >= MATE_BOUND:
+                break
+        result.nodes = self.nodes
+        result.time = time.perf_counter() - start
+        return result
+
+    def check_limits(self) -> None:
+        '''
+            Stops the search if the node or time budget is used up
+        '''
+        if self.max_nodes and self.nodes >= self.max_nodes:
+            self.stopped = True
+        elif self.deadline and time.perf_counter() >= self.deadline:
+            self.stopped = True
+        elif self.should_stop is not None and self.should_stop():
+            self.stopped = True
+
+    def order_moves(self, moves: List[Move], tt_move: Move) -> List[Move]:
+        '''
+            Sorts the moves: the move from the transposition table first,
+            then captures (most valuable victim, least valuable attacker) and promotions
+
+            Parameters
+            ----------
+            moves: List[Move]
+                the moves
+
+            tt_move: Move
+                the best move from the transposition table (or None)
+
+            Returns
+            -------
+            List[Move]
+                the sorted moves
+        '''
+        squares = self.board.squares
+        ghost = self.board.ghost
+        scored = []
+        for move in moves:
+            from_pos, to_pos, promotion = move
+            if move == tt_move:
+                score = INFINITY
+            else:
+                victim = squares[to_pos[1] * 8 + to_pos[0]]
+                score = 0
+                if victim is not None:
+                    score = 10 * VALUES[victim.get_class_name()] - VALUES[squares[from_pos[1] * 8 + from_pos[0]].get_class_name()]
+                elif to_pos == ghost and from_pos[0] != to_pos[0] and squares[from_pos[1] * 8 + from_pos[0]].get_class_name() == 'Pawn':
+                    # en passant: a pawn takes a pawn
+                    score = 9 * VALUES['Pawn']
+                if promotion:
+                    score += VALUES[promotion.capitalize()]
+            scored.append((score, move))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [move for _, move in scored]
+
+    def king_taken(self) -> bool:
+        '''
+            Checks if the last move took a king (the colour to move has lost)
+        '''
+        history = self.board.history
+        return bool(history) and history[-1].captured is not None and history[-1].captured.get_class_name() == 'King'
+
+    def negamax(self, depth: int, alpha: int, beta: int, ply: int) -> int:
+        '''
+            Searches the position with alpha-beta pruning
+
+            Parameters
+            ----------
+            depth: int
+                the remaining depth
+
+            alpha: int
+                the lower bound
+
+            beta: int
+                the upper bound
+
+            ply: int
+                the distance to the root
+
+            Returns
+            -------
+            int
+                the score for the colour to move
+        '''
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self.check_limits()
+        if self.stopped:
+            return 0
+        if self.king_taken():
+            return -MATE + ply
+        if self.tables is not None and len(self.board.pieces) <= 3:
+            value = self.tables.probe(self.board)
+            if value is not None:
+                return self.table_score(value, ply)
+        if depth <= 0:
+            return self.quiescence(alpha, beta, ply)
+
+        key = self.board.hash
+        entry = self.table.probe(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            if ply > 0 and entry[1] >= depth:
+                score = self.score_from_table(entry[2], ply)
+                flag = entry[3]
+                if flag == EXACT or (flag == LOWER and score >= beta) or (flag == UPPER and score <= alpha):
+                    return score
+
+        moves = self.board.generate_moves()
+        if not moves:
+            return 0
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        for move in self.order_moves(moves, tt_move):
+            from_pos, to_pos, promotion = move
+            self.board.make_move(self.board.squares[from_pos[1] * 8 + from_pos[0]], to_pos, promotion)
+            score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            self.board.unmake_move()
+            if self.stopped:
+                return 0
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        if best_score <= original_alpha:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.store(key, depth, self.score_to_table(best_score, ply), flag, best_move)
+        return best_score
+
+    def quiescence(self, alpha: int, beta: int, ply: int) -> int:
+        '''
+            Searches only captures until the position is quiet
+
+            Parameters
+            ----------
+            alpha: int
+                the lower bound
+
+            beta: int
+                the upper bound
+
+            ply: int
+                the distance to the root
+
+            Returns
+            -------
+            int
+                the score for the colour to move
+        '''
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self.check_limits()
+        if self.stopped:
+            return 0
+        if self.king_taken():
+            return -MATE + ply
+        stand_pat = evaluate(self.board)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        squares = self.board.squares
+        ghost = self.board.ghost
+        # en passant lands on the empty square behind the pawn it takes
+        captures = [move for move in self.board.generate_moves()
+                    if squares[move[1][1] * 8 + move[1][0]] is not None
+                    or (move[1] == ghost and move[0][0] != ghost[0]
+                        and squares[move[0][1] * 8 + move[0][0]].get_class_name() == 'Pawn')]
+        for move in self.order_moves(captures, None):
+            from_pos, to_pos, promotion = move
+            self.board.make_move(squares[from_pos[1] * 8 + from_pos[0]], to_pos, promotion)
+            score = -self.quiescence(-beta, -alpha, ply + 1)
+            self.board.unmake_move()
+            if self.stopped:
+                return 0
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def principal_variation(self, depth: int) -> List[Move]:
+        '''
+            Follows the best moves of the transposition table from the current position
+
+            Parameters
+            ----------
+            depth: int
+                the maximal length of the variation
+
+            Returns
+            -------
+            List[Move]
+                the principal variation
+        '''
+        pv = []
+        seen = set()
+        while len(pv) < depth:
+            entry = self.table.probe(self.board.hash)
+            if entry is None or entry[4] is None or self.board.hash in seen:
+                break
+            seen.add(self.board.hash)
+            move = entry[4]
+            piece = self.board.get_piece_on_board(move[0])
+            if piece is None or piece.get_colour() != self.board.turn or move not in self.board.generate_moves():
+                break
+            self.board.make_move(piece, move[1], move[2])
+            pv.append(move)
+        for _ in pv:
+            self.board.unmake_move()
+        return pv
+
+    @staticmethod
+    def table_score(value: int, ply: int) -> int:
+        '''
+            Turns the result of an endgame table (plies until a king is taken) into a score relative to the root
+        '''
+        if value > 0:
+            return MATE - ply - value
+        if value < 0:
+            return -MATE + ply - value
+        return 0
+
+    @staticmethod
+    def score_to_table(score: int, ply: int) -> int:
+        '''
+            Stores king captures relative to the position instead of the root
+        '''
+        if score >= MATE_BOUND:
+            return score + ply
+        if score <= -MATE_BOUND:
+            return score - ply
+        return score
+
+    @staticmethod
+    def score_from_table(score: int, ply: int) -> int:
+        '''
+            Turns a king capture score from the table back into a score relative to the root
+        '''
+        if score >= MATE_BOUND:
+            return score - ply
+        if score <= -MATE_BOUND:
+            return score + ply
+        return score
+
+
+def format_score(result: Search_Result) -> str:
+    '''
+        Returns the score as centipawns or as the number of plies until a king is taken
+    '''
+    if result.is_mate():
+        plies = MATE - abs(result.score)
+        return 'mate {}'.format((plies + 1) // 2 if result.score > 0 else -((plies + 1) // 2))
+    return 'cp {}'.format(result.score)
+
+
+def print_iteration(result: Search_Result) -> None:
+    '''
+        Prints the progress of a search
+    '''
+    print('depth {} score {} nodes {} nps {} time {:.2f} pv {}'.format(
+        result.depth, format_score(result), result.nodes, result.get_nps(), result.time,
+        ' '.join(perft.move_to_str(move) for move in result.pv)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Searches the best move of a position')
+    parser.add_argument('--depth', type=int, default=64, help='the deepest iteration')
+    parser.add_argument('--nodes', type=int, default=0, help='the node budget')
+    parser.add_argument('--time', type=float, default=0, help='the time budget in seconds')
+    parser.add_argument('--moves', nargs='*', default=[], help='moves from the starting position (e.g. e2e4 e7e5)')
+    parser.add_argument('--hash', type=int, default=1 << 18, help='the number of transposition table entries')
+    args = parser.parse_args()
+    if args.depth == 64 and not args.nodes and not args.time:
+        args.depth = 4
+
+    perft.setup(args.moves)
+    result = Search(Transposition_Table(args.hash)).search(args.depth, args.nodes, args.time, print_iteration)
+    print('bestmove {} ({} nodes, {} nodes/s)'.format(
+        perft.move_to_str(result.move) if result.move else '(none)', result.nodes, result.get_nps()))
+
+
+if __name__ == '__main__':
+    main()
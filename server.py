@@ -0,0 +1,511 @@
+'''
+    A headless game server: many games on one asyncio event loop
+
+    Every game is its own Board, so the rules are the ones from objects.py.
+    Clients talk JSON over TCP, one object per line. Every request can carry
+    an "id" that is copied into the response:
+
+        {"id": 1, "cmd": "create"}
+            -> {"id": 1, "ok": true, "game": 7, "turn": "white"}
+        {"id": 2, "cmd": "moves", "game": 7}
+            -> {"id": 2, "ok": true, "game": 7, "turn": "white", "moves": ["a2a3", ...]}
+        {"id": 3, "cmd": "move", "game": 7, "move": "e2e4"}
+            -> {"id": 3, "ok": true, "game": 7, "turn": "black", "over": false, "winner": null}
+        {"id": 4, "cmd": "subscribe", "game": 7}
+            -> {"id": 4, "ok": true, "game": 7}, then for every move of the game:
+               {"event": "move", "game": 7, "move": "e2e4", "turn": "black", "over": false, "winner": null}
+        {"id": 5, "cmd": "close", "game": 7}
+            -> {"id": 5, "ok": true, "game": 7}
+
+    Errors are answered with {"id": ..., "ok": false, "error": "..."}.
+
+    The memory of a game stays the same however long it runs: the server
+    never takes moves back, so the move records are dropped after every
+    move, and the number of subscribers is limited. A game is removed when
+    it is closed, or once the connection that created it is gone and it has
+    no subscribers left, so abandoned games don't fill up the server. The legal moves of a
+    position are generated once (on bitboards) and reused for every request
+    until the next move; with --workers the generation runs in a process
+    pool, so bursts of requests don't block the event loop.
+
+    Usage:
+
+        python server.py --port 8765 --workers 2
+'''
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Set
+import bitboard
+from objects import Board
+import perft
+
+MAX_GAMES = 10000
+MAX_SUBSCRIBERS = 16
+# subscribers that don't read their updates are dropped once this many bytes are waiting
+MAX_WRITE_BUFFER = 1 << 16
+
+
+def legal_moves(position: bitboard.Bitboard_Position) -> List[str]:
+    '''
+        Returns the moves of a position in coordinate notation
+        (module level, so it can run in a worker process)
+
+        Parameters
+        ----------
+        position: bitboard.Bitboard_Position
+            the position
+
+        Returns
+        -------
+        List[str]
+            the moves (e.g. e2e4 or e7e8q)
+    '''
+    return [bitboard.Bitboard_Position.move_to_str(move) for move in position.generate_moves()]
+
+
+class Request_Error(Exception):
+    '''
+        A request that can't be answered, the message is sent to the client
+    '''
+
+
+class Game_Session():
+    '''
+        A game hosted by the server
+
+        ...
+
+        Attributes
+        ----------
+        game_id: int
+            the id of the game
+
+        board: Board
+            the board of the game
+
+        moves: List[str]
+            the legal moves of the position (None until they are needed)
+
+        plies: int
+            the number of moves played
+
+        subscribers: Set[asyncio.StreamWriter]
+            the connections that get an update after every move
+
+        owner: asyncio.StreamWriter
+            the connection that created the game (None once it is closed)
+
+        lock: asyncio.Lock
+            makes sure only one move is validated and played at a time
+
+        Methods
+        -------
+        get_winner(self) -> str
+            Returns the colour that took the other king (None while the game runs)
+    '''
+    def __init__(self, game_id: int, owner: asyncio.StreamWriter = None) -> None:
+        '''
+            Parameters
+            ----------
+            game_id: int
+                the id of the game
+
+            owner: asyncio.StreamWriter
+                the connection that created the game
+        '''
+        self.game_id = game_id
+        self.board = Board()
+        self.board.init_pieces()
+        self.moves = None
+        self.plies = 0
+        self.subscribers: Set[asyncio.StreamWriter] = set()
+        self.owner = owner
+        self.lock = asyncio.Lock()
+
+    def get_winner(self) -> str:
+        '''
+            Returns the colour that took the other king
+
+            Returns
+            -------
+            str
+                the colour of the winner
+            None
+                if the game isn't over
+        '''
+        if not self.board.is_game_over():
+            return None
+        return perft.other(self.board.turn)
+
+
+class Game_Server():
+    '''
+        Hosts the games and answers the requests of the clients
+
+        ...
+
+        Attributes
+        ----------
+        games: Dict[int, Game_Session]
+            the running games by their id
+
+        max_games: int
+            the number of games that can run at the same time
+
+        executor: Executor
+            the process pool for the move generation (None to generate on the event loop)
+
+        owned: Dict[asyncio.StreamWriter, Set[int]]
+            the ids of the games every connection created
+
+        subscribed: Dict[asyncio.StreamWriter, Set[int]]
+            the ids of the games every connection subscribed to
+
+        Methods
+        -------
+        create_game(self, owner: asyncio.StreamWriter = None) -> Game_Session
+            Starts a new game
+
+        remove_game(self, game: Game_Session) -> None
+            Removes a game and forgets its connections
+
+        unsubscribe(self, game: Game_Session, writer: asyncio.StreamWriter) -> None
+            Stops sending the updates of a game to a connection
+
+        get_game(self, request: dict) -> Game_Session
+            Returns the game of a request
+
+        get_moves(self, game: Game_Session) -> List[str]
+            Returns the legal moves of a game
+
+        play_move(self, game: Game_Session, move: str) -> dict
+            Validates and plays a move
+
+        handle_request(self, request: dict, writer: asyncio.StreamWriter) -> dict
+            Answers a request
+
+        handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None
+            Reads the requests of a connection until it is closed
+    '''
+    def __init__(self, max_games: int = MAX_GAMES, executor: Executor = None) -> None:
+        '''
+            Parameters
+            ----------
+            max_games: int
+                the number of games that can run at the same time
+
+            executor: Executor
+                the process pool for the move generation (None to generate on the event loop)
+        '''
+        self.games: Dict[int, Game_Session] = {}
+        self.max_games = max_games
+        self.executor = executor
+        self.next_id = 1
+        self.owned: Dict[asyncio.StreamWriter, Set[int]] = {}
+        self.subscribed: Dict[asyncio.StreamWriter, Set[int]] = {}
+
+    def create_game(self, owner: asyncio.StreamWriter = None) -> Game_Session:
+        '''
+            Starts a new game
+
+            Parameters
+            ----------
+            owner: asyncio.StreamWriter
+                the connection that creates the game (None for a game that
+                is only removed when it is closed)
+
+            Returns
+            -------
+            Game_Session
+                the game
+        '''
+        if len(self.games) >= self.max_games:
+            raise Request_Error('too many games')
+        game = Game_Session(self.next_id, owner)
+        self.games[game.game_id] = game
+        self.next_id += 1
+        if owner is not None:
+            self.owned.setdefault(owner, set()).add(game.game_id)
+        return game
+
+    def remove_game(self, game: Game_Session) -> None:
+        '''
+            Removes a game and forgets its connections
+
+            Parameters
+            ----------
+            game: Game_Session
+                the game
+        '''
+        self.games.pop(game.game_id, None)
+        for writer in game.subscribers:
+            self.subscribed.get(writer, set()).discard(game.game_id)
+        game.subscribers.clear()
+        if game.owner is not None:
+            self.owned.get(game.owner, set()).discard(game.game_id)
+            game.owner = None
+
+    def unsubscribe(self, game: Game_Session, writer: asyncio.StreamWriter) -> None:
+        '''
+            Stops sending the updates of a game to a connection, a game
+            without its creator and without subscribers is removed
+
+            Parameters
+            ----------
+            game: Game_Session
+                the game
+
+            writer: asyncio.StreamWriter
+                the connection
+        '''
+        game.subscribers.discard(writer)
+        self.subscribed.get(writer, set()).discard(game.game_id)
+        if game.owner is None and not game.subscribers:
+            self.remove_game(game)
+
+    def get_game(self, request: dict) -> Game_Session:
+        '''
+            Returns the game of a request
+
+            Parameters
+            ----------
+            request: dict
+                the request with the id of the game
+
+            Returns
+            -------
+            Game_Session
+                the game
+        '''
+        game_id = request.get('game')
+        # JSON true and false are ints in Python, they are no game ids
+        valid = isinstance(game_id, int) and not isinstance(game_id, bool)
+        game = self.games.get(game_id) if valid else None
+        if game is None:
+            raise Request_Error('unknown game')
+        return game
+
+    async def get_moves(self, game: Game_Session) -> List[str]:
+        '''
+            Returns the legal moves of a game, they are only generated
+            once for every position (the lock of the game needs to be held)
+
+            Parameters
+            ----------
+            game: Game_Session
+                the game
+
+            Returns
+            -------
+            List[str]
+                the moves in coordinate notation
+        '''
+        if game.moves is None:
+            position = game.board.get_position()
+            if self.executor is None:
+                moves = legal_moves(position)
+            else:
+                moves = await asyncio.get_running_loop().run_in_executor(self.executor, legal_moves, position)
+            game.moves = moves
+        return game.moves
+
+    async def play_move(self, game: Game_Session, move: str) -> dict:
+        '''
+            Validates and plays a move, then sends it to the subscribers of the game
+
+            Parameters
+            ----------
+            game: Game_Session
+                the game
+
+            move: str
+                the move in coordinate notation (e.g. e2e4 or e7e8q)
+
+            Returns
+            -------
+            dict
+                the state of the game after the move
+        '''
+        async with game.lock:
+            if not isinstance(move, str) or move not in await self.get_moves(game):
+                raise Request_Error('illegal move')
+            from_pos, to_pos, promotion = perft.parse_move(move)
+            board = game.board
+            board.make_move(board.get_piece_on_board(from_pos), to_pos, promotion)
+            # moves are never taken back, so the records aren't needed
+            board.history.clear()
+            game.moves = None
+            game.plies += 1
+            update = {'game': game.game_id, 'move': move, 'turn': board.turn,
+                      'over': board.is_game_over(), 'winner': game.get_winner()}
+        self.publish(game, dict(update, event='move'))
+        return update
+
+    def publish(self, game: Game_Session, message: dict) -> None:
+        '''
+            Sends a message to all the subscribers of a game,
+            subscribers that can't keep up are dropped
+
+            Parameters
+            ----------
+            game: Game_Session
+                the game
+
+            message: dict
+                the message
+        '''
+        line = encode(message)
+        for writer in list(game.subscribers):
+            if writer.is_closing() or writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                self.unsubscribe(game, writer)
+            else:
+                writer.write(line)
+
+    async def handle_request(self, request: dict, writer: asyncio.StreamWriter) -> dict:
+        '''
+            Answers a request
+
+            Parameters
+            ----------
+            request: dict
+                the request
+
+            writer: asyncio.StreamWriter
+                the connection of the client (for subscriptions)
+
+            Returns
+            -------
+            dict
+                the response (without the id)
+        '''
+        match request.get('cmd'):
+            case 'create':
+                game = self.create_game(writer)
+                return {'game': game.game_id, 'turn': game.board.turn}
+            case 'moves':
+                game = self.get_game(request)
+                async with game.lock:
+                    return {'game': game.game_id, 'turn': game.board.turn, 'moves': await self.get_moves(game)}
+            case 'move':
+                return await self.play_move(self.get_game(request), request.get('move'))
+            case 'subscribe':
+                game = self.get_game(request)
+                if len(game.subscribers) >= MAX_SUBSCRIBERS:
+                    raise Request_Error('too many subscribers')
+                game.subscribers.add(writer)
+                self.subscribed.setdefault(writer, set()).add(game.game_id)
+                return {'game': game.game_id}
+            case 'close':
+                game = self.get_game(request)
+                self.remove_game(game)
+                return {'game': game.game_id}
+        raise Request_Error('unknown command')
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''
+            Reads the requests of a connection until it is closed
+
+            Parameters
+            ----------
+            reader: asyncio.StreamReader
+                the incoming side of the connection
+
+            writer: asyncio.StreamWriter
+                the outgoing side of the connection
+        '''
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(encode({'ok': False, 'error': 'line too long'}))
+                    break
+                if not line:
+                    break
+                request = None
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise Request_Error('expected an object')
+                    response = dict(await self.handle_request(request, writer), ok=True)
+                except (Request_Error, ValueError) as error:
+                    response = {'ok': False, 'error': str(error)}
+                if isinstance(request, dict) and 'id' in request:
+                    response['id'] = request['id']
+                writer.write(encode(response))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            # only the games of this connection are looked at, not all the games of the server
+            for game_id in self.subscribed.pop(writer, set()):
+                game = self.games.get(game_id)
+                if game is not None:
+                    game.subscribers.discard(writer)
+                    if game.owner is None and not game.subscribers:
+                        self.remove_game(game)
+            for game_id in self.owned.pop(writer, set()):
+                game = self.games.get(game_id)
+                if game is not None:
+                    game.owner = None
+                    if not game.subscribers:
+                        self.remove_game(game)
+            writer.close()
+
+
+def encode(message: dict) -> bytes:
+    '''
+        Returns a message as a line of JSON
+    '''
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode()
+
+
+async def serve(host: str, port: int, workers: int, max_games: int) -> None:
+    '''
+        Runs the server until it is stopped
+
+        Parameters
+        ----------
+        host: str
+            the address to listen on
+
+        port: int
+            the port to listen on
+
+        workers: int
+            the number of processes for the move generation (0 to generate on the event loop)
+
+        max_games: int
+            the number of games that can run at the same time
+    '''
+    executor = ProcessPoolExecutor(workers) if workers > 0 else None
+    game_server = Game_Server(max_games, executor)
+    server = await asyncio.start_server(game_server.handle_client, host, port)
+    print('listening on {}'.format(', '.join(str(sock.getsockname()) for sock in server.sockets)))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Hosts many games over a JSON-lines TCP protocol')
+    parser.add_argument('--host', default='127.0.0.1', help='the address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='the port to listen on')
+    parser.add_argument('--workers', type=int, default=max(0, (os.cpu_count() or 1) - 1),
+                        help='processes for the move generation (0 to generate on the event loop)')
+    parser.add_argument('--max-games', type=int, default=MAX_GAMES, help='the number of games that can run at the same time')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_games))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
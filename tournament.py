@@ -0,0 +1,703 @@
+'''
+    Self-play tournaments between two players on all cores
+
+    Two players (engine settings or a random mover) play games against each
+    other with the rules of objects.py. Every opening is played twice with
+    the colours swapped. The games run on a pool of worker processes (every
+    worker sets up both players once) and are written as PGN in the order
+    they were started. The score of the first player is reported as
+    wins/draws/losses and as an Elo difference with a 95 % error margin.
+
+    With --sprt the tournament stops as soon as the sequential probability
+    ratio test decides between H0 (the Elo difference is --elo0) and H1 (it
+    is --elo1), using the normal approximation of the log-likelihood ratio.
+
+    A game ends when a king is taken, and is a draw after a threefold
+    repetition, 100 plies without a capture or pawn move, or --max-plies.
+
+    A player is given as a kind and comma-separated settings:
+
+        random                          a random mover
+        engine,depth=3                  the search with a depth limit per move
+        engine,nodes=2000,book=book.bin the search with a node limit, using an opening book
+        engine,time=0.1,tables=tables   the search with 0.1 seconds per move and the endgame tables
+
+    (name=... sets the name in the PGN, hash=... the transposition table entries)
+
+    Usage:
+
+        python tournament.py "engine,depth=2" random --games 100
+        python tournament.py "engine,nodes=3000" "engine,nodes=1500" --openings openings.pgn --pgn games.pgn --workers 4
+        python tournament.py "engine,depth=3" "engine,depth=2" --sprt --elo0 0 --elo1 50 --games 2000
+'''
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, TextIO, Tuple
+import bitboard
+from book import Opening_Book
+from endgame import Endgame_Tables
+from objects import Board
+import perft
+import pgn
+from search import Search, Transposition_Table
+
+Move = Tuple[Tuple[int, int], Tuple[int, int], str]
+Opening = Tuple[str, List[Move]]
+
+KINDS = ('engine', 'random')
+# the depth of an engine without any limit
+DEFAULT_DEPTH = 2
+MAX_PLIES = 300
+REPETITIONS = 3
+FIFTY_MOVES = 100
+
+# the board and the two players of a worker process, set up by init_worker
+worker_board = None
+worker_players = None
+
+
+class Player_Config():
+    '''
+        The settings of a player
+
+        ...
+
+        Attributes
+        ----------
+        kind: str
+            engine or random
+
+        name: str
+            the name in the PGN
+
+        depth: int
+            the depth limit per move (0 for no limit)
+
+        nodes: int
+            the node limit per move (0 for no limit)
+
+        time: float
+            the time limit per move in seconds (0 for no limit)
+
+        book: str
+            the opening book file (None for no book)
+
+        tables: str
+            the directory of the endgame tables (None for no tables)
+
+        hash: int
+            the number of transposition table entries
+    '''
+    def __init__(self, kind: str, name: str = None, depth: int = 0, nodes: int = 0, time: float = 0,
+                 book: str = None, tables: str = None, hash: int = 1 << 16) -> None:
+        '''
+            Parameters
+            ----------
+            kind: str
+                engine or random
+
+            name: str
+                the name in the PGN (built from the settings if None)
+
+            depth: int
+                the depth limit per move (0 for no limit)
+
+            nodes: int
+                the node limit per move (0 for no limit)
+
+            time: float
+                the time limit per move in seconds (0 for no limit)
+
+            book: str
+                the opening book file (None for no book)
+
+            tables: str
+                the directory of the endgame tables (None for no tables)
+
+            hash: int
+                the number of transposition table entries
+        '''
+        if kind not in KINDS:
+            raise ValueError('unknown player kind: {} (engine or random)'.format(kind))
+        if kind == 'engine' and not (depth or nodes or time):
+            depth = DEFAULT_DEPTH
+        self.kind = kind
+        self.depth = depth
+        self.nodes = nodes
+        self.time = time
+        self.book = book
+        self.tables = tables
+        self.hash = hash
+        if name is None:
+            limits = ['{}={}'.format(key, value) for key, value in (('depth', depth), ('nodes', nodes), ('time', time)) if value]
+            name = ' '.join([kind] + limits + (['book'] if book else []) + (['tables'] if tables else []))
+        self.name = name
+
+
+def parse_player(spec: str) -> Player_Config:
+    '''
+        Parses the settings of a player, e.g. "engine,nodes=2000,book=book.bin"
+
+        Parameters
+        ----------
+        spec: str
+            the kind followed by comma-separated key=value settings
+
+        Returns
+        -------
+        Player_Config
+            the settings
+    '''
+    kind, *settings = [part.strip() for part in spec.split(',')]
+    types = {'name': str, 'depth': int, 'nodes': int, 'time': float, 'book': str, 'tables': str, 'hash': int}
+    values = {}
+    for setting in settings:
+        key, _, value = setting.partition('=')
+        if key not in types or not value:
+            raise ValueError('invalid player setting: {} ({})'.format(setting, ', '.join(types)))
+        values[key] = types[key](value)
+    return Player_Config(kind, **values)
+
+
+class Player():
+    '''
+        A player of a worker process, chooses the moves on the board of the worker
+
+        ...
+
+        Attributes
+        ----------
+        config: Player_Config
+            the settings
+
+        board: Board
+            the board the games are played on
+
+        search: Search
+            the search (None for the random mover)
+
+        book: Opening_Book
+            the opening book (None if the player has none)
+
+        Methods
+        -------
+        new_game(self) -> None
+            Forgets everything from the last game
+
+        choose_move(self, rng: random.Random) -> Move
+            Returns the move of the player in the position of the board
+    '''
+    def __init__(self, config: Player_Config, board: Board) -> None:
+        '''
+            Parameters
+            ----------
+            config: Player_Config
+                the settings
+
+            board: Board
+                the board the games are played on
+        '''
+        self.config = config
+        self.board = board
+        self.search = None
+        self.book = Opening_Book(config.book) if config.book else None
+        if config.kind == 'engine':
+            tables = Endgame_Tables(config.tables) if config.tables else None
+            self.search = Search(Transposition_Table(config.hash), board=board, tables=tables)
+
+    def new_game(self) -> None:
+        '''
+            Forgets everything from the last game, so a game doesn't depend on the ones before
+        '''
+        if self.search is not None:
+            self.search.table.clear()
+
+    def choose_move(self, rng: random.Random) -> Move:
+        '''
+            Returns the move of the player in the position of the board
+
+            Parameters
+            ----------
+            rng: random.Random
+                the random generator of the game (for the random mover and the book)
+
+            Returns
+            -------
+            Move
+                the move (None if there is none)
+        '''
+        if self.book is not None:
+            move = self.book.get_move(self.board, rng)
+            if move is not None:
+                return move
+        if self.search is None:
+            moves = self.board.generate_moves()
+            return rng.choice(moves) if moves else None
+        config = self.config
+        return self.search.search(config.depth or 64, config.nodes, config.time).move
+
+
+def init_worker(configs: Tuple[Player_Config, Player_Config]) -> None:
+    '''
+        Sets up the board and the players of a worker process
+
+        Parameters
+        ----------
+        configs: Tuple[Player_Config, Player_Config]
+            the settings of the first and the second player
+    '''
+    global worker_board, worker_players
+    worker_board = Board()
+    worker_players = tuple(Player(config, worker_board) for config in configs)
+
+
+def play_game(number: int, opening: Opening, first_white: bool, seed: int, max_plies: int) -> Dict[str, object]:
+    '''
+        Plays a game in a worker process
+
+        Parameters
+        ----------
+        number: int
+            the number of the game
+
+        opening: Opening
+            the start position and the moves played from it before the players take over
+
+        first_white: bool
+            if the first player plays white
+
+        seed: int
+            the seed of the random moves of the game
+
+        max_plies: int
+            the number of plies after which the game is a draw
+
+        Returns
+        -------
+        Dict[str, object]
+            the game: number, fen, moves, result, termination, first_white, plies,
+            seconds (per player) and pid and busy (the worker and its seconds)
+    '''
+    start = time.perf_counter()
+    board = worker_board
+    fen, opening_moves = opening
+    board.load_fen(fen)
+    for move in opening_moves:
+        perft.apply_move(move, board)
+    board.history.clear()
+    for player in worker_players:
+        player.new_game()
+    by_colour = {'white': worker_players[0] if first_white else worker_players[1],
+                 'black': worker_players[1] if first_white else worker_players[0]}
+    seconds = [0.0, 0.0]
+    rng = random.Random(seed)
+    moves = list(opening_moves)
+    seen = {board.hash: 1}
+    result, termination = '1/2-1/2', 'max plies'
+    for _ in range(max_plies):
+        colour = board.turn
+        player = by_colour[colour]
+        think = time.perf_counter()
+        move = player.choose_move(rng)
+        seconds[worker_players.index(player)] += time.perf_counter() - think
+        if move is None:
+            termination = 'no moves'
+            break
+        taken = board.get_piece_on_board(move[1])
+        perft.apply_move(move, board)
+        board.history.clear()
+        moves.append(move)
+        if taken is not None and taken.get_class_name() == 'King':
+            result, termination = ('1-0' if colour == 'white' else '0-1'), 'king taken'
+            break
+        seen[board.hash] = seen.get(board.hash, 0) + 1
+        if seen[board.hash] >= REPETITIONS:
+            termination = 'repetition'
+            break
+        if board.halfmove >= FIFTY_MOVES:
+            termination = 'fifty moves'
+            break
+    return {'number': number, 'fen': fen, 'moves': moves, 'result': result, 'termination': termination,
+            'first_white': first_white, 'plies': len(moves) - len(opening_moves), 'seconds': seconds,
+            'pid': os.getpid(), 'busy': time.perf_counter() - start}
+
+
+def read_openings(path: str, plies: int = 8) -> List[Opening]:
+    '''
+        Reads an opening suite: a PGN file (the first plies of every game)
+        or a file with one FEN per line
+
+        Parameters
+        ----------
+        path: str
+            the file
+
+        plies: int
+            the number of plies that are taken from every PGN game
+
+        Returns
+        -------
+        List[Opening]
+            the start positions and moves of the openings (invalid ones are left out)
+    '''
+    openings = []
+    board = Board()
+    with open(path, encoding='utf-8', errors='replace') as stream:
+        if path.lower().endswith('.pgn'):
+            for game in pgn.read_games(stream):
+                moves = []
+                try:
+                    for move in pgn.replay_game(game, board):
+                        if len(moves) >= plies:
+                            break
+                        moves.append(move)
+                except ValueError:
+                    continue
+                openings.append((game.get_fen(), moves))
+        else:
+            for line in stream:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    board.load_fen(line)
+                except ValueError:
+                    continue
+                openings.append((line, []))
+    return openings
+
+
+def expected_score(elo: float) -> float:
+    '''
+        Returns the expected score of a player that is elo points stronger
+    '''
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_difference(score: float) -> float:
+    '''
+        Returns the Elo difference of an expected score (infinite for 0 and 1)
+    '''
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+class Tournament_Stats():
+    '''
+        The results of the first player and what follows from them
+
+        ...
+
+        Attributes
+        ----------
+        wins: int
+            the games the first player won
+
+        draws: int
+            the draws
+
+        losses: int
+            the games the first player lost
+
+        Methods
+        -------
+        add(self, score: float) -> None
+            Adds the result of a game (1, 0.5 or 0 for the first player)
+
+        games(self) -> int
+            Returns the number of games
+
+        score(self) -> float
+            Returns the average score of the first player
+
+        variance(self) -> float
+            Returns the variance of the score of one game
+
+        elo(self) -> Tuple[float, float]
+            Returns the Elo difference and its 95 % error margin
+
+        llr(self, elo0: float, elo1: float) -> float
+            Returns the log-likelihood ratio of H1 (elo1) against H0 (elo0)
+    '''
+    def __init__(self) -> None:
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    def add(self, score: float) -> None:
+        '''
+            Adds the result of a game
+
+            Parameters
+            ----------
+            score: float
+                1 for a win, 0.5 for a draw and 0 for a loss of the first player
+        '''
+        if score == 1:
+            self.wins += 1
+        elif score == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def games(self) -> int:
+        '''
+            Returns the number of games
+        '''
+        return self.wins + self.draws + self.losses
+
+    def score(self) -> float:
+        '''
+            Returns the average score of the first player (0.5 without games)
+        '''
+        games = self.games()
+        return (self.wins + self.draws / 2) / games if games else 0.5
+
+    def variance(self) -> float:
+        '''
+            Returns the variance of the score of one game
+        '''
+        games = self.games()
+        if not games:
+            return 0.0
+        score = self.score()
+        return (self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2 + self.losses * score ** 2) / games
+
+    def elo(self) -> Tuple[float, float]:
+        '''
+            Returns the Elo difference and its 95 % error margin
+
+            Returns
+            -------
+            Tuple[float, float]
+                the difference and the margin (infinite if it can't be estimated yet,
+                e.g. while all the games had the same result)
+        '''
+        games = self.games()
+        score = self.score()
+        elo = elo_difference(score)
+        variance = self.variance()
+        if games < 2 or variance == 0 or not math.isfinite(elo):
+            return elo, math.inf
+        error = 1.96 * math.sqrt(variance / games)
+        return elo, (elo_difference(min(score + error, 1)) - elo_difference(max(score - error, 0))) / 2
+
+    def llr(self, elo0: float, elo1: float) -> float:
+        '''
+            Returns the log-likelihood ratio of H1 (the difference is elo1)
+            against H0 (it is elo0), with the normal approximation of the scores
+
+            Parameters
+            ----------
+            elo0: float
+                the Elo difference of H0
+
+            elo1: float
+                the Elo difference of H1
+
+            Returns
+            -------
+            float
+                the log-likelihood ratio
+        '''
+        # one draw more, so the variance isn't 0 while all the games had the same result
+        games = self.games() + 1
+        score = (self.wins + (self.draws + 1) / 2) / games
+        variance = (self.wins * (1 - score) ** 2 + (self.draws + 1) * (0.5 - score) ** 2 + self.losses * score ** 2) / games
+        score0 = expected_score(elo0)
+        score1 = expected_score(elo1)
+        return self.games() * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def sprt_bounds(alpha: float, beta: float) -> Tuple[float, float]:
+    '''
+        Returns the bounds of the log-likelihood ratio of the SPRT
+
+        Parameters
+        ----------
+        alpha: float
+            the chance to accept H1 if H0 is true
+
+        beta: float
+            the chance to accept H0 if H1 is true
+
+        Returns
+        -------
+        Tuple[float, float]
+            H0 is accepted below the first bound, H1 above the second one
+    '''
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def format_elo(stats: Tournament_Stats) -> str:
+    '''
+        Returns the Elo difference of the first player with its error margin as text
+    '''
+    elo, margin = stats.elo()
+    if not math.isfinite(elo):
+        return '{}inf'.format('+' if elo > 0 else '-')
+    return '{:+.1f} +/- {}'.format(elo or 0.0, '{:.1f}'.format(margin) if math.isfinite(margin) else 'inf')
+
+
+def run_tournament(first: Player_Config, second: Player_Config, games: int, openings: List[Opening],
+                   workers: int, output: TextIO = None, max_plies: int = MAX_PLIES, seed: int = 1,
+                   sprt: Tuple[float, float, float, float] = None, progress: TextIO = sys.stderr) -> Tuple[Tournament_Stats, str, float, float]:
+    '''
+        Plays the games of a tournament on a process pool
+
+        Parameters
+        ----------
+        first: Player_Config
+            the first player (the results are given for it)
+
+        second: Player_Config
+            the second player
+
+        games: int
+            the largest number of games (every opening is played with both colours)
+
+        openings: List[Opening]
+            the opening suite (used in turn, the start position if empty)
+
+        workers: int
+            the number of worker processes (0 to play in this process)
+
+        output: TextIO
+            the PGN file (None to not write the games)
+
+        max_plies: int
+            the number of plies after which a game is a draw
+
+        seed: int
+            the seed of the random moves (game n uses seed + n)
+
+        sprt: Tuple[float, float, float, float]
+            (elo0, elo1, alpha, beta) to stop as soon as the SPRT decides (None to play all the games)
+
+        progress: TextIO
+            where a line is printed after every game (None for no progress)
+
+        Returns
+        -------
+        Tuple[Tournament_Stats, str, float, float]
+            the results, the SPRT decision (H0, H1 or None), the seconds and the busy seconds of all the workers
+    '''
+    openings = openings or [(bitboard.START_FEN, [])]
+    stats = Tournament_Stats()
+    decision = None
+    busy = 0.0
+    start = time.perf_counter()
+    tasks = ((number, openings[number // 2 % len(openings)], number % 2 == 0, seed + number, max_plies)
+             for number in range(games))
+
+    def collect(game: Dict[str, object]) -> bool:
+        nonlocal decision, busy
+        busy += game['busy']
+        first_white = game['first_white']
+        score = {'1-0': 1.0, '0-1': 0.0}.get(game['result'], 0.5)
+        stats.add(score if first_white else 1 - score)
+        if output is not None:
+            white, black = (first, second) if first_white else (second, first)
+            pgn.write_game(output, game['moves'], {'Event': 'PyChess tournament', 'Round': str(game['number'] + 1),
+                                                   'White': white.name, 'Black': black.name,
+                                                   'Termination': game['termination']}, game['result'], game['fen'])
+        if progress is not None:
+            progress.write('game {:>5}: {:<7} {:<11} ({} plies)  +{} ={} -{}  elo {}\n'.format(
+                game['number'] + 1, game['result'], game['termination'], game['plies'],
+                stats.wins, stats.draws, stats.losses, format_elo(stats)))
+            progress.flush()
+        if sprt is not None:
+            elo0, elo1, alpha, beta = sprt
+            lower, upper = sprt_bounds(alpha, beta)
+            llr = stats.llr(elo0, elo1)
+            if llr <= lower or llr >= upper:
+                decision = 'H0' if llr <= lower else 'H1'
+                return True
+        return False
+
+    if workers == 0:
+        init_worker((first, second))
+        for task in tasks:
+            if collect(play_game(*task)):
+                break
+    else:
+        context = multiprocessing.get_context('spawn')
+        executor = ProcessPoolExecutor(workers, context, init_worker, ((first, second),))
+        try:
+            # a few games per worker are in flight, the oldest one is collected first
+            pending: deque[Future] = deque()
+            for task in tasks:
+                pending.append(executor.submit(play_game, *task))
+                if len(pending) >= 2 * workers and collect(pending.popleft().result()):
+                    break
+            while pending and decision is None:
+                if collect(pending.popleft().result()):
+                    break
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    return stats, decision, time.perf_counter() - start, busy
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Plays games between two players and reports the Elo difference')
+    parser.add_argument('first', help='the first player, e.g. "engine,depth=3" (the results are given for it)')
+    parser.add_argument('second', help='the second player, e.g. random')
+    parser.add_argument('--games', type=int, default=100, help='the largest number of games')
+    parser.add_argument('--openings', help='a PGN file (the first --opening-plies of every game) or a file with one FEN per line')
+    parser.add_argument('--opening-plies', type=int, default=8, help='the plies taken from every game of a PGN opening suite')
+    parser.add_argument('--pgn', help='the PGN file the games are written to')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='the number of worker processes (0 to play in this process)')
+    parser.add_argument('--max-plies', type=int, default=MAX_PLIES, help='the number of plies after which a game is a draw')
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the random moves')
+    parser.add_argument('--sprt', action='store_true', help='stops as soon as the SPRT accepts H0 or H1')
+    parser.add_argument('--elo0', type=float, default=0, help='the Elo difference of H0')
+    parser.add_argument('--elo1', type=float, default=10, help='the Elo difference of H1')
+    parser.add_argument('--alpha', type=float, default=0.05, help='the chance to accept H1 if H0 is true')
+    parser.add_argument('--beta', type=float, default=0.05, help='the chance to accept H0 if H1 is true')
+    parser.add_argument('--quiet', action='store_true', help='doesn\'t print a line for every game')
+    args = parser.parse_args()
+
+    try:
+        first = parse_player(args.first)
+        second = parse_player(args.second)
+    except ValueError as error:
+        parser.error(str(error))
+    if first.name == second.name:
+        first.name += ' (1)'
+        second.name += ' (2)'
+    openings = read_openings(args.openings, args.opening_plies) if args.openings else []
+    if args.openings and not openings:
+        parser.error('{} has no valid openings'.format(args.openings))
+    sprt = (args.elo0, args.elo1, args.alpha, args.beta) if args.sprt else None
+    output = open(args.pgn, 'w', encoding='utf-8') if args.pgn else None
+    try:
+        stats, decision, elapsed, busy = run_tournament(first, second, args.games, openings, args.workers, output,
+                                                        args.max_plies, args.seed, sprt, None if args.quiet else sys.stderr)
+    finally:
+        if output is not None:
+            output.close()
+    games = stats.games()
+    print('{} vs {}: {} games, +{} ={} -{}, score {:.1f} %'.format(
+        first.name, second.name, games, stats.wins, stats.draws, stats.losses, 100 * stats.score()))
+    print('elo difference: {} (95 %)'.format(format_elo(stats)))
+    if sprt is not None:
+        lower, upper = sprt_bounds(args.alpha, args.beta)
+        print('sprt: llr {:.2f} ({:.2f}, {:.2f}) {}'.format(stats.llr(args.elo0, args.elo1), lower, upper,
+                                                           'accepted ' + decision if decision else 'no decision'))
+    if games:
+        print('{:.1f} s, {:.0f} games/hour, {:.0f} games/hour per core'.format(
+            elapsed, 3600 * games / elapsed, 3600 * games / busy if busy else 0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+'''
+    Universal Chess Interface: lets chess GUIs, tournament managers and
+    benchmark tools drive the search over stdin/stdout
+
+    Supported commands: uci, isready, ucinewgame, setoption name Hash value <MB>,
+    position startpos/fen <fen> [moves ...], go [depth/nodes/movetime/wtime/btime/
+    winc/binc/movestogo/infinite], stop and quit.
+
+    GUIs send the whole game with every position command. If the new move
+    list continues the one before, only the new moves are played; if it
+    differs, the board takes back moves to the last common one instead of
+    setting up the position again.
+
+    Usage:
+
+        python uci.py
+'''
+import sys
+import threading
+from typing import List, TextIO
+from bitboard import START_FEN
+from objects import Board
+from search import Search, Search_Result, Transposition_Table, format_score
+import perft
+
+# the rough memory of one transposition table entry, to turn the Hash option (MB) into entries
+ENTRY_BYTES = 128
+DEFAULT_HASH = 16
+MAX_HASH = 1024
+
+
+class Uci_Engine():
+    '''
+        The state of a UCI session
+
+        ...
+
+        Attributes
+        ----------
+        board: Board
+            the board the positions are set up on
+
+        search: Search
+            the search (its transposition table is kept between moves)
+
+        base: str
+            the FEN of the position the moves were played from
+
+        moves: List[str]
+            the moves that were played from the base position
+
+        thread: threading.Thread
+            the running search (None if the engine is idle)
+
+        Methods
+        -------
+        send(self, line: str) -> None
+            Writes a line to the GUI
+
+        handle(self, line: str) -> bool
+            Executes a command, returns False for quit
+
+        set_position(self, tokens: List[str]) -> None
+            Executes the position command
+
+        go(self, tokens: List[str]) -> None
+            Starts a search in the background
+
+        stop(self) -> None
+            Stops the running search and waits for its bestmove
+
+        run(self, stream: TextIO) -> None
+            Executes the commands of a stream until quit
+    '''
+    def __init__(self, output: TextIO = sys.stdout) -> None:
+        '''
+            Parameters
+            ----------
+            output: TextIO
+                where the responses are written
+        '''
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.board = Board()
+        self.board.load_fen(START_FEN)
+        self.search = Search(Transposition_Table(DEFAULT_HASH * (1 << 20) // ENTRY_BYTES), board=self.board)
+        self.base = START_FEN
+        self.moves: List[str] = []
+        self.thread = None
+
+    def send(self, line: str) -> None:
+        '''
+            Writes a line to the GUI (from the main thread or the search thread)
+
+            Parameters
+            ----------
+            line: str
+                the line
+        '''
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def handle(self, line: str) -> bool:
+        '''
+            Executes a command
+
+            Parameters
+            ----------
+            line: str
+                the command
+
+            Returns
+            -------
+            bool
+                False if the engine needs to quit
+        '''
+        tokens = line.split()
+        if not tokens:
+            return True
+        match tokens[0]:
+            case 'uci':
+                self.send('id name PyChess')
+                self.send('id author PyChess')
+                self.send('option name Hash type spin default {} min 1 max {}'.format(DEFAULT_HASH, MAX_HASH))
+                self.send('uciok')
+            case 'isready':
+                self.send('readyok')
+            case 'ucinewgame':
+                self.stop()
+                self.search.table.clear()
+                self.board.load_fen(START_FEN)
+                self.base = START_FEN
+                self.moves = []
+            case 'setoption':
+                self.stop()
+                if len(tokens) >= 5 and tokens[1] == 'name' and tokens[2].lower() == 'hash' and tokens[3] == 'value' and tokens[4].isdigit():
+                    megabytes = min(max(int(tokens[4]), 1), MAX_HASH)
+                    self.search.table = Transposition_Table(megabytes * (1 << 20) // ENTRY_BYTES)
+            case 'position':
+                self.stop()
+                self.set_position(tokens[1:])
+            case 'go':
+                self.stop()
+                self.go(tokens[1:])
+            case 'stop':
+                self.stop()
+            case 'quit':
+                self.stop()
+                return False
+            case _:
+                self.send('info string unknown command {}'.format(tokens[0]))
+        return True
+
+    def set_position(self, tokens: List[str]) -> None:
+        '''
+            Executes the position command, only the moves that differ
+            from the last position command are played
+
+            Parameters
+            ----------
+            tokens: List[str]
+                the arguments (startpos or fen <fen>, then optionally moves <move> ...)
+        '''
+        if 'moves' in tokens:
+            index = tokens.index('moves')
+            setup, moves = tokens[:index], tokens[index + 1:]
+        else:
+            setup, moves = tokens, []
+        if setup[:1] == ['startpos']:
+            base = START_FEN
+        elif setup[:1] == ['fen']:
+            base = ' '.join(setup[1:])
+        else:
+            self.send('info string expected startpos or fen')
+            return
+        common = 0
+        if base == self.base:
+            while common < min(len(moves), len(self.moves)) and moves[common] == self.moves[common]:
+                common += 1
+            for _ in range(len(self.moves) - common):
+                self.board.unmake_move()
+        else:
+            try:
+                self.board.load_fen(base)
+            except (ValueError, KeyError, IndexError):
+                self.send('info string invalid fen {}'.format(base))
+                # the next position command sets up its position from scratch
+                self.base = None
+                self.moves = []
+                return
+            self.base = base
+        self.moves = self.moves[:common]
+        for move in moves[common:]:
+            try:
+                perft.apply_move(perft.parse_move(move), self.board)
+            except (ValueError, KeyError, IndexError):
+                self.send('info string illegal move {}'.format(move))
+                break
+            self.moves.append(move)
+
+    def go(self, tokens: List[str]) -> None:
+        '''
+            Starts a search in the background, the bestmove is sent when it is finished
+
+            Parameters
+            ----------
+            tokens: List[str]
+                the limits of the search (e.g. depth 6 or wtime 60000 btime 60000)
+        '''
+        limits = {}
+        for name, value in zip(tokens, tokens[1:]):
+            if name in ('depth', 'nodes', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo') and value.lstrip('-').isdigit():
+                limits[name] = int(value)
+        max_time = limits.get('movetime', 0) / 1000
+        remaining = limits.get('wtime' if self.board.turn == 'white' else 'btime')
+        if remaining is not None and not max_time:
+            increment = limits.get('winc' if self.board.turn == 'white' else 'binc', 0)
+            moves_to_go = limits.get('movestogo', 30)
+            max_time = max(min(remaining / max(moves_to_go, 1) + increment / 2, remaining / 2), 1) / 1000
+        max_depth = limits.get('depth', 64)
+        max_nodes = limits.get('nodes', 0)
+        self.thread = threading.Thread(target=self.think, args=(max_depth, max_nodes, max_time), daemon=True)
+        self.thread.start()
+
+    def think(self, max_depth: int, max_nodes: int, max_time: float) -> None:
+        '''
+            Runs the search and sends its progress and the bestmove (in the search thread),
+            a bestmove is sent even if the search fails, so the GUI doesn't wait forever
+        '''
+        move = None
+        try:
+            move = self.search.search(max_depth, max_nodes, max_time, self.send_info).move
+        except Exception as error:
+            self.send('info string search failed: {!r}'.format(error))
+        finally:
+            self.send('bestmove {}'.format(perft.move_to_str(move) if move else '0000'))
+
+    def send_info(self, result: Search_Result) -> None:
+        '''
+            Sends the result of a completed iteration
+
+            Parameters
+            ----------
+            result: Search_Result
+                the result
+        '''
+        self.send('info depth {} score {} nodes {} nps {} time {} pv {}'.format(
+            result.depth, format_score(result), result.nodes, result.get_nps(), int(result.time * 1000),
+            ' '.join(perft.move_to_str(move) for move in result.pv)))
+
+    def stop(self) -> None:
+        '''
+            Stops the running search and waits until it sent its bestmove
+        '''
+        if self.thread is not None:
+            # the search clears its stop flag when it starts, so it is set until the thread ends
+            while self.thread.is_alive():
+                self.search.stop()
+                self.thread.join(0.01)
+            self.thread = None
+
+    def run(self, stream: TextIO) -> None:
+        '''
+            Executes the commands of a stream until quit or the end of the stream
+
+            Parameters
+            ----------
+            stream: TextIO
+                the commands, one per line
+        '''
+        for line in stream:
+            if not self.handle(line):
+                return
+        self.stop()
+
+
+def main() -> None:
+    Uci_Engine().run(sys.stdin)
+
+
+if __name__ == '__main__':
+    main()
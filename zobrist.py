@@ -0,0 +1,57 @@
+'''
+    Zobrist keys for hashing positions
+
+    A position hash is the XOR of one random 64-bit key for every piece on
+    its square, the key of the castling rights, the key of the ghost square
+    (en passant) and the SIDE key if black is to move. The keys come from a
+    fixed seed, so hashes stay the same between runs and processes and can
+    be stored (e.g. in opening books).
+'''
+import random
+from typing import Dict, List, Tuple
+import bitboard
+
+SEED = 0x50794368657373
+
+_random = random.Random(SEED)
+
+PIECES: Dict[Tuple[str, str], List[int]] = {
+    (colour, name): [_random.getrandbits(64) for _ in range(64)]
+    for colour in bitboard.COLOURS for name in bitboard.PIECE_NAMES
+}
+GHOST: List[int] = [_random.getrandbits(64) for _ in range(64)]
+SIDE: int = _random.getrandbits(64)
+_RIGHTS = [_random.getrandbits(64) for _ in range(4)]
+# one key for each combination of the four castling rights
+CASTLING: List[int] = [0] * 16
+for _mask in range(16):
+    for _bit in range(4):
+        if _mask >> _bit & 1:
+            CASTLING[_mask] ^= _RIGHTS[_bit]
+
+
+def hash_position(position: bitboard.Bitboard_Position) -> int:
+    '''
+        Calculates the hash of a bitboard position
+        (the same value Piece_Handler.hash has for that position)
+
+        Parameters
+        ----------
+        position: bitboard.Bitboard_Position
+            the position
+
+        Returns
+        -------
+        int
+            the 64-bit hash
+    '''
+    key = CASTLING[position.castling]
+    for index, bb in enumerate(position.boards):
+        keys = PIECES[(bitboard.COLOURS[index // 6], bitboard.PIECE_NAMES[index % 6])]
+        for sq in bitboard.squares_of(bb):
+            key ^= keys[sq]
+    if position.ghost >= 0:
+        key ^= GHOST[position.ghost]
+    if position.turn == bitboard.BLACK:
+        key ^= SIDE
+    return key